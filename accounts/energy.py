@@ -0,0 +1,170 @@
+"""
+أهداف الطاقة للمريض (BMR و TDEE والسعرات اليومية والمغذيات الكبرى)
+Patient energy targets
+
+All energy figures of a ``PatientProfile`` derive from six inputs: weight,
+height, age, gender, activity level and goal. ``compute_energy_targets`` is a
+pure function of those inputs and is memoised on them, so a list of patients
+(or repeated requests for the same patient) reuses one computation per
+distinct set of inputs, and a changed weight or goal is a new key rather than
+a stale entry. Nothing here writes to the database; storing
+``daily_calories`` stays with the explicit update paths.
+"""
+
+from datetime import date
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+
+DEFAULT_AGE = 30
+DEFAULT_ACTIVITY_MULTIPLIER = 1.55
+MINIMUM_DAILY_CALORIES = 1200
+# الفرق المسموح بين السعرات المحفوظة والمحسوبة قبل اعتماد المحسوبة
+SAVED_CALORIES_TOLERANCE = 10
+
+ACTIVITY_MULTIPLIERS = {
+    'sedentary': 1.2,
+    'light': 1.375,
+    'moderate': 1.55,
+    'active': 1.725,
+    'very_active': 1.9,
+}
+
+GOAL_ADJUSTMENTS = {
+    'lose_weight': -500,      # عجز 500 سعرة حرارية لفقدان الوزن
+    'gain_weight': 500,       # فائض 500 سعرة حرارية لزيادة الوزن
+    'build_muscle': 300,      # فائض 300 سعرة حرارية لبناء العضلات
+    'maintain_weight': 0,     # بدون تعديل - الحفاظ على الوزن
+    'improve_health': 0,      # بدون تعديل - تحسين الصحة
+}
+
+PROTEIN_PER_KG = {
+    'lose_weight': 2.2,
+    'maintain_weight': 1.6,
+    'gain_weight': 1.8,
+    'build_muscle': 2.0,
+    'improve_health': 1.8,
+}
+
+FAT_PERCENTAGE = {
+    'lose_weight': 0.25,
+    'maintain_weight': 0.30,
+    'gain_weight': 0.35,
+    'build_muscle': 0.25,
+    'improve_health': 0.30,
+}
+
+
+class EnergyInputs(NamedTuple):
+    weight: float
+    height: float
+    age: int
+    gender: str
+    activity_level: str
+    goal: str
+
+
+class EnergyTargets(NamedTuple):
+    """أهداف الطاقة المحسوبة لمجموعة مدخلات واحدة"""
+    bmr: int
+    tdee: int
+    goal_adjustment: int
+    daily_calories: int
+
+
+def age_on(date_of_birth: Optional[date], today: Optional[date] = None) -> int:
+    """العمر بالسنوات الكاملة (أو العمر الافتراضي إذا لم يتوفر تاريخ الميلاد)"""
+    if not date_of_birth:
+        return DEFAULT_AGE
+    today = today or date.today()
+    age = today.year - date_of_birth.year
+    if (today.month, today.day) < (date_of_birth.month, date_of_birth.day):
+        age -= 1
+    return age
+
+
+def energy_inputs(profile) -> Optional[EnergyInputs]:
+    """مدخلات حساب الطاقة من ملف المريض (أو None إذا نقص الوزن أو الطول)"""
+    if not all([profile.current_weight, profile.height]):
+        return None
+    user = profile.user if profile.user_id else None
+    return EnergyInputs(
+        weight=profile.current_weight,
+        height=profile.height,
+        age=age_on(user.date_of_birth if user else None),
+        gender=profile.gender,
+        activity_level=profile.activity_level,
+        goal=profile.goal,
+    )
+
+
+@lru_cache(maxsize=4096)
+def compute_energy_targets(inputs: EnergyInputs) -> Optional[EnergyTargets]:
+    """BMR (Mifflin-St Jeor) و TDEE والسعرات اليومية بعد تعديل الهدف"""
+    if inputs.gender == 'male':
+        bmr = (10 * inputs.weight) + (6.25 * inputs.height) - (5 * inputs.age) + 5
+    else:
+        bmr = (10 * inputs.weight) + (6.25 * inputs.height) - (5 * inputs.age) - 161
+    bmr = round(bmr)
+    if not bmr:
+        return None
+
+    tdee = round(bmr * ACTIVITY_MULTIPLIERS.get(inputs.activity_level, DEFAULT_ACTIVITY_MULTIPLIER))
+    if not tdee:
+        return None
+
+    goal_adjustment = GOAL_ADJUSTMENTS.get(inputs.goal, 0)
+    daily_calories = max(tdee + goal_adjustment, MINIMUM_DAILY_CALORIES)
+    return EnergyTargets(bmr, tdee, goal_adjustment, round(daily_calories))
+
+
+@lru_cache(maxsize=4096)
+def compute_nutrition_targets(daily_calories: int, weight: float, goal: str) -> dict:
+    """البروتين حسب الوزن والهدف، والدهون كنسبة من السعرات، والباقي كربوهيدرات"""
+    protein_grams = round(weight * PROTEIN_PER_KG.get(goal, 1.6))
+    protein_calories = protein_grams * 4
+    fat_calories = daily_calories * FAT_PERCENTAGE.get(goal, 0.30)
+    carb_calories = daily_calories - protein_calories - fat_calories
+    return {
+        'calories': daily_calories,
+        'protein': protein_grams,
+        'carbs': round(carb_calories / 4),
+        'fat': round(fat_calories / 9),
+        'protein_calories': protein_calories,
+        'fat_calories': fat_calories,
+        'carb_calories': carb_calories,
+    }
+
+
+def get_energy_targets(profile) -> Optional[EnergyTargets]:
+    """أهداف الطاقة لملف المريض (محسوبة مرة واحدة لكل مجموعة مدخلات)"""
+    inputs = energy_inputs(profile)
+    if inputs is None:
+        return None
+    return compute_energy_targets(inputs)
+
+
+def resolve_daily_calories(profile, force_recalculate: bool = False) -> Optional[int]:
+    """
+    السعرات اليومية المطلوبة للمريض
+
+    The saved ``daily_calories`` is kept when it is within
+    ``SAVED_CALORIES_TOLERANCE`` of the calculated value (unless
+    ``force_recalculate``); otherwise the calculated value is returned.
+    Nothing is saved.
+    """
+    targets = get_energy_targets(profile)
+    if targets is None:
+        return None
+    saved = profile.daily_calories
+    if not force_recalculate and saved and saved > 0 and abs(saved - targets.daily_calories) <= SAVED_CALORIES_TOLERANCE:
+        return saved
+    return targets.daily_calories
+
+
+def get_nutrition_targets(profile) -> Optional[dict]:
+    """أهداف البروتين والكربوهيدرات والدهون اليومية"""
+    daily_calories = resolve_daily_calories(profile)
+    if not daily_calories:
+        return None
+    return dict(compute_nutrition_targets(daily_calories, profile.current_weight, profile.goal))
@@ -0,0 +1,132 @@
+"""
+قياس الاستعلامات والزمن والذاكرة لكل مسار ومقارنتها بملف الأساس
+Query-count / latency / memory regression benchmark for the API endpoints
+
+Runs on a fresh test database (the Django test runner's database setup),
+never on the configured database.
+"""
+
+import warnings
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import (
+    override_settings, setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+)
+
+from dr_mays_nutrition.benchmark_data import SeedVolumes, seed_benchmark_data
+from dr_mays_nutrition.benchmarks import (
+    DEFAULT_BASELINE, DEFAULT_REPEAT, DEFAULT_THRESHOLDS, benchmark_settings, compare, load_baseline,
+    run_benchmark, save_baseline
+)
+
+
+class Command(BaseCommand):
+    help = 'قياس عدد الاستعلامات والزمن والذاكرة لكل مسار على بيانات واقعية والفشل عند تجاوز ملف الأساس'
+
+    def add_arguments(self, parser):
+        defaults = SeedVolumes()
+        parser.add_argument(
+            '--update-baseline',
+            action='store_true',
+            help='حفظ النتائج كملف أساس جديد بدلاً من المقارنة'
+        )
+        parser.add_argument(
+            '--baseline',
+            default=str(DEFAULT_BASELINE),
+            help='مسار ملف الأساس (JSON)'
+        )
+        parser.add_argument('--foods', type=int, default=defaults.foods, help='عدد الأطعمة المولدة')
+        parser.add_argument('--patients', type=int, default=defaults.patients, help='عدد المرضى المولدين')
+        parser.add_argument('--weeks', type=int, default=defaults.weeks, help='عدد الخطط الأسبوعية لكل مريض')
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=DEFAULT_REPEAT,
+            help='عدد مرات قياس كل مسار (يؤخذ الوسيط)'
+        )
+        parser.add_argument(
+            '--threshold',
+            action='append',
+            default=[],
+            metavar='METRIC=RATIO',
+            help=f'نسبة الزيادة المسموحة لمقياس (الافتراضي: {DEFAULT_THRESHOLDS})'
+        )
+        parser.add_argument(
+            '--only',
+            help='قياس المسارات التي يحتوي مفتاحها على هذا النص فقط'
+        )
+
+    def _thresholds(self, values):
+        thresholds = {}
+        for value in values:
+            metric, _, ratio = value.partition('=')
+            if metric not in DEFAULT_THRESHOLDS:
+                raise CommandError(f'Unknown metric "{metric}" (expected one of {", ".join(DEFAULT_THRESHOLDS)})')
+            try:
+                thresholds[metric] = float(ratio)
+            except ValueError:
+                raise CommandError(f'Invalid threshold "{value}"')
+        return thresholds
+
+    def handle(self, *args, **options):
+        baseline_path = Path(options['baseline'])
+        thresholds = self._thresholds(options['threshold'])
+        baseline = None
+        if not options['update_baseline']:
+            baseline = load_baseline(baseline_path)
+            if baseline is None:
+                raise CommandError(f'No baseline at {baseline_path} (run with --update-baseline first)')
+
+        volumes = SeedVolumes(foods=options['foods'], patients=options['patients'], weeks=options['weeks'])
+        if baseline and baseline['volumes'] != volumes._asdict():
+            self.stdout.write(self.style.WARNING(
+                f"⚠️ أحجام البيانات تختلف عن ملف الأساس {baseline['volumes']}"
+            ))
+
+        verbose = options['verbosity'] > 1
+        setup_test_environment(debug=False)
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            # تحذيرات الترقيم غير المرتب و static تتكرر مع كل طلب
+            with override_settings(**benchmark_settings()), warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                self.stdout.write('🌱 توليد البيانات...')
+                data = seed_benchmark_data(volumes)
+                self.stdout.write(f'   {data.counts}')
+                self.stdout.write('⏱️ قياس المسارات...')
+                results = run_benchmark(
+                    data,
+                    repeat=options['repeat'],
+                    only=options['only'],
+                    progress=self.stdout.write if verbose else None,
+                )
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        for key, reason in results['skipped'].items():
+            self.stdout.write(self.style.WARNING(f'   تخطي {key}: {reason}'))
+
+        if options['update_baseline']:
+            try:
+                save_baseline(results, baseline_path)
+            except ValueError as e:
+                raise CommandError(str(e))
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ تم حفظ ملف الأساس ({len(results['endpoints'])} مسار) في {baseline_path}"
+            ))
+            return
+
+        regressions = compare(baseline, results, thresholds)
+        new_endpoints = sorted(set(results['endpoints']) - set(baseline['endpoints']))
+        for key in new_endpoints:
+            self.stdout.write(self.style.WARNING(f'   مسار جديد غير موجود في ملف الأساس: {key}'))
+        for regression in regressions:
+            self.stdout.write(self.style.ERROR(f'   ✗ {regression}'))
+
+        if regressions:
+            raise CommandError(f'{len(regressions)} regression(s) against {baseline_path}')
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {len(results['endpoints'])} مسار ضمن ملف الأساس"
+        ))
@@ -0,0 +1,117 @@
+"""
+قياس توزيع أحداث websocket لكل عامل
+Websocket fan-out benchmark: connected clients and event latency per worker
+"""
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dr_mays_nutrition.loadtest import prepare_load_test_users
+from dr_mays_nutrition.websocket_benchmark import (
+    WebsocketBenchmarkConfig, layer_backend, process_local_layer, run_websocket_benchmark
+)
+
+
+class Command(BaseCommand):
+    help = 'فتح عملاء websocket على مكدس ASGI في عامل أو أكثر ونشر أحداث لكل مستخدم وقياس زمن الوصول والفاقد لكل عامل'
+
+    def add_arguments(self, parser):
+        defaults = WebsocketBenchmarkConfig()
+        parser.add_argument('--clients', type=int, default=defaults.clients, help='عدد اتصالات websocket')
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=defaults.workers,
+            help='عدد العمليات التي تتوزع عليها الاتصالات (أكثر من واحد يتطلب CHANNEL_REDIS_URL)'
+        )
+        parser.add_argument('--doctors', type=int, default=defaults.doctors, help='عدد أطباء اختبار التحميل')
+        parser.add_argument('--patients', type=int, default=defaults.patients, help='عدد مرضى اختبار التحميل')
+        parser.add_argument('--messages', type=int, default=defaults.messages, help='عدد الأحداث لكل مستخدم')
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=defaults.interval,
+            help='الانتظار بين دفعات النشر (ثواني)'
+        )
+        parser.add_argument(
+            '--timeout',
+            type=float,
+            default=defaults.timeout,
+            help='مهلة الاتصال وانتظار كل حدث (ثواني)'
+        )
+        parser.add_argument(
+            '--prepare',
+            action='store_true',
+            help='إنشاء مستخدمي اختبار التحميل في قاعدة البيانات المضبوطة قبل القياس'
+        )
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='إخراج التقرير بصيغة JSON'
+        )
+
+    def handle(self, *args, **options):
+        config = WebsocketBenchmarkConfig(
+            clients=options['clients'],
+            workers=options['workers'],
+            doctors=options['doctors'],
+            patients=options['patients'],
+            messages=options['messages'],
+            interval=options['interval'],
+            timeout=options['timeout'],
+        )
+        if config.clients < 1 or config.workers < 1 or config.messages < 1:
+            raise CommandError('--clients, --workers and --messages must be at least 1')
+        if config.workers > 1 and process_local_layer():
+            raise CommandError(
+                f'{layer_backend()} only delivers within one process: '
+                f'set CHANNEL_REDIS_URL to benchmark more than one worker'
+            )
+
+        if options['prepare']:
+            if config.doctors < 1:
+                raise CommandError('Patients are linked to doctors: --doctors must be at least 1')
+            prepare_load_test_users(config.doctors, config.patients)
+
+        if not options['json']:
+            self.stdout.write(
+                f'🚀 {config.clients} اتصال على {config.workers} عامل، '
+                f'{config.messages} حدث لكل مستخدم عبر {layer_backend()}...'
+            )
+        try:
+            report = run_websocket_benchmark(config)
+        except ValueError as e:
+            raise CommandError(f'{e} (run with --prepare)')
+        except RuntimeError as e:
+            raise CommandError(str(e))
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+            return
+
+        self.stdout.write(
+            f"{'worker':<7} {'clients':>8} {'connected':>10} {'connect p95':>12} {'received':>9} "
+            f"{'lost':>6} {'events/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}"
+        )
+        for worker in report['workers']:
+            latency = worker['latency_ms']
+            line = (
+                f"{worker['worker']:<7} {worker['clients']:>8} {worker['connected']:>10} "
+                f"{worker['connect_ms']['p95']:>12} {worker['received']:>9} {worker['lost']:>6} "
+                f"{worker['delivered_per_s']:>9} {latency['p50']:>8} {latency['p95']:>8} "
+                f"{latency['p99']:>8} {latency['max']:>8}"
+            )
+            failed = worker['lost'] or worker['connected'] < worker['clients']
+            self.stdout.write(self.style.ERROR(line) if failed else line)
+
+        latency = report['latency_ms']
+        summary = (
+            f"المتصلون: {report['connected']}/{config.clients} - الأحداث: {report['received']}/{report['expected']} "
+            f"(النشر {report['publish_s']} ثانية) - الزمن p50/p95/p99: "
+            f"{latency['p50']}/{latency['p95']}/{latency['p99']} ms"
+        )
+        if report['lost'] or report['connected'] < config.clients:
+            self.stdout.write(self.style.WARNING(f'⚠️ {summary}'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'✅ {summary}'))
@@ -0,0 +1,119 @@
+"""
+اختبار تحميل لمسار خطط الوجبات على خادم يعمل
+Drive concurrent doctors and patients against a running server
+"""
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dr_mays_nutrition.loadtest import LoadTestConfig, prepare_load_test_users, run_load_test
+
+
+class Command(BaseCommand):
+    help = 'تشغيل أطباء ومرضى افتراضيين متزامنين على خادم يعمل وقياس الإنتاجية وزمن الاستجابة ونسبة الأخطاء لكل خطوة'
+
+    def add_arguments(self, parser):
+        defaults = LoadTestConfig()
+        parser.add_argument(
+            '--base-url',
+            default=defaults.base_url,
+            help='عنوان الخادم (runserver أو gunicorn)'
+        )
+        parser.add_argument('--doctors', type=int, default=defaults.doctors, help='عدد الأطباء الافتراضيين')
+        parser.add_argument('--patients', type=int, default=defaults.patients, help='عدد المرضى الافتراضيين')
+        parser.add_argument('--duration', type=float, default=defaults.duration, help='مدة الاختبار بالثواني')
+        parser.add_argument(
+            '--ramp-up',
+            type=float,
+            default=defaults.ramp_up,
+            help='المدة التي يبدأ خلالها المستخدمون تدريجياً (ثواني)'
+        )
+        parser.add_argument(
+            '--think-time',
+            type=float,
+            default=defaults.think_time,
+            help='متوسط الانتظار بين الخطوات (ثواني)'
+        )
+        parser.add_argument(
+            '--polls',
+            type=int,
+            default=defaults.polls,
+            help='عدد مرات فحص التحديثات في كل دورة للمريض'
+        )
+        parser.add_argument('--password', default=defaults.password, help='كلمة مرور المستخدمين الافتراضيين')
+        parser.add_argument(
+            '--prepare',
+            action='store_true',
+            help='إنشاء المستخدمين الافتراضيين في قاعدة البيانات المضبوطة قبل الاختبار'
+        )
+        parser.add_argument(
+            '--prepare-only',
+            action='store_true',
+            help='إنشاء المستخدمين فقط بدون تشغيل الاختبار'
+        )
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='إخراج التقرير بصيغة JSON'
+        )
+
+    def handle(self, *args, **options):
+        if options['doctors'] < 1 and options['patients'] < 1:
+            raise CommandError('At least one doctor or patient is required')
+
+        if options['prepare'] or options['prepare_only']:
+            if options['doctors'] < 1:
+                raise CommandError('Patients are linked to doctors: --doctors must be at least 1')
+            counts = prepare_load_test_users(options['doctors'], options['patients'], options['password'])
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ المستخدمون جاهزون: {counts['doctors']} طبيب، {counts['patients']} مريض، "
+                f"{counts['templates']} قالب"
+            ))
+            if options['prepare_only']:
+                return
+
+        config = LoadTestConfig(
+            base_url=options['base_url'],
+            doctors=options['doctors'],
+            patients=options['patients'],
+            duration=options['duration'],
+            ramp_up=options['ramp_up'],
+            think_time=options['think_time'],
+            polls=options['polls'],
+            password=options['password'],
+        )
+        if not options['json']:
+            self.stdout.write(
+                f'🚀 {config.doctors} طبيب و {config.patients} مريض على {config.base_url} '
+                f'لمدة {config.duration:g} ثانية (+{config.ramp_up:g} للبدء التدريجي)...'
+            )
+        report = run_load_test(config)
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+            return
+
+        self.stdout.write(
+            f"{'step':<26} {'count':>7} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+            f"{'max ms':>8} {'errors':>7}  statuses"
+        )
+        for step in report['steps']:
+            latency = step['latency_ms']
+            line = (
+                f"{step['step']:<26} {step['count']:>7} {step['throughput']:>7} {latency['p50']:>8} "
+                f"{latency['p95']:>8} {latency['p99']:>8} {latency['max']:>8} "
+                f"{step['error_rate']:>7.1%}  {step['statuses']}"
+            )
+            self.stdout.write(self.style.ERROR(line) if step['errors'] else line)
+
+        summary = (
+            f"الطلبات: {report['requests']} في {report['elapsed_s']} ثانية "
+            f"({report['throughput']} طلب/ثانية) - الأخطاء: {report['error_rate']:.1%}"
+        )
+        if not report['requests']:
+            raise CommandError(f"No requests completed against {config.base_url}")
+        if report['errors']:
+            self.stdout.write(self.style.WARNING(f'⚠️ {summary}'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'✅ {summary}'))
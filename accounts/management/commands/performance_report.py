@@ -0,0 +1,73 @@
+"""
+تقرير أداء المسارات من إحصاءات العمليات المنشورة
+Dump per-endpoint performance percentiles and budget regressions
+"""
+
+import json
+
+from django.core.management.base import BaseCommand
+
+from dr_mays_nutrition.performance import get_shared_performance_report
+
+
+class Command(BaseCommand):
+    help = 'عرض p50/p95/p99 لكل مسار من إحصاءات العمليات المنشورة في الذاكرة المشتركة'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='إخراج التقرير كاملاً بصيغة JSON'
+        )
+        parser.add_argument(
+            '--regressions',
+            action='store_true',
+            help='عرض المسارات التي تجاوزت حدودها فقط'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=0,
+            help='عدد المسارات المعروضة (الأبطأ أولاً)'
+        )
+
+    def handle(self, *args, **options):
+        report = get_shared_performance_report()
+        endpoints = report['endpoints']
+        if options['regressions']:
+            endpoints = [summary for summary in endpoints if summary['regressions']]
+        if options['limit']:
+            endpoints = endpoints[:options['limit']]
+
+        if options['json']:
+            self.stdout.write(json.dumps({**report, 'endpoints': endpoints}, ensure_ascii=False, indent=2))
+            return
+
+        if not report['processes']:
+            self.stdout.write(self.style.WARNING(
+                '⚠️ لا توجد إحصاءات منشورة (هل الذاكرة المؤقتة مشتركة بين العمليات و PERFORMANCE_SHARED_STATS مفعل؟)'
+            ))
+            return
+
+        self.stdout.write(f"العمليات: {report['processes']} - الطلبات: {report['requests']}")
+        self.stdout.write(
+            f"{'endpoint':<70} {'count':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+            f"{'q p95':>6} {'ser p95':>8} {'KB p95':>8} {'over':>5}"
+        )
+        for summary in endpoints:
+            wall, queries = summary['wall_ms'], summary['queries']
+            line = (
+                f"{summary['endpoint']:<70} {summary['count']:>7} {wall['p50']:>8} {wall['p95']:>8} "
+                f"{wall['p99']:>8} {queries['p95']:>6} {summary['serialization_ms']['p95']:>8} "
+                f"{round(summary['response_bytes']['p95'] / 1024, 1):>8} {summary['over_budget']:>5}"
+            )
+            if summary['regressions']:
+                line += f"  ✗ {', '.join(summary['regressions'])} > {summary['budget']}"
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(line)
+
+        if report['regressions']:
+            self.stdout.write(self.style.ERROR(f"❌ {len(report['regressions'])} مسار تجاوز حدوده"))
+        else:
+            self.stdout.write(self.style.SUCCESS('✅ جميع المسارات ضمن حدودها'))
@@ -1,22 +1,69 @@
-import logging
+import time
 
-logger = logging.getLogger('accounts')
+from dr_mays_nutrition import instrumentation, performance
+
+
+class PerformanceMiddleware:
+    """
+    قياس أداء كل طلب حسب نمط الرابط
+    Records wall time, query count and time, response rendering time and
+    response size of every request per URL pattern (see
+    ``dr_mays_nutrition.performance``), runs ``cProfile`` for requests that
+    ask for it with the ``X-Profile`` header, and makes the per-request
+    instrumentation sampling decision. Request bodies and headers are never
+    logged.
+    """
 
-class RequestLoggingMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
 
     def __call__(self, request):
-        # Log the request
-        print(f"=== MIDDLEWARE REQUEST ===")
-        print(f"Request: {request.method} {request.path}")
-        print(f"Request data: {request.body}")
-        print(f"Request headers: {dict(request.headers)}")
-        
-        response = self.get_response(request)
-        
-        # Log the response
-        print(f"Response status: {response.status_code}")
-        print(f"=== END MIDDLEWARE ===")
-        
+        token = instrumentation.start_request()
+        try:
+            if not performance.is_enabled() and not instrumentation.is_sampled():
+                return self.get_response(request)
+            return self._measure(request)
+        finally:
+            instrumentation.finish_request(token)
+
+    def _measure(self, request):
+        request._performance_render_seconds = 0.0
+        profiler = performance.start_profile(request)
+        started = time.perf_counter()
+        try:
+            with instrumentation.measure_queries() as queries:
+                response = self.get_response(request)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+        wall = time.perf_counter() - started
+
+        key = performance.endpoint_key(request)
+        sample = performance.RequestSample(
+            wall_ms=round(wall * 1000, 1),
+            queries=queries.count,
+            query_ms=round(queries.seconds * 1000, 1),
+            serialization_ms=round(request._performance_render_seconds * 1000, 1),
+            response_bytes=0 if getattr(response, 'streaming', False) else len(response.content),
+            status=response.status_code,
+        )
+        instrumentation.event('request', endpoint=key, path=request.path, **sample._asdict())
+
+        if performance.is_enabled():
+            exceeded = performance.record(key, sample)
+            if exceeded:
+                instrumentation.event('performance.budget_exceeded', endpoint=key, metrics=exceeded)
+        if profiler is not None:
+            response['X-Profile-Id'] = performance.store_profile(key, sample, profiler)
+        return response
+
+    def process_template_response(self, request, response):
+        # زمن تحويل الاستجابة (مثل JSONRenderer في DRF) يقاس عند التصيير
+        if hasattr(request, '_performance_render_seconds'):
+            started = time.perf_counter()
+
+            def rendered(response):
+                request._performance_render_seconds += time.perf_counter() - started
+
+            response.add_post_render_callback(rendered)
         return response
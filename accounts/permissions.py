@@ -0,0 +1,23 @@
+"""
+صلاحيات DRF حسب دور المستخدم
+Role-based DRF permissions
+"""
+
+from rest_framework import permissions
+
+
+class HasRole(permissions.BasePermission):
+    """مستخدم مسجل دوره ضمن roles"""
+    roles = ()
+
+    def has_permission(self, request, view):
+        user = request.user
+        return bool(user and user.is_authenticated and user.role in self.roles)
+
+
+class IsAdmin(HasRole):
+    roles = ('admin',)
+
+
+class IsAdminOrAccountant(HasRole):
+    roles = ('admin', 'accountant')
@@ -86,7 +86,7 @@ class UserWithPatientProfileSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'username']
     
     def get_daily_calories(self, obj):
-        """Get daily calories from patient profile if user is a patient"""
+        """Get daily calories from patient profile if user is a patient (the stored value, never recalculated here)"""
         if hasattr(obj, 'patient_profile') and obj.patient_profile:
             return obj.patient_profile.daily_calories
         return None
@@ -0,0 +1,191 @@
+"""
+اختبارات الحسابات
+Account tests
+"""
+
+import json
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from dr_mays_nutrition import performance
+
+from .models import PatientProfile, User
+
+
+def writes(queries):
+    return [query['sql'] for query in queries if query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))]
+
+
+class PatientEnergyReadTests(TestCase):
+    """قراءة السعرات اليومية للمرضى لا تكتب شيئاً في قاعدة البيانات"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin', password='x', role='admin')
+        cls.patients = []
+        for index in range(3):
+            patient = User.objects.create(username=f'patient{index}', role='patient')
+            # السعرات المحفوظة قديمة (بعيدة عن المحسوبة) عمداً
+            PatientProfile.objects.create(
+                user=patient, gender='female', height=160 + index, current_weight=70 + index,
+                activity_level='moderate', goal='lose_weight', daily_calories=1500 + index,
+            )
+            cls.patients.append(patient)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def test_patient_list_returns_stored_calories_without_writing(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client_for(self.admin).get('/api/auth/patients/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(writes(queries), [])
+        rows = response.data['results'] if isinstance(response.data, dict) else response.data
+        self.assertEqual(
+            {row['id']: row['daily_calories'] for row in rows},
+            {patient.id: 1500 + index for index, patient in enumerate(self.patients)}
+        )
+
+    def test_selected_meals_get_does_not_write(self):
+        patient = self.patients[0]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client_for(patient).get(f'/api/meals/patients/{patient.id}/selected-meals/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(writes(queries), [])
+        patient.patient_profile.refresh_from_db()
+        self.assertEqual(patient.patient_profile.daily_calories, 1500)
+
+
+@override_settings(PERFORMANCE_MONITORING_ENABLED=True, PERFORMANCE_SHARED_STATS=False, PERFORMANCE_BUDGETS={})
+class PerformanceMonitoringTests(TestCase):
+    """قياس أداء المسارات في PerformanceMiddleware وتقرير performance_report_api"""
+
+    ENDPOINT = 'GET api/auth/patients/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin', password='x', role='admin')
+        cls.doctor = User.objects.create_user(username='doctor', password='x', role='doctor')
+
+    def setUp(self):
+        cache.clear()
+        performance.reset_performance_stats()
+        self.client = APIClient()
+        self.client.force_authenticate(self.doctor)
+
+    def endpoints(self, report=None):
+        report = report or performance.get_performance_report()
+        return {summary['endpoint']: summary for summary in report['endpoints']}
+
+    @override_settings(PERFORMANCE_MONITORING_ENABLED=False)
+    def test_disabled_records_nothing(self):
+        self.client.get('/api/auth/patients/')
+        self.assertEqual(self.endpoints(), {})
+
+    def test_samples_recorded_per_route(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/auth/patients/')
+        measured = len(queries)
+        self.client.get('/api/auth/patients/')
+
+        summary = self.endpoints()[self.ENDPOINT]
+        self.assertEqual(summary['count'], 2)
+        self.assertEqual(summary['errors'], 0)
+        self.assertEqual(summary['queries']['max'], measured)
+        self.assertEqual(summary['response_bytes']['max'], len(response.content))
+        self.assertGreaterEqual(summary['wall_ms']['p50'], summary['serialization_ms']['p50'])
+
+    def test_budget_exceeded_is_a_regression(self):
+        with override_settings(PERFORMANCE_BUDGETS={self.ENDPOINT: {'queries': 0}}):
+            self.client.get('/api/auth/patients/')
+            report = performance.get_performance_report()
+
+        self.assertEqual(report['regressions'], [self.ENDPOINT])
+        self.assertEqual(self.endpoints(report)[self.ENDPOINT]['over_budget'], 1)
+        self.assertEqual(self.endpoints(report)[self.ENDPOINT]['regressions'], ['queries'])
+
+    def admin_client(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        return client
+
+    def test_report_api_is_admin_only(self):
+        self.client.get('/api/auth/patients/')
+
+        self.assertEqual(self.client.get('/api/auth/performance/').status_code, 403)
+        self.assertEqual(self.client.delete('/api/auth/performance/').status_code, 403)
+
+        response = self.admin_client().get('/api/auth/performance/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(self.ENDPOINT, self.endpoints(response.data))
+
+    def test_report_api_reset(self):
+        self.client.get('/api/auth/patients/')
+
+        self.assertEqual(self.admin_client().delete('/api/auth/performance/').status_code, 204)
+        # the DELETE itself is recorded after the reset
+        self.assertEqual(list(self.endpoints()), ['DELETE api/auth/performance/'])
+
+    @override_settings(PERFORMANCE_SHARED_STATS=True)
+    def test_shared_report_keeps_every_process(self):
+        # كل عملية تحجز خانتها وتكتب مفتاحها فقط
+        with mock.patch.object(performance.os, 'getpid', return_value=101):
+            self.client.get('/api/auth/patients/')
+            performance.publish_stats()
+        with mock.patch.object(performance.os, 'getpid', return_value=102):
+            performance.publish_stats()
+            performance.publish_stats()
+
+        with mock.patch.object(performance, 'publish_stats'):
+            response = self.admin_client().get('/api/auth/performance/', {'shared': '1'})
+
+        self.assertEqual(response.data['processes'], [101, 102])
+        self.assertEqual(self.endpoints(response.data)[self.ENDPOINT]['count'], 2)
+
+
+@override_settings(INSTRUMENTATION_ENABLED=True, INSTRUMENTATION_SAMPLE_RATE=1.0)
+class InstrumentationEventTests(TestCase):
+    """أحداث instrumentation.event على مسجل instrumentation"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = User.objects.create(username='doctor', role='doctor')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.doctor)
+
+    def test_request_events_carry_fields(self):
+        with self.assertLogs('instrumentation', 'DEBUG') as logs:
+            response = self.client.get('/api/auth/patients/')
+
+        events = {record.event: record for record in logs.records}
+        self.assertEqual(events['doctor_patients.list'].fields, {'user_id': self.doctor.id, 'role': 'doctor'})
+
+        request = events['request']
+        self.assertEqual(request.levelname, 'DEBUG')
+        self.assertEqual(
+            set(request.fields),
+            {'endpoint', 'path', 'wall_ms', 'queries', 'query_ms', 'serialization_ms', 'response_bytes', 'status'}
+        )
+        self.assertEqual(request.fields['endpoint'], 'GET api/auth/patients/')
+        self.assertEqual(request.fields['path'], '/api/auth/patients/')
+        self.assertEqual(request.fields['status'], 200)
+        self.assertEqual(request.fields['response_bytes'], len(response.content))
+        self.assertGreater(request.fields['queries'], 0)
+        # السطر المكتوب JSON بنفس الحقول
+        self.assertEqual(json.loads(request.getMessage()), {'event': 'request', **request.fields})
+
+    @override_settings(INSTRUMENTATION_ENABLED=False)
+    def test_disabled_emits_nothing(self):
+        with self.assertNoLogs('instrumentation', 'DEBUG'):
+            self.client.get('/api/auth/patients/')
@@ -24,4 +24,5 @@ urlpatterns = [
     path('medical-documents/', views.MedicalDocumentListCreateView.as_view(), name='medical-documents'),
     path('doctors/', views.DoctorListView.as_view(), name='doctors'),
     path('patients/', views.DoctorPatientsView.as_view(), name='patients'),
+    path('performance/', views.performance_report_api, name='performance-report'),
 ]
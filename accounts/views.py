@@ -3,6 +3,7 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
 from django.contrib.auth import login, logout
+from dr_mays_nutrition import instrumentation, performance
 from .models import User, PatientProfile, DoctorProfile, PatientMeasurement, MedicalDocument
 from .serializers import (
     UserRegistrationSerializer, UserLoginSerializer, UserSerializer, UserWithPatientProfileSerializer,
@@ -69,6 +70,31 @@ def profile_view(request):
     return Response(user_data)
 
 
+@api_view(['GET', 'DELETE'])
+@permission_classes([permissions.IsAuthenticated])
+def performance_report_api(request):
+    """
+    تقرير أداء المسارات (للمدير فقط)
+    GET: p50/p95/p99 per endpoint for this process (``?shared=1`` merges all
+    published worker processes, ``?profiles=1`` adds the recent cProfile
+    captures). DELETE: reset this process's samples.
+    """
+    if request.user.role != 'admin':
+        return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+    
+    if request.method == 'DELETE':
+        performance.reset_performance_stats()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    
+    if request.query_params.get('shared') in ('1', 'true'):
+        report = performance.get_shared_performance_report()
+    else:
+        report = performance.get_performance_report()
+    if request.query_params.get('profiles') in ('1', 'true'):
+        report['profiles'] = performance.get_recent_profiles()
+    return Response(report)
+
+
 class PatientProfileView(generics.RetrieveUpdateAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
@@ -191,57 +217,35 @@ class PatientMeasurementListCreateView(generics.ListCreateAPIView):
         return PatientMeasurement.objects.none()
 
     def create(self, request, *args, **kwargs):
-        print(f"=== CREATE MEASUREMENT REQUEST ===")
-        print(f"User: {request.user.username} (Role: {request.user.role})")
-        print(f"Request method: {request.method}")
-        print(f"Request data: {request.data}")
-        print(f"Request headers: {dict(request.headers)}")
-        try:
-            return super().create(request, *args, **kwargs)
-        except Exception as e:
-            print(f"Exception in create: {e}")
-            import traceback
-            traceback.print_exc()
-            raise e
+        instrumentation.event(
+            'measurement.create',
+            user_id=request.user.id,
+            role=request.user.role,
+            fields=sorted(request.data.keys()),
+        )
+        return super().create(request, *args, **kwargs)
 
     def perform_create(self, serializer):
-        print(f"Creating measurement for user: {self.request.user.role}")
-        print(f"Request data: {self.request.data}")
-        print(f"Validated data: {serializer.validated_data}")
-        
         if self.request.user.role == 'patient':
             serializer.save(patient=self.request.user)
         else:
             patient_id = self.request.data.get('patient_id')
-            print(f"Patient ID from request: {patient_id}")
-            print(f"Patient ID type: {type(patient_id)}")
             
             if patient_id:
-                try:
-                    # Convert patient_id to integer if it's a string
-                    if isinstance(patient_id, str):
-                        patient_id = int(patient_id)
-                    
-                    # Check if patient exists
-                    from django.contrib.auth import get_user_model
-                    User = get_user_model()
-                    try:
-                        patient = User.objects.get(id=patient_id)
-                        print(f"Patient found: {patient.username}")
-                    except User.DoesNotExist:
-                        print(f"Patient with ID {patient_id} does not exist")
-                        from rest_framework.exceptions import ValidationError
-                        raise ValidationError(f"Patient with ID {patient_id} does not exist")
-                    
-                    serializer.save(patient_id=patient_id)
-                    print("Measurement saved successfully")
-                except Exception as e:
-                    print(f"Error saving measurement: {e}")
-                    import traceback
-                    traceback.print_exc()
-                    raise e
+                # Convert patient_id to integer if it's a string
+                if isinstance(patient_id, str):
+                    patient_id = int(patient_id)
+                
+                # Check if patient exists
+                if not User.objects.filter(id=patient_id).exists():
+                    instrumentation.event('measurement.patient_missing', patient_id=patient_id)
+                    from rest_framework.exceptions import ValidationError
+                    raise ValidationError(f"Patient with ID {patient_id} does not exist")
+                
+                measurement = serializer.save(patient_id=patient_id)
+                instrumentation.event('measurement.saved', measurement_id=measurement.id, patient_id=patient_id)
             else:
-                print("No patient_id provided")
+                instrumentation.event('measurement.patient_id_missing', user_id=self.request.user.id)
                 from rest_framework.exceptions import ValidationError
                 raise ValidationError("patient_id is required for doctors")
 
@@ -305,8 +309,7 @@ class DoctorPatientsView(generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        # Debug logging
-        print(f"DoctorPatientsView - User: {self.request.user.username} (ID: {self.request.user.id})")
+        instrumentation.event('doctor_patients.list', user_id=self.request.user.id, role=self.request.user.role)
         
         if self.request.user.role == 'doctor':
             # Get patients who have appointments with this doctor (including pending appointments)
@@ -314,12 +317,9 @@ class DoctorPatientsView(generics.ListAPIView):
             
             # Get all appointments for this doctor
             all_appointments = Appointment.objects.filter(doctor=self.request.user)
-            print(f"DoctorPatientsView - Found {all_appointments.count()} appointments for doctor")
             
             patient_ids = all_appointments.values_list('patient', flat=True).distinct()
             patients = User.objects.filter(id__in=patient_ids, role='patient').select_related('patient_profile').order_by('-id')
-            
-            print(f"DoctorPatientsView - Returning {patients.count()} patients")
             return patients
         elif self.request.user.role == 'admin':
             return User.objects.filter(role='patient').select_related('patient_profile').order_by('-id')
@@ -4,6 +4,7 @@ from .models import (
     AppointmentRating, AppointmentRescheduleRequest, TimeSlot
 )
 from accounts.serializers import UserSerializer
+from dr_mays_nutrition import instrumentation
 
 
 class DoctorAvailabilitySerializer(serializers.ModelSerializer):
@@ -58,9 +59,6 @@ class AppointmentCreateSerializer(serializers.ModelSerializer):
         
     def validate_doctor(self, value):
         """Validate that the doctor exists and has a profile"""
-        print(f"=== Doctor Validation Debug ===")
-        print(f"Doctor value received: {value} (type: {type(value)})")
-        
         # value is a User ID, not a DoctorProfile ID
         from accounts.models import User, DoctorProfile
         
@@ -68,27 +66,24 @@ class AppointmentCreateSerializer(serializers.ModelSerializer):
             # Check if value is already a User object or an ID
             if isinstance(value, User):
                 user = value
-                print(f"Received User object: {user.get_full_name()} (User ID: {user.id})")
             else:
                 # value is an ID, get the user
                 user = User.objects.get(id=value, role='doctor')
-                print(f"Found doctor user: {user.get_full_name()} (User ID: {user.id})")
             
             # Check if user has a doctor profile
             try:
                 doctor_profile = user.doctor_profile
                 if not doctor_profile.is_approved:
-                    print(f"Doctor profile not approved for user {user.id}")
+                    instrumentation.event('appointment.doctor_not_approved', doctor_id=user.id)
                     raise serializers.ValidationError("Doctor not approved")
-                print(f"Doctor profile approved: {doctor_profile.specialization}")
             except DoctorProfile.DoesNotExist:
-                print(f"No doctor profile found for user {user.id}")
+                instrumentation.event('appointment.doctor_profile_missing', doctor_id=user.id)
                 raise serializers.ValidationError("Doctor profile not found")
             
             return user
             
         except User.DoesNotExist:
-            print(f"User with ID {value} not found or not a doctor")
+            instrumentation.event('appointment.doctor_missing', doctor_id=value)
             raise serializers.ValidationError("Doctor not found")
         
     def validate_scheduled_date(self, value):
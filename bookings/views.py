@@ -4,6 +4,7 @@ from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from django.db.models import Q
 from datetime import datetime, date, timedelta, time
+from dr_mays_nutrition import instrumentation
 from .models import (
     DoctorAvailability, DoctorUnavailability, Appointment,
     AppointmentRating, AppointmentRescheduleRequest, TimeSlot
@@ -90,13 +91,14 @@ class AppointmentListCreateView(generics.ListCreateAPIView):
         return AppointmentSerializer
     
     def create(self, request, *args, **kwargs):
-        print(f"=== Appointment Creation Debug ===")
-        print(f"Request data: {request.data}")
-        print(f"User: {request.user.username} (ID: {request.user.id}, Role: {request.user.role})")
-        
         serializer = self.get_serializer(data=request.data)
         if not serializer.is_valid():
-            print(f"Serializer errors: {serializer.errors}")
+            instrumentation.event(
+                'appointment.create_invalid',
+                user_id=request.user.id,
+                role=request.user.role,
+                error_fields=sorted(serializer.errors),
+            )
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
         self.perform_create(serializer)
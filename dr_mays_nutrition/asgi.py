@@ -3,18 +3,22 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'dr_mays_nutrition.settings')
 
-application = get_asgi_application()
+# Initialise Django before importing consumers (they import models)
+django_asgi_app = get_asgi_application()
 
-# TODO: Uncomment when channels is properly configured
-# from channels.routing import ProtocolTypeRouter, URLRouter
-# from channels.auth import AuthMiddlewareStack
-# import notifications.routing
+from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
+from channels.security.websocket import AllowedHostsOriginValidator  # noqa: E402
 
-# application = ProtocolTypeRouter({
-#     "http": get_asgi_application(),
-#     "websocket": AuthMiddlewareStack(
-#         URLRouter(
-#             notifications.routing.websocket_urlpatterns
-#         )
-#     ),
-# })
+import notifications.routing  # noqa: E402
+from notifications.middleware import TicketAuthMiddlewareStack  # noqa: E402
+
+application = ProtocolTypeRouter({
+    "http": django_asgi_app,
+    "websocket": AllowedHostsOriginValidator(
+        TicketAuthMiddlewareStack(
+            URLRouter(
+                notifications.routing.websocket_urlpatterns
+            )
+        )
+    ),
+})
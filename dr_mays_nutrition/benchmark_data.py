@@ -0,0 +1,452 @@
+"""
+بيانات قياس أداء المسارات
+Seed data for the endpoint benchmark
+
+``seed_benchmark_data`` fills an empty (test) database at realistic
+volumes. The reference data (meal types, foods, doctors, templates) comes
+from the existing ``setup_*`` / ``create_sample_*`` commands; generators
+then scale it up with bulk inserts: food variants, patients with profiles
+and measurements, weeks of meal plans with meals, ingredients and meal
+selections, doctor availability, appointments, invoices and payments,
+plus the rows that only some URLs take as a parameter (recipes, coupons,
+refunds, reschedule requests, notifications and chat messages).
+
+Everything is drawn from one seeded ``random.Random`` so two runs with the
+same ``SeedVolumes`` produce the same rows, and query counts measured on
+them are comparable. Bulk inserts send no signals, so the food catalogue is
+invalidated and the stored nutrition totals are rebuilt at the end.
+"""
+
+import io
+import random
+from datetime import date, time, timedelta
+from decimal import Decimal
+from typing import Dict, List, NamedTuple
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import PatientMeasurement, PatientProfile, User
+from bookings.models import Appointment, AppointmentRescheduleRequest, DoctorAvailability
+from meal_plans.food_catalogue import invalidate_food_catalogue
+from meal_plans.models import (
+    Food, Meal, MealIngredient, MealPlan, MealPlanTemplate, MealType, PatientMealSelection, Recipe,
+    RecipeIngredient
+)
+from meal_plans.nutrition_totals import refresh_meal_totals
+from notifications.models import ChatMessage, Notification
+from payments.models import DiscountCoupon, Invoice, Payment, PaymentProvider, Refund
+
+
+BASE_COMMANDS = (
+    'setup_meal_types',
+    'setup_foods',
+    'setup_comprehensive_foods',
+    'setup_specialized_foods',
+    'create_sample_doctors',
+    'setup_meal_templates',
+)
+
+BENCHMARK_PASSWORD = 'benchmark-pass'
+PLAN_MEAL_TYPES = ('breakfast', 'lunch', 'dinner', 'snack')
+INGREDIENTS_PER_MEAL = 4
+MEASUREMENTS_PER_PATIENT = 4
+# أيام الأسبوع التي يعمل فيها الأطباء (السبت إلى الخميس)
+WORKING_WEEKDAYS = (0, 1, 2, 3, 5, 6)
+RECIPES = 50
+INGREDIENTS_PER_RECIPE = 5
+COUPONS = 10
+NOTIFICATIONS_PER_PATIENT = 5
+MESSAGES_PER_PATIENT = 4
+# نسبة المواعيد التي لها طلب إعادة جدولة والمدفوعات التي لها طلب استرداد
+RESCHEDULE_RATIO = 0.1
+REFUND_RATIO = 0.1
+BATCH_SIZE = 2000
+TOTALS_BATCH_SIZE = 500
+
+
+class SeedVolumes(NamedTuple):
+    """أحجام البيانات المولدة"""
+    foods: int = 3000
+    patients: int = 300
+    weeks: int = 2
+    appointments_per_patient: int = 3
+    seed: int = 2024
+
+
+class BenchmarkData(NamedTuple):
+    """المستخدمون والكائنات التي تستخدمها سيناريوهات القياس"""
+    volumes: SeedVolumes
+    admin: User
+    doctor: User
+    patient: User
+    counts: Dict[str, int]
+
+
+def _quiet_command(name: str) -> None:
+    call_command(name, stdout=io.StringIO(), stderr=io.StringIO())
+
+
+def _jitter(rng: random.Random, value: float, spread: float = 0.1) -> float:
+    return round(value * rng.uniform(1 - spread, 1 + spread), 2)
+
+
+def _seed_admin() -> User:
+    admin = User.objects.filter(role='admin').first()
+    if admin is None:
+        admin = User.objects.create_superuser(
+            'benchmark_admin', 'benchmark_admin@example.com', BENCHMARK_PASSWORD, role='admin'
+        )
+    return admin
+
+
+def _seed_foods(rng: random.Random, total: int) -> List[Food]:
+    """أصناف مشتقة من الأطعمة المرجعية حتى يصل العدد إلى total"""
+    base_foods = list(Food.objects.order_by('id'))
+    variants = []
+    for index in range(max(total - len(base_foods), 0)):
+        base = base_foods[index % len(base_foods)]
+        variants.append(Food(
+            name=f'{base.name} #{index + 1}',
+            name_ar=f'{base.name_ar or base.name} {index + 1}',
+            category_id=base.category_id,
+            calories_per_100g=_jitter(rng, base.calories_per_100g),
+            protein_per_100g=_jitter(rng, base.protein_per_100g),
+            carbs_per_100g=_jitter(rng, base.carbs_per_100g),
+            fat_per_100g=_jitter(rng, base.fat_per_100g),
+            fiber_per_100g=_jitter(rng, base.fiber_per_100g),
+            is_active=rng.random() > 0.05,
+        ))
+    Food.objects.bulk_create(variants, batch_size=BATCH_SIZE)
+    return list(Food.objects.filter(is_active=True, calories_per_100g__gt=0).order_by('id'))
+
+
+def _seed_patients(rng: random.Random, count: int) -> List[User]:
+    password = make_password(BENCHMARK_PASSWORD)
+    User.objects.bulk_create([
+        User(
+            username=f'benchmark_patient_{index}',
+            email=f'benchmark_patient_{index}@example.com',
+            first_name=f'مريض {index}',
+            last_name='قياس',
+            role='patient',
+            password=password,
+            date_of_birth=date(1960 + rng.randrange(45), rng.randrange(1, 13), rng.randrange(1, 29)),
+        )
+        for index in range(count)
+    ], batch_size=BATCH_SIZE)
+    patients = list(User.objects.filter(username__startswith='benchmark_patient_').order_by('id'))
+
+    goals = [choice for choice, _ in PatientProfile.GOAL_CHOICES]
+    activity_levels = [choice for choice, _ in PatientProfile.ACTIVITY_LEVEL_CHOICES]
+    PatientProfile.objects.bulk_create([
+        PatientProfile(
+            user=patient,
+            gender=rng.choice(('male', 'female')),
+            height=rng.randrange(150, 195),
+            current_weight=rng.randrange(50, 130),
+            target_weight=rng.randrange(55, 95),
+            activity_level=rng.choice(activity_levels),
+            goal=rng.choice(goals),
+        )
+        for patient in patients
+    ], batch_size=BATCH_SIZE)
+
+    PatientMeasurement.objects.bulk_create([
+        PatientMeasurement(
+            patient=patient,
+            weight=rng.randrange(50, 130),
+            body_fat_percentage=rng.randrange(12, 40),
+            waist_circumference=rng.randrange(65, 120),
+        )
+        for patient in patients
+        for _ in range(MEASUREMENTS_PER_PATIENT)
+    ], batch_size=BATCH_SIZE)
+    return patients
+
+
+def seed_reference_data(commands=BASE_COMMANDS) -> Dict[str, MealType]:
+    """تشغيل أوامر البيانات المرجعية وإرجاع أنواع الوجبات التي تستخدمها الخطط"""
+    for command in commands:
+        _quiet_command(command)
+    # الأسماء التي تبحث عنها واجهات إنشاء الخطط (setup_meal_types ينشئ أسماء مختلفة)
+    return {
+        name: MealType.objects.get_or_create(name=name, defaults={'name_ar': name, 'order': order})[0]
+        for order, name in enumerate(PLAN_MEAL_TYPES)
+    }
+
+
+def _seed_meal_plans(rng: random.Random, patients: List[User], doctors: List[User], foods: List[Food],
+                     meal_types: Dict[str, MealType], weeks: int) -> List[MealPlan]:
+    """خطة أسبوعية لكل أسبوع لكل مريض (الأخيرة نشطة) مع وجباتها ومكوناتها"""
+    templates = list(MealPlanTemplate.objects.order_by('id'))
+    first_week = date.today() - timedelta(weeks=weeks - 1)
+
+    plans = []
+    for patient in patients:
+        for week in range(weeks):
+            start = first_week + timedelta(weeks=week)
+            template = rng.choice(templates) if templates else None
+            plans.append(MealPlan(
+                patient=patient,
+                doctor=rng.choice(doctors),
+                template=template,
+                title=f'خطة الأسبوع {week + 1}',
+                start_date=start,
+                end_date=start + timedelta(days=6),
+                target_calories=template.target_calories if template else 2000,
+                target_protein=25,
+                target_carbs=45,
+                target_fat=30,
+                is_active=week == weeks - 1,
+                status='active' if week == weeks - 1 else 'completed',
+            ))
+    MealPlan.objects.bulk_create(plans, batch_size=BATCH_SIZE)
+    plans = list(MealPlan.objects.filter(patient__in=patients).order_by('id'))
+
+    Meal.objects.bulk_create([
+        Meal(
+            meal_plan=plan,
+            meal_type=meal_types[type_name],
+            day_of_week=day,
+            name=f'{type_name} {day + 1}',
+            description='وجبة مولدة لقياس الأداء',
+            prep_time=rng.randrange(5, 45),
+        )
+        for plan in plans
+        for day in range(7)
+        for type_name in PLAN_MEAL_TYPES
+    ], batch_size=BATCH_SIZE)
+
+    ingredients = []
+    for meal_id in Meal.objects.filter(meal_plan__in=plans).values_list('id', flat=True).iterator():
+        for food in rng.sample(foods, INGREDIENTS_PER_MEAL):
+            ingredients.append(MealIngredient(meal_id=meal_id, food=food, amount=rng.randrange(20, 250, 5)))
+    MealIngredient.objects.bulk_create(ingredients, batch_size=BATCH_SIZE)
+    return plans
+
+
+def _seed_selections(rng: random.Random, plans: List[MealPlan]) -> None:
+    """اختيارات المريض من وجبات خطته النشطة"""
+    selections = []
+    for plan in plans:
+        if not plan.is_active:
+            continue
+        for meal_type in PLAN_MEAL_TYPES:
+            calories = rng.randrange(150, 800)
+            selections.append(PatientMealSelection(
+                patient_id=plan.patient_id,
+                meal_plan=plan,
+                meal_name=f'{meal_type} {plan.id}',
+                meal_type=meal_type,
+                calories=calories,
+                protein=round(calories * 0.25 / 4, 1),
+                carbs=round(calories * 0.45 / 4, 1),
+                fat=round(calories * 0.30 / 9, 1),
+                ingredients=[{'food_id': 1, 'amount': 100, 'calories': calories}],
+            ))
+    PatientMealSelection.objects.bulk_create(selections, batch_size=BATCH_SIZE)
+
+
+def _seed_appointments(rng: random.Random, patients: List[User], doctors: List[User],
+                       per_patient: int) -> List[Appointment]:
+    DoctorAvailability.objects.bulk_create([
+        DoctorAvailability(doctor=doctor, weekday=weekday, start_time=time(9), end_time=time(17))
+        for doctor in doctors
+        for weekday in WORKING_WEEKDAYS
+    ], ignore_conflicts=True)
+
+    statuses = [choice for choice, _ in Appointment.STATUS_CHOICES]
+    taken = set()
+    appointments = []
+    for patient in patients:
+        for _ in range(per_patient):
+            while True:
+                doctor = rng.choice(doctors)
+                day = date.today() + timedelta(days=rng.randrange(-60, 30))
+                slot = time(rng.randrange(9, 17), rng.choice((0, 30)))
+                if (doctor.id, day, slot) not in taken:
+                    taken.add((doctor.id, day, slot))
+                    break
+            appointments.append(Appointment(
+                patient=patient,
+                doctor=doctor,
+                scheduled_date=day,
+                scheduled_time=slot,
+                status=rng.choice(statuses),
+                consultation_fee=Decimal('25000'),
+            ))
+    Appointment.objects.bulk_create(appointments, batch_size=BATCH_SIZE)
+    return list(Appointment.objects.filter(patient__in=patients).order_by('id'))
+
+
+def _seed_payments(rng: random.Random, appointments: List[Appointment]) -> None:
+    """فاتورة ودفعة لنصف المواعيد تقريباً"""
+    provider, _ = PaymentProvider.objects.get_or_create(
+        name='zaincash', defaults={'display_name': 'ZainCash', 'display_name_ar': 'زين كاش'}
+    )
+    year = date.today().year
+    invoices = [
+        Invoice(
+            invoice_number=f'BENCH-{year}-{index:06d}',
+            user_id=appointment.patient_id,
+            service_type='consultation',
+            appointment=appointment,
+            subtotal=appointment.consultation_fee,
+            total_amount=appointment.consultation_fee,
+            paid_amount=appointment.consultation_fee,
+            status='paid',
+            due_date=appointment.scheduled_date,
+        )
+        for index, appointment in enumerate(appointments)
+        if rng.random() < 0.5
+    ]
+    Invoice.objects.bulk_create(invoices, batch_size=BATCH_SIZE)
+    Payment.objects.bulk_create([
+        Payment(
+            invoice=invoice,
+            user_id=invoice.user_id,
+            provider=provider,
+            amount=invoice.total_amount,
+            net_amount=invoice.total_amount,
+            status='completed',
+        )
+        for invoice in Invoice.objects.filter(invoice_number__startswith='BENCH-')
+    ], batch_size=BATCH_SIZE)
+
+
+def _seed_recipes(rng: random.Random, doctors: List[User], foods: List[Food]) -> None:
+    difficulty_levels = [choice for choice, _ in Recipe._meta.get_field('difficulty_level').choices]
+    Recipe.objects.bulk_create([
+        Recipe(
+            name=f'Recipe {index + 1}',
+            name_ar=f'وصفة {index + 1}',
+            description='وصفة مولدة لقياس الأداء',
+            instructions='-',
+            prep_time=rng.randrange(5, 30),
+            cook_time=rng.randrange(10, 90),
+            servings=rng.randrange(1, 6),
+            difficulty_level=rng.choice(difficulty_levels),
+            created_by=rng.choice(doctors),
+            is_public=index % 2 == 0,
+        )
+        for index in range(RECIPES)
+    ])
+    RecipeIngredient.objects.bulk_create([
+        RecipeIngredient(recipe_id=recipe_id, food=food, amount=rng.randrange(20, 250, 5))
+        for recipe_id in Recipe.objects.order_by('id').values_list('id', flat=True)
+        for food in rng.sample(foods, INGREDIENTS_PER_RECIPE)
+    ], batch_size=BATCH_SIZE)
+
+
+def _seed_coupons(admin: User) -> None:
+    now = timezone.now()
+    DiscountCoupon.objects.bulk_create([
+        DiscountCoupon(
+            code=f'BENCH{index + 1}',
+            name=f'Coupon {index + 1}',
+            discount_type='percentage',
+            discount_value=Decimal('10'),
+            valid_from=now - timedelta(days=30),
+            valid_until=now + timedelta(days=60),
+            created_by=admin,
+        )
+        for index in range(COUPONS)
+    ])
+
+
+def _seed_requests(rng: random.Random, appointments: List[Appointment]) -> None:
+    """طلبات إعادة جدولة واسترداد معلقة لجزء من المواعيد والمدفوعات"""
+    AppointmentRescheduleRequest.objects.bulk_create([
+        AppointmentRescheduleRequest(
+            appointment=appointment,
+            requested_by_id=appointment.patient_id,
+            new_date=appointment.scheduled_date + timedelta(days=7),
+            new_time=appointment.scheduled_time,
+            reason='طلب مولد لقياس الأداء',
+        )
+        for appointment in appointments
+        if rng.random() < RESCHEDULE_RATIO
+    ], batch_size=BATCH_SIZE)
+    Refund.objects.bulk_create([
+        Refund(
+            payment=payment,
+            amount=payment.amount,
+            reason='طلب مولد لقياس الأداء',
+            requested_by_id=payment.user_id,
+        )
+        for payment in Payment.objects.order_by('id')
+        if rng.random() < REFUND_RATIO
+    ], batch_size=BATCH_SIZE)
+
+
+def _seed_messages(rng: random.Random, patients: List[User], doctors: List[User]) -> None:
+    """إشعارات ومحادثة مع طبيب لكل مريض"""
+    notification_types = [choice for choice, _ in Notification.TYPE_CHOICES]
+    Notification.objects.bulk_create([
+        Notification(
+            recipient=patient,
+            notification_type=rng.choice(notification_types),
+            title=f'إشعار {index + 1}',
+            message='إشعار مولد لقياس الأداء',
+            is_read=rng.random() < 0.5,
+        )
+        for patient in patients
+        for index in range(NOTIFICATIONS_PER_PATIENT)
+    ], batch_size=BATCH_SIZE)
+
+    messages = []
+    for patient in patients:
+        doctor = rng.choice(doctors)
+        for index in range(MESSAGES_PER_PATIENT):
+            sender, recipient = (doctor, patient) if index % 2 == 0 else (patient, doctor)
+            messages.append(ChatMessage(
+                sender=sender, recipient=recipient, message=f'رسالة {index + 1}', is_read=rng.random() < 0.5
+            ))
+    ChatMessage.objects.bulk_create(messages, batch_size=BATCH_SIZE)
+
+
+def seed_benchmark_data(volumes: SeedVolumes = SeedVolumes()) -> BenchmarkData:
+    """تعبئة قاعدة بيانات فارغة ببيانات القياس"""
+    meal_types = seed_reference_data()
+
+    rng = random.Random(volumes.seed)
+    with transaction.atomic():
+        admin = _seed_admin()
+        doctors = list(User.objects.filter(role='doctor').order_by('id'))
+        foods = _seed_foods(rng, volumes.foods)
+        patients = _seed_patients(rng, volumes.patients)
+        plans = _seed_meal_plans(rng, patients, doctors, foods, meal_types, volumes.weeks)
+        _seed_selections(rng, plans)
+        appointments = _seed_appointments(rng, patients, doctors, volumes.appointments_per_patient)
+        _seed_payments(rng, appointments)
+        _seed_recipes(rng, doctors, foods)
+        _seed_coupons(admin)
+        _seed_requests(rng, appointments)
+        _seed_messages(rng, patients, doctors)
+
+    invalidate_food_catalogue()
+    # على دفعات: bulk_update لعدد كبير من الوجبات دفعة واحدة بطيء جداً في SQLite
+    meal_ids = list(Meal.objects.order_by('id').values_list('id', flat=True))
+    for start in range(0, len(meal_ids), TOTALS_BATCH_SIZE):
+        refresh_meal_totals(meal_ids[start:start + TOTALS_BATCH_SIZE])
+
+    counts = {
+        'foods': Food.objects.count(),
+        'patients': len(patients),
+        'meal_plans': MealPlan.objects.count(),
+        'meals': Meal.objects.count(),
+        'meal_ingredients': MealIngredient.objects.count(),
+        'meal_selections': PatientMealSelection.objects.count(),
+        'appointments': Appointment.objects.count(),
+        'payments': Payment.objects.count(),
+        'recipes': Recipe.objects.count(),
+        'coupons': DiscountCoupon.objects.count(),
+        'reschedule_requests': AppointmentRescheduleRequest.objects.count(),
+        'refunds': Refund.objects.count(),
+        'notifications': Notification.objects.count(),
+        'chat_messages': ChatMessage.objects.count(),
+    }
+    return BenchmarkData(volumes, admin, doctors[0], patients[0], counts)
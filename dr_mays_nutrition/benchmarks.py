@@ -0,0 +1,434 @@
+"""
+قياس عدد الاستعلامات والزمن والذاكرة لكل مسار
+Endpoint benchmark against a JSON baseline
+
+``run_benchmark`` requests every URL pattern under the API prefixes
+(``api/auth``, ``api/meals``, ``api/bookings``, ``api/payments``,
+``api/reports`` and ``api/notifications`` when that app is enabled) on a
+database filled by ``benchmark_data.seed_benchmark_data``:
+
+* every pattern with ``GET`` as the admin, and the patient-facing list
+  endpoints in ``ROLE_ENDPOINTS`` as a doctor and as a patient;
+* the write paths in ``WRITE_SCENARIOS`` with realistic payloads.
+
+Routes that do not answer ``GET`` and have no write scenario are listed in
+``UNMEASURED_ROUTES`` with the reason; every skipped case is reported in the
+results with its reason, and the regression test fails on a skip that is
+neither a write route covered by a scenario nor listed there.
+
+URL parameters are filled from the seeded rows (``pk`` from the view's
+model). Each request runs inside a transaction that is rolled back (its
+``on_commit`` callbacks are run first and counted), after one warm-up
+request, so every endpoint sees the same data. For each one
+the benchmark records the status code, the number of queries, the median
+latency and the peak memory allocated (``tracemalloc``).
+
+``compare`` checks a run against a saved baseline. A metric regresses when
+it exceeds the baseline by more than its relative threshold and by more
+than a small absolute slack, so one extra query on a 3-query endpoint is
+caught but latency noise of a few milliseconds is not. A changed status
+code is always a regression, so a baseline never records a server error
+(``save_baseline`` refuses one): a 5xx is a bug to fix, not a value to keep.
+
+``dr_mays_nutrition.tests`` runs the same benchmark under ``manage.py test``
+and fails on query-count and status regressions only; latency and memory
+depend on the machine and are checked by ``benchmark_endpoints``.
+"""
+
+import json
+import re
+import statistics
+import time
+import tracemalloc
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from django.db import connection, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, get_resolver
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from bookings.models import Appointment, AppointmentRescheduleRequest
+from meal_plans.models import Meal, MealPlan, MealPlanTemplate, Recipe
+from notifications.models import ChatMessage, Notification
+from payments.models import DiscountCoupon, Payment, Refund
+
+from .benchmark_data import BenchmarkData
+
+
+API_PREFIXES = (
+    'api/auth/', 'api/meals/', 'api/bookings/', 'api/payments/', 'api/reports/', 'api/notifications/'
+)
+DEFAULT_BASELINE = Path(__file__).with_name('benchmark_baseline.json')
+DEFAULT_REPEAT = 3
+METRICS = ('queries', 'latency_ms', 'memory_kb')
+DEFAULT_THRESHOLDS = {'queries': 0.10, 'latency_ms': 1.0, 'memory_kb': 0.5}
+# فرق مطلق أدنى قبل اعتبار الزيادة تراجعاً (لتجنب التذبذب في القيم الصغيرة)
+MIN_REGRESSION = {'queries': 1, 'latency_ms': 10.0, 'memory_kb': 256}
+
+# مسارات تقاس أيضاً بصلاحيات الطبيب والمريض
+ROLE_ENDPOINTS = (
+    'api/auth/patients/',
+    'api/auth/measurements/',
+    'api/meals/meal-plans/',
+    'api/meals/patients/<int:patient_id>/meal-plans/',
+    'api/meals/patients/<int:patient_id>/selected-meals/',
+    'api/bookings/appointments/',
+)
+
+# مسارات كتابة بدون سيناريو قياس (وسبب ذلك)
+UNMEASURED_ROUTES = {
+    'api/auth/login/': 'authentication, not a data path',
+    'api/auth/logout/': 'authentication, not a data path',
+    'api/auth/register/': 'authentication, not a data path',
+    'api/bookings/appointments/<int:appointment_id>/cancel/': 'same path as confirm',
+    'api/bookings/appointments/<int:appointment_id>/complete/': 'same path as confirm',
+    'api/meals/iraqi-nutrition/custom/': 'covered by nutrition-calculator/bulk',
+    'api/meals/meal-plans/<int:meal_plan_id>/generate-meals/': 'optimizer run, covered by the meal_plans tests',
+    'api/meals/meal-plans/<int:meal_plan_id>/save-selected-meals/': 'covered by selected-meals',
+    'api/meals/templates/create/': 'covered by meal-templates/create-plan',
+    'api/payments/payments/<uuid:payment_id>/process/': 'calls the payment provider',
+}
+# مسارات دوال (بدون queryset) تأخذ pk ونموذجها
+ROUTE_MODELS = {
+    'api/notifications/<int:pk>/read/': Notification,
+    'api/notifications/chat/messages/<int:pk>/read/': ChatMessage,
+}
+# الحقول التي تربط الصف بالمريض عند اختيار pk
+OWNER_FIELDS = ('patient', 'user', 'recipient')
+
+ROUTE_PARAMETER = re.compile(r'<(?:\w+:)?(\w+)>|\(\?P<(\w+)>[^)]*\)')
+
+
+class Endpoint(NamedTuple):
+    route: str
+    callback: Callable
+    parameters: Tuple[str, ...]
+
+
+class Measurement(NamedTuple):
+    status: int
+    queries: int
+    latency_ms: float
+    memory_kb: int
+
+
+class Regression(NamedTuple):
+    endpoint: str
+    metric: str
+    baseline: float
+    current: float
+
+    def __str__(self):
+        return f'{self.endpoint}: {self.metric} {self.baseline} -> {self.current}'
+
+
+# ===== اكتشاف المسارات =====
+
+def _segment(pattern) -> str:
+    # أنماط re_path (مثل مسارات الـ router) تبدأ بـ ^ وتنتهي بـ $
+    segment = str(pattern.pattern)
+    return segment[segment.startswith('^'):len(segment) - segment.endswith('$')]
+
+
+def _walk(patterns, prefix: str = '') -> Iterator[Tuple[str, URLPattern]]:
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from _walk(pattern.url_patterns, prefix + _segment(pattern))
+        else:
+            yield prefix + _segment(pattern), pattern
+
+
+def discover_endpoints() -> List[Endpoint]:
+    """كل أنماط الروابط تحت بادئات الواجهة (بدون نسخ format الخاصة بالموجه)"""
+    endpoints = {}
+    for route, pattern in _walk(get_resolver().url_patterns):
+        if not route.startswith(API_PREFIXES) or 'format' in pattern.pattern.regex.groupindex:
+            continue
+        parameters = tuple(first or second for first, second in ROUTE_PARAMETER.findall(route))
+        endpoints.setdefault(route, Endpoint(route, pattern.callback, parameters))
+    return sorted(endpoints.values())
+
+
+def missing_prefixes(endpoints: List[Endpoint]) -> List[str]:
+    """بادئات لا توجد لها مسارات (تطبيقات غير مفعلة مثل notifications)"""
+    return [prefix for prefix in API_PREFIXES if not any(e.route.startswith(prefix) for e in endpoints)]
+
+
+# ===== قيم المعاملات =====
+
+def _view_model(callback):
+    view = getattr(callback, 'cls', None) or getattr(callback, 'view_class', None)
+    queryset = getattr(view, 'queryset', None)
+    if queryset is not None:
+        return queryset.model
+    serializer = getattr(view, 'serializer_class', None)
+    return getattr(getattr(serializer, 'Meta', None), 'model', None)
+
+
+class Fixtures:
+    """الصفوف المستخدمة لتعبئة معاملات الروابط وحمولات الكتابة"""
+
+    def __init__(self, data: BenchmarkData):
+        self.data = data
+        self.patient = data.patient
+        self.plan = MealPlan.objects.filter(patient=self.patient, is_active=True).first()
+        self.meal = Meal.objects.filter(meal_plan=self.plan).order_by('id').first()
+        self.template = MealPlanTemplate.objects.filter(is_public=True).order_by('id').first() \
+            or MealPlanTemplate.objects.order_by('id').first()
+        self.appointment = Appointment.objects.filter(patient=self.patient).order_by('id').first()
+        self.payment = Payment.objects.filter(user=self.patient).order_by('id').first()
+        self.coupon = DiscountCoupon.objects.order_by('id').first()
+        self.values = {
+            'patient_id': self.patient.id,
+            'user_id': self.patient.id,
+            'meal_plan_id': self.plan and self.plan.id,
+            'meal_id': self.meal and self.meal.id,
+            'template_id': self.template and self.template.id,
+            'appointment_id': self.appointment and self.appointment.id,
+            'payment_id': self.payment and self.payment.payment_id,
+            'recipe_id': Recipe.objects.filter(is_public=True).order_by('id').values_list('id', flat=True).first(),
+            'refund_id': Refund.objects.filter(status='requested').order_by('id').values_list('id', flat=True).first(),
+            'request_id': AppointmentRescheduleRequest.objects.filter(status='pending').order_by('id')
+            .values_list('id', flat=True).first(),
+        }
+
+    def value(self, name: str, endpoint: Endpoint) -> Optional[object]:
+        if name != 'pk':
+            return self.values.get(name)
+        model = ROUTE_MODELS.get(endpoint.route) or _view_model(endpoint.callback)
+        if model is None:
+            return None
+        if model is User:
+            return self.patient.id
+        rows = model.objects.order_by('pk')
+        field_names = {field.name for field in model._meta.get_fields()}
+        for owner in OWNER_FIELDS:
+            if owner in field_names:
+                rows = rows.filter(**{owner: self.patient})
+                break
+        return rows.values_list('pk', flat=True).first()
+
+    def url(self, endpoint: Endpoint) -> Tuple[Optional[str], Optional[str]]:
+        """الرابط الفعلي، أو سبب التخطي"""
+        url = endpoint.route
+        for name in endpoint.parameters:
+            value = self.value(name, endpoint)
+            if value is None:
+                return None, f'no seeded row for {name}'
+            url = ROUTE_PARAMETER.sub(str(value), url, count=1)
+        return '/' + url, None
+
+    def selected_meals(self) -> List[Dict]:
+        """وجبات اليوم الأول من الخطة بالصيغة التي ترسلها واجهة المريض"""
+        meals = Meal.objects.filter(meal_plan=self.plan, day_of_week=0).select_related('meal_type')
+        return [
+            {
+                'meal_name': meal.name,
+                'meal_type': meal.meal_type.name,
+                'ingredients': [
+                    {
+                        'food_id': ingredient.food_id,
+                        'amount': float(ingredient.amount),
+                        'calories_per_100g': float(ingredient.food.calories_per_100g),
+                        'protein_per_100g': float(ingredient.food.protein_per_100g),
+                        'carbs_per_100g': float(ingredient.food.carbs_per_100g),
+                        'fat_per_100g': float(ingredient.food.fat_per_100g),
+                    }
+                    for ingredient in meal.ingredients.all()
+                ],
+            }
+            for meal in meals.prefetch_related('ingredients__food')
+        ]
+
+
+# سيناريوهات الكتابة: (الدور، الطريقة، النمط، الحمولة)
+WRITE_SCENARIOS = (
+    ('admin', 'post', 'api/meals/patients/<int:patient_id>/selected-meals/',
+     lambda f: {'meal_plan_id': f.plan.id, 'selected_meals': f.selected_meals()}),
+    ('admin', 'post', 'api/meals/meal-templates/create-plan/',
+     lambda f: {'template_id': f.template.id, 'patient_id': f.patient.id,
+                'start_date': date.today().isoformat(),
+                'end_date': (date.today() + timedelta(days=6)).isoformat()}),
+    ('doctor', 'post', 'api/auth/measurements/',
+     lambda f: {'patient_id': f.patient.id, 'weight': 80, 'body_fat_percentage': 25}),
+    ('admin', 'post', 'api/meals/meal-plans/<int:meal_plan_id>/update-status/',
+     lambda f: {'status': 'acknowledged'}),
+    ('admin', 'post', 'api/bookings/appointments/<int:appointment_id>/confirm/', lambda f: {}),
+    ('admin', 'post', 'api/meals/nutrition-calculator/bulk/',
+     lambda f: {'lists': [{'id': index, 'foods': [{'food_id': item['food_id'], 'amount': item['amount']}
+                                                   for item in selection['ingredients']]}
+                          for index, selection in enumerate(f.selected_meals())]}),
+    ('admin', 'post', 'api/bookings/reschedule-requests/<int:request_id>/approve/', lambda f: {}),
+    ('admin', 'post', 'api/bookings/reschedule-requests/<int:request_id>/reject/',
+     lambda f: {'reason': 'benchmark'}),
+    ('admin', 'post', 'api/payments/refunds/<int:refund_id>/approve/', lambda f: {'admin_notes': 'benchmark'}),
+    ('admin', 'post', 'api/payments/refunds/<int:refund_id>/reject/', lambda f: {'admin_notes': 'benchmark'}),
+    ('patient', 'post', 'api/payments/coupons/validate/',
+     lambda f: {'code': f.coupon.code, 'amount': 25000, 'service_type': 'consultation'}),
+    ('patient', 'post', 'api/notifications/<int:pk>/read/', lambda f: {}),
+    ('patient', 'post', 'api/notifications/mark-all-read/', lambda f: {}),
+    ('patient', 'post', 'api/notifications/chat/messages/<int:pk>/read/', lambda f: {}),
+    ('admin', 'post', 'api/notifications/chat/<int:user_id>/send/', lambda f: {'message': 'benchmark'}),
+    ('patient', 'post', 'api/notifications/ws-ticket/', lambda f: {}),
+    ('patient', 'patch', 'api/auth/user/', lambda f: {'first_name': 'مريض'}),
+)
+WRITE_ROUTES = frozenset(route for _, _, route, _ in WRITE_SCENARIOS)
+
+
+def skip_reason(route: str) -> str:
+    """سبب تخطي GET لمسار لا يقبله"""
+    if route in WRITE_ROUTES:
+        return 'write route, measured by WRITE_SCENARIOS'
+    if route in UNMEASURED_ROUTES:
+        return f'write route, not measured: {UNMEASURED_ROUTES[route]}'
+    return 'method not allowed'
+
+
+# ===== القياس =====
+
+def _request(client: APIClient, method: str, url: str, payload) -> int:
+    response = getattr(client, method)(url, payload, format='json') if payload is not None \
+        else getattr(client, method)(url)
+    if getattr(response, 'streaming', False):
+        b''.join(response.streaming_content)
+    response.close()
+    return response.status_code
+
+
+def _rolled_back(call):
+    with transaction.atomic():
+        # دوال on_commit (المجاميع وسجل التغييرات) جزء من كلفة الطلب
+        with TestCase.captureOnCommitCallbacks(execute=True):
+            result = call()
+        transaction.set_rollback(True)
+    return result
+
+
+def measure(client: APIClient, method: str, url: str, payload=None, repeat: int = DEFAULT_REPEAT) -> Measurement:
+    """طلب إحماء ثم repeat طلبات مقاسة (كل طلب داخل معاملة يتم التراجع عنها)"""
+    _rolled_back(lambda: _request(client, method, url, payload))
+
+    latencies, queries, status = [], 0, None
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            status = _rolled_back(lambda: _request(client, method, url, payload))
+            latencies.append((time.perf_counter() - started) * 1000)
+        # بدون استعلامات SAVEPOINT الخاصة بالمعاملة الخارجية
+        queries = sum(1 for query in captured.captured_queries if 'SAVEPOINT' not in query['sql'])
+
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    current = tracemalloc.get_traced_memory()[0]
+    _rolled_back(lambda: _request(client, method, url, payload))
+    peak = tracemalloc.get_traced_memory()[1]
+    if not tracing:
+        tracemalloc.stop()
+
+    return Measurement(status, queries, round(statistics.median(latencies), 1), round((peak - current) / 1024))
+
+
+def run_benchmark(data: BenchmarkData, repeat: int = DEFAULT_REPEAT,
+                  only: Optional[str] = None, progress: Optional[Callable[[str], None]] = None) -> Dict:
+    """قياس كل المسارات وإرجاع النتائج بصيغة ملف الأساس"""
+    fixtures = Fixtures(data)
+    clients = {}
+    for role, user in (('admin', data.admin), ('doctor', data.doctor), ('patient', data.patient)):
+        # أخطاء الخادم تسجل كحالة 500 بدلاً من إيقاف القياس
+        clients[role] = APIClient(raise_request_exception=False)
+        clients[role].force_authenticate(user)
+
+    endpoints = discover_endpoints()
+    cases = [('admin', 'get', endpoint, None) for endpoint in endpoints]
+    by_route = {endpoint.route: endpoint for endpoint in endpoints}
+    cases += [
+        (role, 'get', by_route[route], None)
+        for route in ROLE_ENDPOINTS if route in by_route
+        for role in ('doctor', 'patient')
+    ]
+    cases += [
+        (role, method, by_route[route], build)
+        for role, method, route, build in WRITE_SCENARIOS if route in by_route
+    ]
+
+    results, skipped = {}, {}
+    for prefix in missing_prefixes(endpoints):
+        skipped[f'{prefix}*'] = 'no URL patterns (app not enabled)'
+
+    for role, method, endpoint, build in cases:
+        key = f'{method.upper()} {endpoint.route} [{role}]'
+        if only and only not in key:
+            continue
+        url, reason = fixtures.url(endpoint)
+        if url is None:
+            skipped[key] = reason
+            continue
+        payload = build(fixtures) if build else None
+        measurement = measure(clients[role], method, url, payload, repeat)
+        if measurement.status == 405:
+            skipped[key] = skip_reason(endpoint.route)
+            continue
+        results[key] = measurement._asdict()
+        if progress:
+            progress(f'{key}: {measurement.status} {measurement.queries}q '
+                     f'{measurement.latency_ms}ms {measurement.memory_kb}KB')
+
+    return {
+        'volumes': data.volumes._asdict(),
+        'counts': data.counts,
+        'repeat': repeat,
+        'endpoints': dict(sorted(results.items())),
+        'skipped': dict(sorted(skipped.items())),
+    }
+
+
+# ===== المقارنة مع ملف الأساس =====
+
+def load_baseline(path: Path = DEFAULT_BASELINE) -> Optional[Dict]:
+    path = Path(path)
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding='utf-8'))
+
+
+def save_baseline(results: Dict, path: Path = DEFAULT_BASELINE) -> None:
+    """حفظ ملف الأساس (يرفض أخطاء الخادم: compare يعتبر إصلاحها تراجعاً)"""
+    errors = sorted(key for key, result in results['endpoints'].items() if result['status'] >= 500)
+    if errors:
+        raise ValueError(f'Server errors cannot be recorded in a baseline: {", ".join(errors)}')
+    Path(path).write_text(json.dumps(results, ensure_ascii=False, indent=2) + '\n', encoding='utf-8')
+
+
+def compare(baseline: Dict, results: Dict, thresholds: Optional[Dict[str, float]] = None,
+            metrics: Iterable[str] = METRICS) -> List[Regression]:
+    """التراجعات مقارنة بملف الأساس (المسارات الجديدة لا تعتبر تراجعاً)"""
+    thresholds = {**DEFAULT_THRESHOLDS, **(thresholds or {})}
+    regressions = []
+    for key, current in results['endpoints'].items():
+        previous = baseline['endpoints'].get(key)
+        if previous is None:
+            continue
+        if current['status'] != previous['status']:
+            regressions.append(Regression(key, 'status', previous['status'], current['status']))
+        for metric in metrics:
+            if metric not in thresholds:
+                continue
+            limit = previous[metric] * (1 + thresholds[metric])
+            if current[metric] > limit and current[metric] - previous[metric] >= MIN_REGRESSION[metric]:
+                regressions.append(Regression(key, metric, previous[metric], current[metric]))
+    return regressions
+
+
+def benchmark_settings() -> Dict:
+    """إعدادات تعزل القياس عن طبقات المراقبة"""
+    return {
+        'INSTRUMENTATION_ENABLED': False,
+        'PERFORMANCE_MONITORING_ENABLED': False,
+        'PERFORMANCE_PROFILING_ENABLED': False,
+    }
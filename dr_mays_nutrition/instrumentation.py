@@ -0,0 +1,147 @@
+"""
+أحداث التتبع والقياس
+Structured, sampled instrumentation
+
+Debug output goes through ``event()`` instead of ``print()``: each call is
+one structured record (an event name plus keyword fields) on the
+``instrumentation`` logger, rendered as a single JSON line only when a
+handler actually emits it. Events are sampled per request: the request
+middleware decides once, with probability ``INSTRUMENTATION_SAMPLE_RATE``,
+whether a request is traced (``start_request``), and every event raised
+while it is handled follows that decision.
+
+With ``INSTRUMENTATION_ENABLED = False`` ``event()`` returns after one flag
+check. ``warning()`` and ``error()`` are never sampled or disabled; they are
+ordinary log records.
+
+Fields should be small (ids, counts, sizes, keys): never pass full request
+bodies, headers or serializer payloads.
+"""
+
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connections
+from django.dispatch import receiver
+
+
+logger = logging.getLogger('instrumentation')
+
+_enabled: Optional[bool] = None
+_sample_rate = 1.0
+# قرار العينة للطلب الحالي (None خارج الطلبات)
+_request_sampled: ContextVar[Optional[bool]] = ContextVar('instrumentation_request_sampled', default=None)
+
+
+def _load_settings() -> bool:
+    global _enabled, _sample_rate
+    _sample_rate = min(max(float(getattr(settings, 'INSTRUMENTATION_SAMPLE_RATE', 1.0)), 0.0), 1.0)
+    _enabled = bool(getattr(settings, 'INSTRUMENTATION_ENABLED', False)) and _sample_rate > 0
+    return _enabled
+
+
+@receiver(setting_changed)
+def _reload_settings(setting, **kwargs):
+    global _enabled
+    if setting.startswith('INSTRUMENTATION_'):
+        _enabled = None
+
+
+def is_enabled() -> bool:
+    """هل التتبع مفعل؟"""
+    if _enabled is None:
+        return _load_settings()
+    return _enabled
+
+
+def is_sampled() -> bool:
+    """هل يتم تتبع الطلب الحالي؟ (خارج الطلبات: قرار عينة لكل حدث)"""
+    if not is_enabled():
+        return False
+    sampled = _request_sampled.get()
+    if sampled is None:
+        return _sample_rate >= 1.0 or random.random() < _sample_rate
+    return sampled
+
+
+class _Fields:
+    """تنسيق الحقول كسطر JSON عند الكتابة فقط"""
+    __slots__ = ('name', 'fields')
+
+    def __init__(self, name: str, fields: dict):
+        self.name = name
+        self.fields = fields
+
+    def __str__(self):
+        return json.dumps({'event': self.name, **self.fields}, ensure_ascii=False, default=str)
+
+
+def _log(level: int, name: str, fields: dict, exc_info=None) -> None:
+    if logger.isEnabledFor(level):
+        logger.log(level, '%s', _Fields(name, fields), exc_info=exc_info,
+                   extra={'event': name, 'fields': fields})
+
+
+def event(name: str, **fields) -> None:
+    """حدث تتبع (DEBUG) للطلبات ضمن العينة"""
+    if not is_sampled():
+        return
+    _log(logging.DEBUG, name, fields)
+
+
+def warning(name: str, **fields) -> None:
+    """تحذير (يسجل دائماً)"""
+    _log(logging.WARNING, name, fields)
+
+
+def error(name: str, exc: Optional[BaseException] = None, **fields) -> None:
+    """خطأ مع تتبع الاستثناء (يسجل دائماً)"""
+    if exc is not None:
+        fields.setdefault('error', str(exc))
+    _log(logging.ERROR, name, fields, exc_info=exc)
+
+
+class QueryMetrics:
+    """عدد استعلامات قاعدة البيانات ومدتها (execute_wrapper)"""
+    __slots__ = ('count', 'seconds')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+
+@contextmanager
+def measure_queries():
+    """قياس الاستعلامات على كل الاتصالات داخل الكتلة"""
+    metrics = QueryMetrics()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(metrics))
+        yield metrics
+
+
+def start_request():
+    """قرار العينة لطلب جديد (None عند تعطيل التتبع)"""
+    if not is_enabled():
+        return None
+    return _request_sampled.set(_sample_rate >= 1.0 or random.random() < _sample_rate)
+
+
+def finish_request(token) -> None:
+    if token is not None:
+        _request_sampled.reset(token)
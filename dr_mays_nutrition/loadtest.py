@@ -0,0 +1,385 @@
+"""
+اختبار التحميل لمسار خطط الوجبات
+Load generation for the meal-plan workflow
+
+``run_load_test`` drives a running server (``manage.py runserver``,
+gunicorn, ...) over HTTP with concurrent virtual doctors and patients, each
+a thread with its own token session, repeating the real flows until the
+duration is up:
+
+* doctor: list patients (``DoctorPatientsView``), create a plan from a
+  template, generate suggested meals for it and save them;
+* patient: fetch their plans and saved selections, post selections built
+  from the latest plan's first day, and poll ``check_meal_plan_updates``.
+
+Every request is recorded under its step name; the report gives
+throughput, latency percentiles and the error rate per step (any status
+>= 400 or connection failure is an error).
+
+The virtual users are ``loadtest_doctor_<n>`` and ``loadtest_patient_<n>``.
+``prepare_load_test_users`` creates them in the configured database (the
+one the target server uses), links each patient to a doctor with an
+appointment so the doctor's patient list is not empty, and runs the
+reference data commands when the database has no foods or templates.
+"""
+
+import random
+import threading
+import time
+from datetime import date, time as clock, timedelta
+from decimal import Decimal
+from typing import Dict, List, NamedTuple, Optional
+
+import requests
+from django.db import transaction
+
+from accounts.models import PatientProfile, User
+from bookings.models import Appointment
+from meal_plans.models import Food, MealPlanTemplate
+
+from .benchmark_data import seed_reference_data
+from .performance import PERCENTILES, percentile
+
+
+DEFAULT_PASSWORD = 'loadtest-pass'
+DOCTOR_USERNAME = 'loadtest_doctor_{}'
+PATIENT_USERNAME = 'loadtest_patient_{}'
+# البيانات المرجعية بدون الأطباء التجريبيين
+REFERENCE_COMMANDS = (
+    'setup_meal_types',
+    'setup_foods',
+    'setup_comprehensive_foods',
+    'setup_specialized_foods',
+    'setup_meal_templates',
+)
+# مواعيد الربط بين المريض والطبيب: 16 موعداً في اليوم من التاسعة صباحاً
+SLOTS_PER_DAY = 16
+REQUEST_TIMEOUT = 60
+
+
+class LoadTestConfig(NamedTuple):
+    base_url: str = 'http://127.0.0.1:8000'
+    doctors: int = 5
+    patients: int = 20
+    duration: float = 60
+    ramp_up: float = 10
+    think_time: float = 1.0
+    polls: int = 3
+    password: str = DEFAULT_PASSWORD
+    seed: int = 2024
+
+
+# ===== تجهيز المستخدمين =====
+
+def prepare_load_test_users(doctors: int, patients: int, password: str = DEFAULT_PASSWORD) -> Dict[str, int]:
+    """إنشاء (أو تحديث) مستخدمي اختبار التحميل في قاعدة البيانات المضبوطة"""
+    rng = random.Random(0)
+    with transaction.atomic():
+        doctor_users = [_load_test_user(DOCTOR_USERNAME.format(index), 'doctor', password) for index in range(doctors)]
+        patient_users = [
+            _load_test_user(PATIENT_USERNAME.format(index), 'patient', password) for index in range(patients)
+        ]
+        for patient in patient_users:
+            PatientProfile.objects.get_or_create(user=patient, defaults={
+                'gender': rng.choice(('male', 'female')),
+                'height': rng.randrange(150, 195),
+                'current_weight': rng.randrange(55, 120),
+                'target_weight': rng.randrange(55, 90),
+            })
+
+        first_day = date.today() + timedelta(days=1)
+        for index, patient in enumerate(patient_users):
+            doctor = doctor_users[index % doctors]
+            if Appointment.objects.filter(patient=patient, doctor=doctor).exists():
+                continue
+            scheduled_date, scheduled_time = _free_slot(doctor, first_day)
+            Appointment.objects.create(
+                patient=patient,
+                doctor=doctor,
+                scheduled_date=scheduled_date,
+                scheduled_time=scheduled_time,
+                status='confirmed',
+                consultation_fee=Decimal('0'),
+            )
+
+    if not Food.objects.exists() or not MealPlanTemplate.objects.filter(is_public=True).exists():
+        seed_reference_data(REFERENCE_COMMANDS)
+    else:
+        seed_reference_data(())
+
+    return {
+        'doctors': len(doctor_users),
+        'patients': len(patient_users),
+        'templates': MealPlanTemplate.objects.filter(is_public=True).count(),
+    }
+
+
+def _free_slot(doctor: User, first_day: date):
+    """أول موعد غير محجوز للطبيب (إعادة التجهيز بعدد أطباء مختلف لا تصطدم بالمواعيد السابقة)"""
+    taken = set(Appointment.objects.filter(doctor=doctor, scheduled_date__gte=first_day).values_list(
+        'scheduled_date', 'scheduled_time'
+    ))
+    slot = 0
+    while True:
+        candidate = (
+            first_day + timedelta(days=slot // SLOTS_PER_DAY),
+            clock(9 + slot % SLOTS_PER_DAY // 2, 30 * (slot % 2)),
+        )
+        if candidate not in taken:
+            return candidate
+        slot += 1
+
+
+def _load_test_user(username: str, role: str, password: str) -> User:
+    user, created = User.objects.get_or_create(username=username, defaults={
+        'email': f'{username}@example.com',
+        'first_name': username,
+        'role': role,
+    })
+    if created or not user.check_password(password):
+        user.set_password(password)
+        user.save(update_fields=['password'])
+    return user
+
+
+# ===== تسجيل القياسات =====
+
+class StepStats:
+    """قياسات خطوة واحدة"""
+    __slots__ = ('latencies', 'errors', 'statuses')
+
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.errors = 0
+        self.statuses: Dict[str, int] = {}
+
+
+class LoadRecorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._steps: Dict[str, StepStats] = {}
+
+    def record(self, step: str, latency_ms: float, status: Optional[int]) -> None:
+        with self._lock:
+            stats = self._steps.get(step)
+            if stats is None:
+                stats = self._steps[step] = StepStats()
+            stats.latencies.append(latency_ms)
+            key = str(status) if status is not None else 'failed'
+            stats.statuses[key] = stats.statuses.get(key, 0) + 1
+            if status is None or status >= 400:
+                stats.errors += 1
+
+    def report(self, elapsed: float) -> Dict:
+        with self._lock:
+            steps = []
+            for name, stats in sorted(self._steps.items()):
+                ordered = sorted(stats.latencies)
+                count = len(ordered)
+                steps.append({
+                    'step': name,
+                    'count': count,
+                    'throughput': round(count / elapsed, 2) if elapsed else 0,
+                    'errors': stats.errors,
+                    'error_rate': round(stats.errors / count, 4) if count else 0,
+                    'latency_ms': {
+                        **{f'p{pct}': round(percentile(ordered, pct), 1) for pct in PERCENTILES},
+                        'max': round(ordered[-1], 1) if ordered else 0,
+                    },
+                    'statuses': dict(sorted(stats.statuses.items())),
+                })
+        total = sum(step['count'] for step in steps)
+        errors = sum(step['errors'] for step in steps)
+        return {
+            'elapsed_s': round(elapsed, 1),
+            'requests': total,
+            'throughput': round(total / elapsed, 2) if elapsed else 0,
+            'errors': errors,
+            'error_rate': round(errors / total, 4) if total else 0,
+            'steps': steps,
+        }
+
+
+# ===== المستخدمون الافتراضيون =====
+
+class StepFailed(Exception):
+    """خطوة فشلت: يعاد المسار من بدايته في الدورة التالية"""
+
+
+class VirtualUser(threading.Thread):
+    role = None
+
+    def __init__(self, username: str, config: LoadTestConfig, recorder: LoadRecorder,
+                 deadline: float, start_delay: float, rng: random.Random):
+        super().__init__(name=username, daemon=True)
+        self.username = username
+        self.config = config
+        self.recorder = recorder
+        self.deadline = deadline
+        self.start_delay = start_delay
+        self.rng = rng
+        self.session = requests.Session()
+        self.user = None
+
+    def call(self, step: str, method: str, path: str, **kwargs):
+        """طلب واحد مقاس؛ يرجع JSON الاستجابة أو يرفع StepFailed"""
+        started = time.perf_counter()
+        try:
+            response = self.session.request(
+                method, self.config.base_url.rstrip('/') + path, timeout=REQUEST_TIMEOUT, **kwargs
+            )
+        except requests.RequestException:
+            self.recorder.record(f'{self.role}.{step}', (time.perf_counter() - started) * 1000, None)
+            raise StepFailed(step)
+        self.recorder.record(f'{self.role}.{step}', (time.perf_counter() - started) * 1000, response.status_code)
+        if response.status_code >= 400:
+            raise StepFailed(step)
+        try:
+            return response.json()
+        except ValueError:
+            return None
+
+    def think(self) -> None:
+        if self.config.think_time:
+            time.sleep(self.rng.uniform(0, 2 * self.config.think_time))
+
+    def login(self) -> bool:
+        try:
+            data = self.call('login', 'post', '/api/auth/login/', json={
+                'username': self.username, 'password': self.config.password
+            })
+        except StepFailed:
+            return False
+        # مثل الواجهة: المصادقة بالرمز فقط (كعكة الجلسة تفرض CSRF على طلبات POST)
+        self.session.cookies.clear()
+        self.session.headers['Authorization'] = f"Token {data['token']}"
+        self.user = data['user']
+        return True
+
+    def run(self) -> None:
+        time.sleep(self.start_delay)
+        if not self.login():
+            return
+        self.setup()
+        while time.monotonic() < self.deadline:
+            try:
+                self.iteration()
+            except StepFailed:
+                pass
+            self.think()
+
+    def setup(self) -> None:
+        pass
+
+    def iteration(self) -> None:
+        raise NotImplementedError
+
+
+def _results(data) -> List[Dict]:
+    """نتائج القائمة مع الترقيم أو بدونه"""
+    if isinstance(data, dict):
+        return data.get('results') or []
+    return data or []
+
+
+class DoctorUser(VirtualUser):
+    role = 'doctor'
+
+    def setup(self) -> None:
+        try:
+            data = self.call('list_templates', 'get', '/api/meals/meal-templates/')
+            self.templates = [template['id'] for template in data.get('templates', [])]
+        except StepFailed:
+            self.templates = []
+
+    def iteration(self) -> None:
+        patients = _results(self.call('list_patients', 'get', '/api/auth/patients/'))
+        if not patients or not self.templates:
+            return
+        self.think()
+
+        start = date.today() + timedelta(days=self.rng.randrange(0, 28))
+        data = self.call('create_plan', 'post', '/api/meals/meal-templates/create-plan/', json={
+            'template_id': self.rng.choice(self.templates),
+            'patient_id': self.rng.choice(patients)['id'],
+            'start_date': start.isoformat(),
+            'end_date': (start + timedelta(days=6)).isoformat(),
+        })
+        plan_id = data['meal_plan']['id']
+        self.think()
+
+        data = self.call('generate_meals', 'post', f'/api/meals/meal-plans/{plan_id}/generate-meals/', json={})
+        self.think()
+
+        self.call('save_meals', 'post', f'/api/meals/meal-plans/{plan_id}/save-selected-meals/', json={
+            'selected_meals': data['suggested_meals']
+        })
+
+
+class PatientUser(VirtualUser):
+    role = 'patient'
+
+    def iteration(self) -> None:
+        patient_id = self.user['id']
+        plans = _results(self.call('fetch_plans', 'get', f'/api/meals/patients/{patient_id}/meal-plans/'))
+        self.call('fetch_selections', 'get', f'/api/meals/patients/{patient_id}/selected-meals/')
+        self.think()
+
+        plan = next((plan for plan in plans if plan.get('meals')), None)
+        if plan is not None:
+            self.call('post_selections', 'post', f'/api/meals/patients/{patient_id}/selected-meals/', json={
+                'meal_plan_id': plan['id'],
+                'selected_meals': _first_day_selections(plan),
+            })
+
+        for _ in range(self.config.polls):
+            self.think()
+            self.call('poll_updates', 'get', '/api/meals/meal-plans/check-updates/')
+
+
+def _first_day_selections(plan: Dict) -> List[Dict]:
+    """وجبات أول يوم في الخطة بالصيغة التي ترسلها واجهة المريض"""
+    first_day = min(meal['day_of_week'] for meal in plan['meals'])
+    return [
+        {
+            'meal_name': meal['name'],
+            'meal_type': meal.get('meal_type_name') or 'breakfast',
+            'ingredients': [
+                {
+                    'food_id': ingredient['food'],
+                    'amount': ingredient['amount'],
+                    'calories_per_100g': ingredient.get('calories_per_100g'),
+                    'protein_per_100g': ingredient.get('protein_per_100g'),
+                    'carbs_per_100g': ingredient.get('carbs_per_100g'),
+                    'fat_per_100g': ingredient.get('fat_per_100g'),
+                }
+                for ingredient in meal.get('ingredients') or []
+            ],
+        }
+        for meal in plan['meals'] if meal['day_of_week'] == first_day
+    ]
+
+
+def run_load_test(config: LoadTestConfig) -> Dict:
+    """تشغيل الأطباء والمرضى الافتراضيين حتى انتهاء المدة وإرجاع التقرير"""
+    recorder = LoadRecorder()
+    rng = random.Random(config.seed)
+    users = [(DoctorUser, DOCTOR_USERNAME.format(index)) for index in range(config.doctors)]
+    users += [(PatientUser, PATIENT_USERNAME.format(index)) for index in range(config.patients)]
+    rng.shuffle(users)
+
+    started = time.monotonic()
+    deadline = started + config.ramp_up + config.duration
+    threads = [
+        user_class(username, config, recorder, deadline,
+                   config.ramp_up * index / max(len(users), 1), random.Random(rng.random()))
+        for index, (user_class, username) in enumerate(users)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    report = recorder.report(time.monotonic() - started)
+    report['config'] = {key: value for key, value in config._asdict().items() if key != 'password'}
+    return report
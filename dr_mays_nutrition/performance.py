@@ -0,0 +1,327 @@
+"""
+قياس أداء الطلبات لكل مسار
+Per-endpoint request performance
+
+With ``PERFORMANCE_MONITORING_ENABLED`` (off by default)
+``accounts.middleware.PerformanceMiddleware`` records one ``RequestSample``
+per request (wall time, database query count and time, response rendering
+time and response size) under its URL pattern, e.g.
+``GET api/meals/patients/<int:patient_id>/selected-meals/``. Each endpoint
+keeps the last ``PERFORMANCE_WINDOW`` samples, from which the report derives
+p50 / p95 / p99.
+
+Budgets (``PERFORMANCE_BUDGETS``, falling back to
+``PERFORMANCE_DEFAULT_BUDGET``) cap metrics per endpoint: a request above a
+cap is counted and reported as a ``performance.budget_exceeded`` event, and
+an endpoint whose p95 is above a cap is listed as a regression.
+
+``serialization_ms`` is the time spent rendering the response (DRF's
+renderer turning ``response.data`` into bytes, or a template). Serializer
+work done inside the view to build ``response.data`` counts towards
+``wall_ms`` only.
+
+Samples live in each worker process. With ``PERFORMANCE_SHARED_STATS``
+enabled (the default) every process also publishes its windows to the
+Django cache every ``PERFORMANCE_PUBLISH_INTERVAL`` seconds, so the
+``performance_report`` command (another process) can merge them; like the
+food catalogue generation this needs a cache backend shared by all workers.
+Each process writes only its own key, under a slot number it reserves once
+with an atomic ``cache.incr``, so concurrent workers never overwrite each
+other.
+
+A request with the ``X-Profile`` header is run under ``cProfile`` when
+``PERFORMANCE_PROFILING_ENABLED`` is on (and the header matches
+``PERFORMANCE_PROFILE_TOKEN`` when one is set); the most recent profiles are
+kept in memory and, with ``PERFORMANCE_PROFILE_DIR``, written as ``.prof``
+files.
+"""
+
+import cProfile
+import io
+import itertools
+import math
+import os
+import pstats
+import re
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+
+
+METRICS = ('wall_ms', 'queries', 'query_ms', 'serialization_ms', 'response_bytes')
+PERCENTILES = (50, 95, 99)
+DEFAULT_WINDOW = 1000
+DEFAULT_PUBLISH_INTERVAL = 30
+# مدة بقاء إحصاءات العملية في الذاكرة المشتركة بعد آخر نشر
+SHARED_STATS_TIMEOUT = 60 * 60
+STATS_CACHE_PREFIX = 'performance:stats:'
+SLOTS_CACHE_KEY = 'performance:slots'
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_LINES = 30
+RECENT_PROFILES = 20
+
+
+class RequestSample(NamedTuple):
+    """قياسات طلب واحد"""
+    wall_ms: float
+    queries: int
+    query_ms: float
+    # rendering of the response only (see the module docstring)
+    serialization_ms: float
+    response_bytes: int
+    status: int
+
+
+class EndpointStats:
+    """نافذة القياسات الأخيرة لمسار واحد"""
+    __slots__ = ('samples', 'count', 'errors', 'over_budget')
+
+    def __init__(self, window: int):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.errors = 0
+        self.over_budget = 0
+
+    def add(self, sample: RequestSample, exceeded: bool) -> None:
+        self.samples.append(sample)
+        self.count += 1
+        if sample.status >= 500:
+            self.errors += 1
+        if exceeded:
+            self.over_budget += 1
+
+    def export(self) -> Dict:
+        return {
+            'samples': [tuple(sample) for sample in self.samples],
+            'count': self.count,
+            'errors': self.errors,
+            'over_budget': self.over_budget,
+        }
+
+
+_lock = threading.Lock()
+_endpoints: Dict[str, EndpointStats] = {}
+_started_at = timezone.now()
+_last_published = 0.0
+_slot = None
+_profiles = deque(maxlen=RECENT_PROFILES)
+_profile_ids = itertools.count(1)
+
+
+def _setting(name: str, default):
+    return getattr(settings, name, default)
+
+
+def is_enabled() -> bool:
+    return bool(_setting('PERFORMANCE_MONITORING_ENABLED', False))
+
+
+def endpoint_key(request) -> str:
+    """مفتاح المسار: الطريقة ونمط الرابط (وليس الرابط نفسه)"""
+    route = getattr(getattr(request, 'resolver_match', None), 'route', None)
+    return f'{request.method} {route or "unresolved"}'
+
+
+def get_budget(key: str) -> Dict[str, float]:
+    """حدود المسار (بالطريقة ثم بدونها ثم الحد الافتراضي)"""
+    budgets = _setting('PERFORMANCE_BUDGETS', {})
+    route = key.split(' ', 1)[-1]
+    budget = budgets.get(key) or budgets.get(route)
+    if budget is None:
+        budget = _setting('PERFORMANCE_DEFAULT_BUDGET', {})
+    return budget
+
+
+def exceeded_metrics(sample: RequestSample, budget: Dict[str, float]) -> List[str]:
+    return [metric for metric, limit in budget.items() if getattr(sample, metric, 0) > limit]
+
+
+def record(key: str, sample: RequestSample) -> List[str]:
+    """تسجيل قياسات طلب وإرجاع الحدود التي تجاوزها"""
+    exceeded = exceeded_metrics(sample, get_budget(key))
+    with _lock:
+        stats = _endpoints.get(key)
+        if stats is None:
+            stats = _endpoints[key] = EndpointStats(_setting('PERFORMANCE_WINDOW', DEFAULT_WINDOW))
+        stats.add(sample, bool(exceeded))
+    _maybe_publish()
+    return exceeded
+
+
+def reset_performance_stats() -> None:
+    global _started_at
+    with _lock:
+        _endpoints.clear()
+        _profiles.clear()
+        _started_at = timezone.now()
+
+
+def percentile(ordered: List[float], pct: float) -> float:
+    """النسبة المئوية (nearest-rank) لقائمة مرتبة"""
+    if not ordered:
+        return 0
+    rank = max(math.ceil(pct / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def _summarise(key: str, samples: Iterable[tuple], count: int, errors: int, over_budget: int) -> Dict:
+    samples = [RequestSample(*sample) for sample in samples]
+    budget = get_budget(key)
+    summary = {
+        'endpoint': key,
+        'count': count,
+        'window': len(samples),
+        'errors': errors,
+        'over_budget': over_budget,
+        'budget': budget,
+    }
+    for metric in METRICS:
+        ordered = sorted(getattr(sample, metric) for sample in samples)
+        summary[metric] = {f'p{pct}': percentile(ordered, pct) for pct in PERCENTILES}
+        summary[metric]['max'] = ordered[-1] if ordered else 0
+    summary['regressions'] = [
+        metric for metric, limit in budget.items()
+        if metric in summary and summary[metric]['p95'] > limit
+    ]
+    return summary
+
+
+def _report(exported: Dict[str, Dict], **extra) -> Dict:
+    endpoints = [
+        _summarise(key, data['samples'], data['count'], data['errors'], data['over_budget'])
+        for key, data in exported.items()
+    ]
+    endpoints.sort(key=lambda summary: -summary['wall_ms']['p95'])
+    return {
+        **extra,
+        'requests': sum(summary['count'] for summary in endpoints),
+        'regressions': [summary['endpoint'] for summary in endpoints if summary['regressions']],
+        'endpoints': endpoints,
+    }
+
+
+def export_stats() -> Dict[str, Dict]:
+    with _lock:
+        return {key: stats.export() for key, stats in _endpoints.items()}
+
+
+def get_performance_report() -> Dict:
+    """تقرير العملية الحالية"""
+    return _report(export_stats(), process=os.getpid(), started_at=_started_at.isoformat())
+
+
+# ===== الإحصاءات المشتركة بين العمليات =====
+
+def _shared_enabled() -> bool:
+    return bool(_setting('PERFORMANCE_SHARED_STATS', True))
+
+
+def _process_slot() -> int:
+    """رقم خانة العملية في الذاكرة المشتركة (يحجز مرة لكل عملية بزيادة ذرية)"""
+    global _slot
+    pid = os.getpid()
+    with _lock:
+        # بعد fork تحجز العملية الابنة خانة خاصة بها
+        if _slot is None or _slot[0] != pid:
+            # The counter never expires: a reused number would let two live processes share a key
+            cache.add(SLOTS_CACHE_KEY, 0, None)
+            try:
+                slot = cache.incr(SLOTS_CACHE_KEY)
+            except ValueError:
+                cache.add(SLOTS_CACHE_KEY, 0, None)
+                slot = cache.incr(SLOTS_CACHE_KEY)
+            _slot = (pid, slot)
+        return _slot[1]
+
+
+def publish_stats() -> None:
+    """نشر نافذة العملية الحالية في الذاكرة المشتركة (مفتاح خاص بالعملية)"""
+    global _last_published
+    _last_published = time.monotonic()
+    cache.set(
+        f'{STATS_CACHE_PREFIX}{_process_slot()}',
+        {'pid': os.getpid(), 'endpoints': export_stats()},
+        SHARED_STATS_TIMEOUT
+    )
+
+
+def _maybe_publish() -> None:
+    if not _shared_enabled():
+        return
+    if time.monotonic() - _last_published >= _setting('PERFORMANCE_PUBLISH_INTERVAL', DEFAULT_PUBLISH_INTERVAL):
+        publish_stats()
+
+
+def get_shared_performance_report() -> Dict:
+    """تقرير مدمج لكل العمليات التي نشرت إحصاءاتها (نافذة كل عملية كاملة)"""
+    slots = cache.get(SLOTS_CACHE_KEY) or 0
+    # خانات العمليات المتوقفة تنتهي بعد SHARED_STATS_TIMEOUT
+    published = cache.get_many([f'{STATS_CACHE_PREFIX}{slot}' for slot in range(1, slots + 1)])
+    merged: Dict[str, Dict] = {}
+    for entry in published.values():
+        for key, data in entry['endpoints'].items():
+            target = merged.setdefault(key, {'samples': [], 'count': 0, 'errors': 0, 'over_budget': 0})
+            target['samples'].extend(data['samples'])
+            for field in ('count', 'errors', 'over_budget'):
+                target[field] += data[field]
+    return _report(merged, processes=sorted(entry['pid'] for entry in published.values()))
+
+
+# ===== cProfile لكل طلب =====
+
+def profiling_requested(request) -> bool:
+    """هل طلب العميل تشغيل cProfile لهذا الطلب (ترويسة X-Profile)؟"""
+    value = request.META.get(PROFILE_HEADER)
+    if not value or not _setting('PERFORMANCE_PROFILING_ENABLED', False):
+        return False
+    token = _setting('PERFORMANCE_PROFILE_TOKEN', '')
+    return not token or constant_time_compare(value, token)
+
+
+def start_profile(request) -> Optional[cProfile.Profile]:
+    if not profiling_requested(request):
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # مُحلل آخر يعمل بالفعل في هذا الخيط
+        return None
+    return profiler
+
+
+def store_profile(key: str, sample: RequestSample, profiler: cProfile.Profile) -> str:
+    """حفظ ملخص المُحلل (وملف .prof عند ضبط PERFORMANCE_PROFILE_DIR) وإرجاع معرفه"""
+    profile_id = f'{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}-{next(_profile_ids)}'
+    output = io.StringIO()
+    stats = pstats.Stats(profiler, stream=output)
+    stats.sort_stats('cumulative').print_stats(PROFILE_LINES)
+
+    directory = _setting('PERFORMANCE_PROFILE_DIR', None)
+    path = None
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        slug = re.sub(r'[^A-Za-z0-9]+', '-', key).strip('-')
+        path = os.path.join(directory, f'{profile_id}-{slug}.prof')
+        stats.dump_stats(path)
+
+    _profiles.appendleft({
+        'id': profile_id,
+        'endpoint': key,
+        'captured_at': timezone.now().isoformat(),
+        'sample': sample._asdict(),
+        'path': path,
+        'stats': output.getvalue(),
+    })
+    return profile_id
+
+
+def get_recent_profiles() -> List[Dict]:
+    return list(_profiles)
@@ -1,3 +1,4 @@
+import importlib.util
 import os
 from pathlib import Path
 from decouple import config
@@ -21,12 +22,12 @@ INSTALLED_APPS = [
     'rest_framework.authtoken',
     'corsheaders',
     'django_filters',
-    # 'channels',  # Uncomment when properly configured
+    'channels',
     'accounts',
     'meal_plans',
     'bookings',
     'payments',
-    # 'notifications',  # Temporarily commented out due to channels dependency
+    'notifications',
     'reports',
 ]
 
@@ -34,7 +35,7 @@ MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'corsheaders.middleware.CorsMiddleware',
-    'accounts.middleware.RequestLoggingMiddleware',
+    'accounts.middleware.PerformanceMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -73,9 +74,42 @@ LOGGING = {
             'handlers': ['console', 'file'],
             'level': 'DEBUG',
         },
+        'instrumentation': {
+            'handlers': ['console', 'file'],
+            'level': 'DEBUG',
+            'propagate': False,
+        },
     },
 }
 
+# Structured debug events and per-request timing / query counts / payload
+# sizes (dr_mays_nutrition/instrumentation.py), for a sample of requests.
+# Disabled (the default, also under DEBUG so test runs stay quiet): no events
+# are formatted and no query counting is installed.
+INSTRUMENTATION_ENABLED = config('INSTRUMENTATION_ENABLED', default=False, cast=bool)
+INSTRUMENTATION_SAMPLE_RATE = config('INSTRUMENTATION_SAMPLE_RATE', default=1.0, cast=float)
+
+# Per-endpoint timing / query / response-size percentiles and budgets
+# (dr_mays_nutrition/performance.py). Budgets cap the p95 of a metric per
+# "METHOD route" (or route) and are reported as regressions when exceeded.
+# Off by default: every measured request pays for query counting.
+PERFORMANCE_MONITORING_ENABLED = config('PERFORMANCE_MONITORING_ENABLED', default=False, cast=bool)
+PERFORMANCE_WINDOW = 1000
+PERFORMANCE_DEFAULT_BUDGET = {'wall_ms': 500, 'queries': 30}
+PERFORMANCE_BUDGETS = {
+    'GET api/meals/patients/<int:patient_id>/selected-meals/': {'wall_ms': 100, 'queries': 5},
+    'POST api/meals/patients/<int:patient_id>/selected-meals/': {'wall_ms': 300, 'queries': 15},
+    'POST api/meals/meal-templates/create-plan/': {'wall_ms': 400, 'queries': 30},
+    'GET api/auth/patients/': {'wall_ms': 150, 'queries': 5},
+}
+# Publish each worker's samples to the cache for `manage.py performance_report`
+# (needs a cache backend shared by all workers)
+PERFORMANCE_SHARED_STATS = True
+# cProfile for requests sent with an "X-Profile" header (matching the token when set)
+PERFORMANCE_PROFILING_ENABLED = config('PERFORMANCE_PROFILING_ENABLED', default=DEBUG, cast=bool)
+PERFORMANCE_PROFILE_TOKEN = config('PERFORMANCE_PROFILE_TOKEN', default='')
+PERFORMANCE_PROFILE_DIR = BASE_DIR / 'logs' / 'profiles'
+
 ROOT_URLCONF = 'dr_mays_nutrition.urls'
 
 TEMPLATES = [
@@ -95,7 +129,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'dr_mays_nutrition.wsgi.application'
-# ASGI_APPLICATION = 'dr_mays_nutrition.asgi.application'  # Uncomment when channels is configured
+ASGI_APPLICATION = 'dr_mays_nutrition.asgi.application'
 
 # Windows-specific database configuration
 DATABASES = {
@@ -194,7 +228,68 @@ CORS_ALLOW_HEADERS = [
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
+    'if-none-match',
 ]
+CORS_EXPOSE_HEADERS = ['etag']
+
+# Django cache (meal template catalogue, food catalogue generation). The
+# local-memory cache is per process: with several gunicorn workers, daphne,
+# management commands and the admin each process would keep its own catalogue
+# version and serve stale data until the entries expire. Set CACHE_REDIS_URL
+# so every process shares one cache and invalidations reach all of them.
+CACHE_REDIS_URL = config('CACHE_REDIS_URL', default='')
+if CACHE_REDIS_URL and importlib.util.find_spec('redis'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_REDIS_URL,
+            'KEY_PREFIX': 'drmays',
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    }
+
+# Safety net for the catalogue caches: version numbers and cached entries
+# expire after this many seconds even if an invalidation was missed (writes
+# with QuerySet.update(), or a per-process cache without CACHE_REDIS_URL)
+CATALOGUE_CACHE_TIMEOUT = config('CATALOGUE_CACHE_TIMEOUT', default=300, cast=int)
+
+# Channel layer for the websocket consumers (notifications/consumers.py).
+# The in-memory layer only reaches sockets held by the same process: enough
+# for a single ASGI process serving HTTP and websockets. When the HTTP
+# workers (gunicorn) and the ASGI server (daphne) run as separate processes,
+# set CHANNEL_REDIS_URL so a group_send from any worker reaches every socket.
+CHANNEL_REDIS_URL = config('CHANNEL_REDIS_URL', default='')
+if CHANNEL_REDIS_URL and importlib.util.find_spec('channels_redis'):
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {
+                'hosts': [CHANNEL_REDIS_URL],
+            },
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+        },
+    }
+
+# Websocket writes (notifications/coalescer.py): read receipts and chat
+# messages of a connection are written in one batch this long after the
+# first one, or as soon as this many are waiting
+REALTIME_FLUSH_DELAY = 0.2
+REALTIME_FLUSH_SIZE = 50
+
+# Websocket tickets (notifications/middleware.py): the frontend connects with
+# a single-use ticket from /api/notifications/ws-ticket/ instead of its API
+# token, valid for this many seconds
+WEBSOCKET_TICKET_TTL = config('WEBSOCKET_TICKET_TTL', default=30, cast=int)
 
 # Windows-specific Redis configuration (optional - can use SQLite for development)
 # Uncomment if you have Redis installed on Windows
@@ -0,0 +1,48 @@
+"""
+اختبار تراجع عدد الاستعلامات لكل مسار
+Endpoint query-count regression test
+
+Seeds the data volumes recorded in ``benchmark_baseline.json`` and runs the
+endpoint benchmark once per endpoint. The test fails when an endpoint makes
+more queries than the baseline allows, answers with another status code or
+a server error, or when a route is skipped without a reason listed in
+``benchmarks`` (a write scenario or ``UNMEASURED_ROUTES``); latency and memory are left to the ``benchmark_endpoints`` command, since
+they depend on the machine. Tagged ``benchmark`` (a few minutes on SQLite):
+``manage.py test --exclude-tag benchmark`` skips it.
+"""
+
+import warnings
+
+from django.test import TestCase, override_settings, tag
+
+from .benchmark_data import SeedVolumes, seed_benchmark_data
+from .benchmarks import benchmark_settings, compare, load_baseline, run_benchmark
+
+
+@tag('benchmark')
+@override_settings(**benchmark_settings())
+class EndpointBenchmarkTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.baseline = load_baseline()
+        # on_commit يعمل أثناء التوليد كما في أمر القياس
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.data = seed_benchmark_data(SeedVolumes(**cls.baseline['volumes']))
+
+    def test_no_query_or_status_regressions(self):
+        # تحذيرات الترقيم غير المرتب و static تتكرر مع كل طلب
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            results = run_benchmark(self.data, repeat=1)
+
+        # المسارات الجديدة لا تعتبر تراجعاً، لكن كل مسار في الأساس يقاس
+        self.assertFalse(sorted(set(self.baseline['endpoints']) - set(results['endpoints'])))
+        # كل تخطٍّ مسار كتابة له سيناريو أو مذكور في UNMEASURED_ROUTES
+        unexplained = {
+            key: reason for key, reason in results['skipped'].items() if not reason.startswith('write route')
+        }
+        self.assertFalse(unexplained)
+        self.assertFalse([key for key, result in results['endpoints'].items() if result['status'] >= 500])
+        regressions = compare(self.baseline, results, metrics=('queries',))
+        self.assertFalse(regressions, '\n'.join(str(regression) for regression in regressions))
@@ -11,7 +11,7 @@ urlpatterns = [
     path('api/meals/', include('meal_plans.urls')),
     path('api/bookings/', include('bookings.urls')),
     path('api/payments/', include('payments.urls')),
-    # path('api/notifications/', include('notifications.urls')),  # Temporarily commented out
+    path('api/notifications/', include('notifications.urls')),
     path('api/reports/', include('reports.urls')),
     
     # Health check endpoint
@@ -0,0 +1,318 @@
+"""
+قياس توزيع أحداث websocket على العملاء المتصلين
+Websocket fan-out benchmark
+
+``run_websocket_benchmark`` opens simulated clients through the full ASGI
+websocket stack (``dr_mays_nutrition.asgi.application``: origin check, ticket
+auth, routing and ``NotificationConsumer``) in one or more worker
+processes, then publishes ``meal_plan_change`` events to every user's
+``notifications_<user_id>`` group through the configured channel layer,
+the way ``meal_plans.change_feed`` does. Per worker the report gives the
+connected clients, connect time, and the latency from ``group_send`` to the
+event reaching each client, plus any events lost.
+
+The clients speak ASGI directly (no sockets), so the numbers cover the
+consumer and channel-layer cost per worker, not the network or the ASGI
+server in front. They connect as the load-test users (``loadtest``
+module), several connections per user when there are more clients than
+users, like a user with several tabs.
+
+With the in-memory channel layer an event only reaches clients of the
+publishing process, so the clients run in the publishing process; more
+than one worker needs a shared layer (``CHANNEL_REDIS_URL``).
+"""
+
+import asyncio
+import json
+import multiprocessing
+import queue
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from asgiref.testing import ApplicationCommunicator
+from django.conf import settings
+from django.utils import timezone
+
+from accounts.models import User
+from notifications.middleware import issue_ticket
+from notifications.realtime import user_group
+
+from .loadtest import DOCTOR_USERNAME, PATIENT_USERNAME
+from .performance import PERCENTILES, percentile
+
+
+IN_MEMORY_LAYER = 'channels.layers.InMemoryChannelLayer'
+# مهلة انتظار جاهزية العمال (اتصال كل العملاء)
+READY_TIMEOUT = 120
+
+
+class WebsocketBenchmarkConfig(NamedTuple):
+    clients: int = 200
+    workers: int = 1
+    doctors: int = 5
+    patients: int = 20
+    messages: int = 20
+    interval: float = 0.25
+    timeout: float = 10.0
+
+
+def layer_backend() -> str:
+    return settings.CHANNEL_LAYERS.get('default', {}).get('BACKEND', '')
+
+
+def process_local_layer() -> bool:
+    """طبقة القنوات لا تعبر حدود العملية (في الذاكرة)"""
+    return layer_backend() == IN_MEMORY_LAYER
+
+
+def benchmark_users(doctors: int, patients: int) -> List[int]:
+    """معرفات مستخدمي اختبار التحميل الموجودين"""
+    usernames = [DOCTOR_USERNAME.format(index) for index in range(doctors)]
+    usernames += [PATIENT_USERNAME.format(index) for index in range(patients)]
+    users = User.objects.filter(username__in=usernames, is_active=True).order_by('id')
+    return list(users.values_list('id', flat=True))
+
+
+# ===== العميل =====
+
+class AsgiWebsocket:
+    """عميل websocket يتحدث ASGI مباشرة مع التطبيق"""
+
+    def __init__(self, application, path: str, query_string: str = ''):
+        self.communicator = ApplicationCommunicator(application, {
+            'type': 'websocket',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': query_string.encode(),
+            'headers': [(b'host', b'localhost'), (b'origin', b'http://localhost')],
+            'subprotocols': [],
+            'client': ('127.0.0.1', 0),
+            'server': ('localhost', 80),
+        })
+
+    async def connect(self, timeout: float) -> bool:
+        await self.communicator.send_input({'type': 'websocket.connect'})
+        message = await self.communicator.receive_output(timeout)
+        return message['type'] == 'websocket.accept'
+
+    async def receive_json(self, timeout: float) -> Dict:
+        message = await self.communicator.receive_output(timeout)
+        if message['type'] != 'websocket.send':
+            raise ConnectionError(f"Socket closed ({message.get('code')})")
+        return json.loads(message['text'])
+
+    async def close(self, timeout: float) -> None:
+        await self.communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+        await self.communicator.wait(timeout)
+
+
+# ===== النشر والاستقبال =====
+
+def _event(version: int) -> Dict:
+    # نفس شكل أحداث change_feed؛ created_at هو وقت الإرسال لحساب الزمن
+    return {
+        'type': 'meal_plan_change',
+        'change': {
+            'version': version,
+            'meal_plan_id': 0,
+            'kind': 'benchmark',
+            'action': 'saved',
+            'created_at': timezone.now().isoformat(),
+        },
+    }
+
+
+async def publish_events(user_ids: List[int], config: WebsocketBenchmarkConfig) -> float:
+    """نشر config.messages حدثاً لكل مستخدم وإرجاع مدة النشر بالثواني"""
+    from channels.layers import get_channel_layer
+
+    layer = get_channel_layer()
+    started = time.perf_counter()
+    for version in range(1, config.messages + 1):
+        for user_id in user_ids:
+            await layer.group_send(user_group(user_id), _event(version))
+        if version < config.messages:
+            await asyncio.sleep(config.interval)
+    return time.perf_counter() - started
+
+
+def _latency_summary(samples: List[float]) -> Dict:
+    ordered = sorted(samples)
+    return {
+        **{f'p{pct}': round(percentile(ordered, pct), 1) for pct in PERCENTILES},
+        'max': round(ordered[-1], 1) if ordered else 0,
+    }
+
+
+async def run_clients(index: int, clients: List[int], config: WebsocketBenchmarkConfig,
+                      ready: Callable[[int], None], start: Callable) -> Dict:
+    """
+    اتصال العملاء ثم استقبال الأحداث
+    ``ready`` is called once every client has connected (or failed) and
+    ``start`` is awaited before the clients start waiting for events.
+    """
+    from .asgi import application
+
+    sockets: List[AsgiWebsocket] = []
+    connect_ms: List[float] = []
+    rejected = 0
+
+    async def open_socket(user_id: int) -> None:
+        nonlocal rejected
+        # التذكرة تصدر في عملية العامل نفسها (ذاكرة التخزين المؤقت قد تكون محلية)
+        socket = AsgiWebsocket(application, f'/ws/notifications/{user_id}/', f'ticket={issue_ticket(user_id)}')
+        started = time.perf_counter()
+        try:
+            accepted = await socket.connect(config.timeout)
+        except asyncio.TimeoutError:
+            accepted = False
+        if accepted:
+            connect_ms.append((time.perf_counter() - started) * 1000)
+            sockets.append(socket)
+        else:
+            rejected += 1
+
+    await asyncio.gather(*(open_socket(user_id) for user_id in clients))
+    ready(len(sockets))
+    await start()
+
+    latencies: List[float] = []
+    lost = 0
+
+    async def receive_events(socket: AsgiWebsocket) -> None:
+        nonlocal lost
+        for received in range(config.messages):
+            try:
+                event = await socket.receive_json(config.timeout)
+            except (asyncio.TimeoutError, ConnectionError):
+                lost += config.messages - received
+                return
+            sent_at = datetime.fromisoformat(event['change']['created_at'])
+            latencies.append((timezone.now() - sent_at).total_seconds() * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(receive_events(socket) for socket in sockets))
+    elapsed = time.perf_counter() - started
+    await asyncio.gather(*(socket.close(config.timeout) for socket in sockets), return_exceptions=True)
+
+    return {
+        'worker': index,
+        'clients': len(clients),
+        'connected': len(sockets),
+        'rejected': rejected,
+        'connect_ms': _latency_summary(connect_ms),
+        'expected': len(sockets) * config.messages,
+        'received': len(latencies),
+        'lost': lost,
+        'delivered_per_s': round(len(latencies) / elapsed, 1) if elapsed else 0,
+        'latency_ms': _latency_summary(latencies),
+        'latencies': latencies,
+    }
+
+
+# ===== العمال =====
+
+def _worker_main(index: int, clients: List[int], config: WebsocketBenchmarkConfig,
+                 messages: multiprocessing.Queue, start: multiprocessing.Event) -> None:
+    """نقطة دخول عملية العامل (spawn)"""
+    import django
+    django.setup()
+
+    async def wait_for_start():
+        await asyncio.get_running_loop().run_in_executor(None, start.wait)
+
+    result = asyncio.run(run_clients(
+        index, clients, config, lambda connected: messages.put(('ready', index, connected)), wait_for_start
+    ))
+    messages.put(('done', index, result))
+
+
+def _split(clients: List, parts: int) -> List[List]:
+    return [clients[index::parts] for index in range(parts)]
+
+
+def _in_process(clients: List[int], user_ids: List[int],
+                config: WebsocketBenchmarkConfig) -> Tuple[List[Dict], float]:
+    async def run():
+        connected = asyncio.Event()
+        publishing = asyncio.Event()
+
+        async def publisher():
+            await connected.wait()
+            publishing.set()
+            return await publish_events(user_ids, config)
+
+        result, publish_elapsed = await asyncio.gather(
+            run_clients(0, clients, config, lambda count: connected.set(), publishing.wait),
+            publisher(),
+        )
+        return [result], publish_elapsed
+
+    return asyncio.run(run())
+
+
+def _in_workers(clients: List[int], user_ids: List[int],
+                config: WebsocketBenchmarkConfig) -> Tuple[List[Dict], float]:
+    context = multiprocessing.get_context('spawn')
+    messages = context.Queue()
+    start = context.Event()
+    processes = [
+        context.Process(target=_worker_main, args=(index, part, config, messages, start), daemon=True)
+        for index, part in enumerate(_split(clients, config.workers))
+    ]
+    for process in processes:
+        process.start()
+
+    results: Dict[int, Dict] = {}
+    try:
+        ready = 0
+        while ready < len(processes):
+            kind, index, payload = messages.get(timeout=READY_TIMEOUT)
+            ready += kind == 'ready'
+        start.set()
+        publish_elapsed = asyncio.run(publish_events(user_ids, config))
+        while len(results) < len(processes):
+            kind, index, payload = messages.get(timeout=config.timeout + READY_TIMEOUT)
+            if kind == 'done':
+                results[index] = payload
+    except queue.Empty:
+        raise RuntimeError(f'Workers did not report within the timeout ({len(results)}/{len(processes)} done)')
+    finally:
+        for process in processes:
+            process.join(timeout=config.timeout)
+            if process.is_alive():
+                process.terminate()
+    return [results[index] for index in sorted(results)], publish_elapsed
+
+
+def run_websocket_benchmark(config: WebsocketBenchmarkConfig,
+                            users: Optional[List[int]] = None) -> Dict:
+    """تشغيل القياس وإرجاع التقرير لكل عامل والإجمالي"""
+    users = users if users is not None else benchmark_users(config.doctors, config.patients)
+    if not users:
+        raise ValueError('No load-test users in the database')
+    clients = [users[index % len(users)] for index in range(config.clients)]
+    user_ids = sorted(set(clients))
+
+    if config.workers > 1:
+        workers, publish_elapsed = _in_workers(clients, user_ids, config)
+    else:
+        workers, publish_elapsed = _in_process(clients, user_ids, config)
+
+    latencies = [latency for worker in workers for latency in worker.pop('latencies')]
+    expected = sum(worker['expected'] for worker in workers)
+    return {
+        'config': config._asdict(),
+        'layer': layer_backend(),
+        'users': len(user_ids),
+        'published': len(user_ids) * config.messages,
+        'publish_s': round(publish_elapsed, 2),
+        'connected': sum(worker['connected'] for worker in workers),
+        'expected': expected,
+        'received': len(latencies),
+        'lost': sum(worker['lost'] for worker in workers),
+        'loss_rate': round(1 - len(latencies) / expected, 4) if expected else 0,
+        'latency_ms': _latency_summary(latencies),
+        'workers': workers,
+    }
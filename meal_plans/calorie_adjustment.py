@@ -0,0 +1,273 @@
+"""
+تعديل كميات المكونات لتطابق السعرات المطلوبة
+Calorie-adjustment engine for patient meal selections
+
+A selection set is a list of meal dicts (as sent by the client, or built from
+``PatientMealSelection`` rows), each with ``ingredients`` that carry an
+``amount`` and per-100g nutrients. ``adjust_selections`` first fills missing
+per-100g data for the whole set at once (from the in-process food catalogue
+by ``food_id``, else through the food-name index, else estimated from the
+ingredient's own values), then finds the one scale factor ``f`` for which
+
+    fixed + sum(calories_per_gram(i) * clamp(f * amount(i), low(i), high(i))) = target
+
+Scaling every ingredient by the same factor keeps each meal's protein / carbs
+/ fat split; ingredients that reach their bounds (at least 1 g and 10 % of the
+original amount, at most 10x the original amount) leave the remaining calories
+to the others. The sum only grows with ``f``, so it is solved by bisection;
+the amounts are then rounded to 0.1 g and the rounding residue is absorbed by
+the most calorie-dense ingredients. The result is deterministic and lands
+within ``CALORIE_TOLERANCE`` of the target whenever the bounds allow it.
+"""
+
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from .food_catalogue import get_food_catalogue
+from .food_names import get_food_name_index
+from .meal_optimizer import CALORIE_TOLERANCE
+from .models import NUTRITION_TOTAL_KEYS
+
+
+MACRO_KEYS = ('calories', 'protein', 'carbs', 'fat')
+PER_100G_KEYS = {key: f'{key}_per_100g' for key in MACRO_KEYS}
+
+# حدود الأمان للكمية الجديدة (نسبة إلى الكمية الأصلية)
+MIN_AMOUNT = 1
+MIN_SCALE = 0.1
+MAX_SCALE = 10
+BISECTION_STEPS = 60
+# فرق السعرات المقبول بعد تصحيح التقريب
+ROUNDING_SLACK = 0.1
+
+
+def _number(value) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _as_int(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def ingredient_amount(ingredient: Dict) -> float:
+    """كمية المكون بالجرام (amount أو quantity)"""
+    return _number(ingredient.get('amount') or ingredient.get('quantity'))
+
+
+def ingredient_nutrition(ingredient: Dict) -> Dict[str, float]:
+    """القيم الغذائية لمكون واحد (المحفوظة، أو المحسوبة من القيم لكل 100 جرام)"""
+    amount = ingredient_amount(ingredient)
+    values = {}
+    for key in MACRO_KEYS:
+        value = _number(ingredient.get(key))
+        if not value and amount > 0:
+            value = round(_number(ingredient.get(PER_100G_KEYS[key])) * amount / 100, 1)
+        values[key] = value
+    return values
+
+
+def _meal_ingredients(meal: Dict) -> List[Dict]:
+    return [ingredient for ingredient in meal.get('ingredients') or [] if isinstance(ingredient, dict)]
+
+
+def meal_totals(meal: Dict, ingredients: Optional[Iterable[Dict]] = None) -> Dict[str, float]:
+    """
+    القيم الغذائية للوجبة من مجموع مكوناتها
+
+    Values the ingredients do not provide fall back to the meal's own
+    ``nutrition_info`` (and ``calories``).
+    """
+    if ingredients is None:
+        ingredients = _meal_ingredients(meal)
+    totals = dict.fromkeys(MACRO_KEYS, 0.0)
+    for ingredient in ingredients:
+        if isinstance(ingredient, dict):
+            for key, value in ingredient_nutrition(ingredient).items():
+                totals[key] += value
+
+    saved = meal.get('nutrition_info') or {}
+    for key in MACRO_KEYS:
+        if totals[key] > 0:
+            totals[key] = round(totals[key], 1)
+        elif key == 'calories':
+            totals[key] = _number(meal.get('calories') or saved.get('calories'))
+        else:
+            totals[key] = _number(saved.get(key))
+    return totals
+
+
+def fill_nutrient_data(meals: Iterable[Dict]) -> None:
+    """
+    إكمال القيم الغذائية لكل 100 جرام للمكونات الناقصة
+
+    All ingredients are resolved in one pass against the food catalogue and
+    the food-name index; no query is made per ingredient.
+    """
+    catalogue = names = None
+    for meal in meals:
+        for ingredient in _meal_ingredients(meal):
+            if _number(ingredient.get('calories_per_100g')) > 0:
+                continue
+            if catalogue is None:
+                catalogue, names = get_food_catalogue(), get_food_name_index()
+
+            food_id = _as_int(ingredient.get('food_id') or ingredient.get('id'))
+            if food_id is not None:
+                record = catalogue.get(food_id)
+            else:
+                record = names.resolve(
+                    ingredient.get('food_name') or ingredient.get('food_name_ar') or ingredient.get('name')
+                )
+
+            amount = ingredient_amount(ingredient)
+            if record is not None and record.per_100g[0]:
+                per_100g = dict(zip(NUTRITION_TOTAL_KEYS, record.per_100g))
+            elif _number(ingredient.get('calories')) > 0 and amount > 0:
+                # تقدير القيم لكل 100 جرام من قيم المكون الحالية
+                per_100g = {key: _number(ingredient.get(key)) / amount * 100 for key in MACRO_KEYS}
+            else:
+                continue
+            for key in MACRO_KEYS:
+                ingredient[PER_100G_KEYS[key]] = per_100g[key] or 0
+
+
+class AdjustmentResult(NamedTuple):
+    """نتيجة تعديل مجموعة وجبات"""
+    target_calories: Optional[float]
+    original_calories: float
+    total_calories: float
+    factor: float = 1.0
+    adjusted: bool = False
+    tolerance: float = CALORIE_TOLERANCE
+
+    @property
+    def difference(self) -> float:
+        if not self.target_calories:
+            return 0.0
+        return round(self.total_calories - self.target_calories, 1)
+
+    @property
+    def within_tolerance(self) -> bool:
+        return abs(self.difference) <= self.tolerance
+
+    def info(self) -> Dict:
+        """ملخص التعديل للاستجابة (adjustment_info)"""
+        return {
+            'adjusted': self.adjusted,
+            'original_calories': round(self.original_calories),
+            'adjusted_calories': round(self.total_calories),
+            'required_calories': self.target_calories,
+            'adjustment_factor': round(self.factor, 2),
+        }
+
+
+class _Portion:
+    """مكون قابل للتعديل"""
+    __slots__ = ('ingredient', 'amount', 'low', 'high', 'per_gram', 'calories')
+
+    def __init__(self, ingredient: Dict, amount: float):
+        original = _number(ingredient.get('original_amount')) or amount
+        self.ingredient = ingredient
+        self.amount = amount
+        self.low = max(MIN_AMOUNT, original * MIN_SCALE)
+        self.high = max(self.low, original * MAX_SCALE)
+        self.per_gram = _number(ingredient.get('calories_per_100g')) / 100
+        self.calories = ingredient_nutrition(ingredient)['calories']
+
+    def clamp(self, amount: float) -> float:
+        return min(max(amount, self.low), self.high)
+
+    def scaled_calories(self, factor: float) -> float:
+        return self.per_gram * self.clamp(self.amount * factor)
+
+
+def _solve_factor(portions: List[_Portion], fixed: float, target: float) -> float:
+    """أصغر عامل يحقق السعرات المطلوبة ضمن حدود الأمان (بالتنصيف)"""
+    def total(factor):
+        return fixed + sum(portion.scaled_calories(factor) for portion in portions)
+
+    low, high = 0.0, max(portion.high / portion.amount for portion in portions)
+    if total(high) <= target:
+        return high
+    if total(low) >= target:
+        return low
+    for _ in range(BISECTION_STEPS):
+        middle = (low + high) / 2
+        if total(middle) < target:
+            low = middle
+        else:
+            high = middle
+    return high
+
+
+def _portion_calories(portion: _Portion, amount: float) -> float:
+    return round(portion.per_gram * amount, 1)
+
+
+def adjust_selections(meals: List[Dict], target_calories: Optional[float],
+                      tolerance: float = CALORIE_TOLERANCE) -> AdjustmentResult:
+    """
+    تعديل كميات مكونات الوجبات (في مكانها) لتطابق السعرات المطلوبة
+
+    Meals already within ``tolerance`` of the target are left untouched.
+    Adjusted ingredients keep their ``original_amount`` and get rounded
+    ``amount``/``calories``/``protein``/``carbs``/``fat``; the meals' ``calories``
+    and ``nutrition_info`` are set to the sums of their ingredients.
+    """
+    meals = [meal for meal in meals if isinstance(meal, dict)]
+    fill_nutrient_data(meals)
+    original_total = sum(meal_totals(meal)['calories'] for meal in meals)
+    result = AdjustmentResult(target_calories, original_total, original_total, tolerance=tolerance)
+    if not target_calories or target_calories <= 0 or result.within_tolerance:
+        return result
+
+    portions = [
+        _Portion(ingredient, ingredient_amount(ingredient))
+        for meal in meals
+        for ingredient in _meal_ingredients(meal)
+        if ingredient_amount(ingredient) > 0 and _number(ingredient.get('calories_per_100g')) > 0
+    ]
+    if not portions or original_total <= 0:
+        return result
+
+    fixed = original_total - sum(portion.calories for portion in portions)
+    factor = _solve_factor(portions, fixed, target_calories)
+    amounts = [round(portion.clamp(portion.amount * factor), 1) for portion in portions]
+
+    # تصحيح فرق التقريب بالمكونات الأعلى كثافة في السعرات
+    residual = target_calories - fixed - sum(
+        _portion_calories(portion, amount) for portion, amount in zip(portions, amounts)
+    )
+    by_density = sorted(range(len(portions)), key=lambda position: -portions[position].per_gram)
+    for position in by_density:
+        if abs(residual) <= ROUNDING_SLACK:
+            break
+        portion, amount = portions[position], amounts[position]
+        corrected = round(portion.clamp(amount + residual / portion.per_gram), 1)
+        residual -= _portion_calories(portion, corrected) - _portion_calories(portion, amount)
+        amounts[position] = corrected
+
+    for portion, amount in zip(portions, amounts):
+        ingredient = portion.ingredient
+        ingredient.setdefault('original_amount', portion.amount)
+        ingredient['amount'] = amount
+        for key in MACRO_KEYS:
+            ingredient[key] = round(_number(ingredient.get(PER_100G_KEYS[key])) * amount / 100, 1)
+
+    for meal in meals:
+        if not _meal_ingredients(meal):
+            continue
+        totals = meal_totals(meal)
+        meal['calories'] = totals['calories']
+        nutrition_info = meal.get('nutrition_info')
+        if not isinstance(nutrition_info, dict):
+            nutrition_info = meal['nutrition_info'] = {}
+        nutrition_info.update(totals)
+
+    total = sum(meal_totals(meal)['calories'] for meal in meals)
+    return result._replace(total_calories=round(total, 1), factor=factor, adjusted=True)
@@ -0,0 +1,184 @@
+"""
+سجل تغييرات خطط الوجبات لكل مستخدم
+Per-user meal-plan change feed
+
+Writes to a plan, its meals, their ingredients and the patient's selections
+record a ``MealPlanChange`` row for the plan's patient and doctor once the
+transaction commits (``meal_plans.signals``). The row id is the version:
+it only grows, so a client that remembers the last version it saw can ask
+for what changed since, and an unchanged version means nothing it can see
+has changed (``Meal`` and ``MealIngredient`` have no timestamps, so the old
+``Max('updated_at')`` check could not tell).
+
+Changes are pushed as ``meal_plan_change`` events to the user's
+``notifications_<user_id>`` group when a channel layer is configured
+(``NotificationConsumer`` forwards them to the websocket). Without one,
+clients poll ``check_meal_plan_updates`` with ``If-None-Match`` / ``since``
+(304 when unchanged) or long-poll it with ``wait``.
+
+Changes are coalesced per plan and kind within a transaction
+(``commit_batches``): saving ten ingredients of a plan records one
+``ingredient`` change on commit, not ten. Code writing rows of several
+kinds at once wraps the writes in ``batched_changes()`` so one change of a
+single kind is recorded for the whole block.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from functools import partial
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.http import parse_etags, quote_etag
+
+from notifications.realtime import send_to_users
+
+from .commit_batches import on_commit_batch
+from .models import MealPlan, MealPlanChange
+
+
+CHANGES_LIMIT = 200
+# الانتظار يشغل عامل الخادم طوال مدته: معطل افتراضياً
+DEFAULT_MAX_WAIT = 0
+DEFAULT_POLL_INTERVAL = 1.0
+DEFAULT_RETENTION_DAYS = 30
+ETAG_PREFIX = 'meal-plans'
+
+_batched = threading.local()
+
+
+def _setting(name: str, default):
+    return getattr(settings, name, default)
+
+
+# ===== التسجيل =====
+
+@contextmanager
+def batched_changes(meal_plan_id: int, kind: str):
+    """تغيير واحد لكتلة كتابة كاملة بدلاً من تغيير لكل صف"""
+    _batched.depth = getattr(_batched, 'depth', 0) + 1
+    try:
+        yield
+    finally:
+        _batched.depth -= 1
+        # حتى عند الخطأ: قد تكون بعض الصفوف قد حُفظت بالفعل
+        record_change(meal_plan_id, kind)
+
+
+def record_change(meal_plan_id: Optional[int], kind: str, action: str = 'saved',
+                  user_ids: Optional[Iterable[int]] = None) -> None:
+    """تسجيل تغيير بعد نجاح المعاملة الحالية (تغيير واحد لكل خطة ونوع في المعاملة)"""
+    if meal_plan_id is None or getattr(_batched, 'depth', 0) > 0:
+        return
+    on_commit_batch(
+        ('meal_plan_change', meal_plan_id, kind),
+        partial(_publish_coalesced, meal_plan_id, kind),
+        [(action, tuple(user_ids) if user_ids is not None else None)],
+    )
+
+
+def _publish_coalesced(meal_plan_id: int, kind: str, writes: List[Tuple]) -> List[MealPlanChange]:
+    # حذف واحد يكفي ليكون التغيير حذفاً: الخطة المحذوفة لا تعود في المعاملة نفسها
+    actions = {action for action, _ in writes}
+    action = 'deleted' if 'deleted' in actions else 'saved'
+    known = [user_ids for _, user_ids in writes if user_ids is not None]
+    user_ids = {user_id for user_ids in known for user_id in user_ids} if known else None
+    return publish_change(meal_plan_id, kind, action, user_ids)
+
+
+def publish_change(meal_plan_id: int, kind: str, action: str = 'saved',
+                   user_ids: Optional[Iterable[int]] = None) -> List[MealPlanChange]:
+    """كتابة التغيير لمريض الخطة وطبيبها ودفعه عبر قناة الإشعارات"""
+    if user_ids is None:
+        user_ids = MealPlan.objects.filter(id=meal_plan_id).values_list('patient_id', 'doctor_id').first()
+        if user_ids is None:
+            return []
+    changes = MealPlanChange.objects.bulk_create([
+        MealPlanChange(user_id=user_id, meal_plan_id=meal_plan_id, kind=kind, action=action)
+        for user_id in sorted({user_id for user_id in user_ids if user_id})
+    ])
+    _push(changes)
+    return changes
+
+
+def change_entry(change: MealPlanChange) -> Dict:
+    return {
+        'version': change.id,
+        'meal_plan_id': change.meal_plan_id,
+        'kind': change.kind,
+        'action': change.action,
+        'created_at': change.created_at.isoformat(),
+    }
+
+
+def _push(changes: List[MealPlanChange]) -> None:
+    for change in changes:
+        send_to_users([change.user_id], {'type': 'meal_plan_change', 'change': change_entry(change)})
+
+
+# ===== القراءة =====
+
+def parse_version(value: Optional[str]) -> Optional[int]:
+    """رقم إصدار من معاملات الطلب (أو None إذا كان غير صالح)"""
+    if value is None or not str(value).isdigit():
+        return None
+    return int(value)
+
+
+def parse_wait(value: Optional[str]) -> float:
+    """مدة الانتظار بالثواني (0 إذا كانت غير صالحة)"""
+    try:
+        return max(float(value), 0.0) if value else 0.0
+    except ValueError:
+        return 0.0
+
+
+def latest_change(user_id: int) -> Optional[MealPlanChange]:
+    """آخر تغيير للمستخدم (استعلام واحد على الفهرس)"""
+    return MealPlanChange.objects.filter(user_id=user_id).only('id', 'created_at').order_by('-id').first()
+
+
+def changes_since(user_id: int, version: int, limit: int = CHANGES_LIMIT) -> List[MealPlanChange]:
+    return list(MealPlanChange.objects.filter(user_id=user_id, id__gt=version).order_by('id')[:limit])
+
+
+def feed_etag(user_id: int, version: int) -> str:
+    return quote_etag(f'{ETAG_PREFIX}-{user_id}-{version}')
+
+
+def version_from_etag(user_id: int, value: Optional[str]) -> Optional[int]:
+    """الإصدار من ترويسة If-None-Match إذا كانت لهذا المستخدم"""
+    if not value:
+        return None
+    prefix = f'{ETAG_PREFIX}-{user_id}-'
+    for tag in parse_etags(value):
+        tag = tag.removeprefix('W/').strip('"')
+        if tag.startswith(prefix) and tag[len(prefix):].isdigit():
+            return int(tag[len(prefix):])
+    return None
+
+
+def wait_for_change(user_id: int, known_version: int, timeout: float) -> Optional[MealPlanChange]:
+    """انتظار تغيير بعد known_version حتى timeout ثانية (long-poll)"""
+    timeout = min(max(timeout, 0), _setting('MEAL_PLAN_FEED_MAX_WAIT', DEFAULT_MAX_WAIT))
+    interval = _setting('MEAL_PLAN_FEED_POLL_INTERVAL', DEFAULT_POLL_INTERVAL)
+    deadline = time.monotonic() + timeout
+    latest = latest_change(user_id)
+    while (latest.id if latest else 0) <= known_version:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        time.sleep(min(interval, remaining))
+        latest = latest_change(user_id)
+    return latest
+
+
+def prune_changes(days: Optional[int] = None) -> int:
+    """حذف التغييرات الأقدم من مدة الاحتفاظ"""
+    days = _setting('MEAL_PLAN_FEED_RETENTION_DAYS', DEFAULT_RETENTION_DAYS) if days is None else days
+    cutoff = timezone.now() - timedelta(days=days)
+    return MealPlanChange.objects.filter(created_at__lt=cutoff).delete()[0]
@@ -0,0 +1,72 @@
+"""
+تجميع أعمال ما بعد الالتزام لكل معاملة
+Per-transaction ``on_commit`` batching
+
+Signal handlers fire once per saved row, so scheduling their follow-up work
+with ``transaction.on_commit`` directly runs it once per row: a meal edited
+with ten ingredients refreshed the meal's totals ten times on commit.
+``on_commit_batch(key, callback, items)`` instead collects the items passed
+under ``key`` in the current transaction and calls ``callback(items)`` once
+when it commits, with each item once, in the order first seen.
+
+Pending batches are kept per connection in a thread-local dict keyed by
+``key``, so adding items is a dict lookup however many callbacks the
+transaction holds, and each batch registers one ``on_commit`` callback.
+Django replaces ``connection.run_on_commit`` with a new list on commit,
+rollback and savepoint rollback (dropping the callbacks registered inside
+the savepoint). The dict remembers the list it belongs to and starts over
+once it has been replaced, so items never go to a batch whose callback was
+dropped. After a savepoint rollback the batches registered before it still
+run on commit with the items they had; later items start new batches.
+Outside a transaction the callback runs at once with the given items, as
+``on_commit`` would.
+"""
+
+import threading
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional
+
+from django.db import transaction
+
+
+class _Batch:
+    def __init__(self, key: Hashable, callback: Callable[[list], Any]):
+        self.key = key
+        self.callback = callback
+        self.items = {}
+        self.done = False
+
+    def __call__(self):
+        self.done = True
+        self.callback(list(self.items))
+
+
+_local = threading.local()
+
+
+def _pending_batches(connection) -> Dict[Hashable, _Batch]:
+    """دفعات المعاملة الحالية لهذا الاتصال (تبدأ من جديد بعد الالتزام أو التراجع)"""
+    pending = getattr(_local, 'pending', None)
+    if pending is None:
+        pending = _local.pending = {}
+    hooks, batches = pending.get(connection.alias, (None, None))
+    if hooks is not connection.run_on_commit:
+        batches = {}
+        pending[connection.alias] = (connection.run_on_commit, batches)
+    return batches
+
+
+def on_commit_batch(key: Hashable, callback: Callable[[list], Any], items: Iterable[Hashable],
+                    using: Optional[str] = None) -> None:
+    """إضافة عناصر إلى دفعة المعاملة الحالية لـ key (callback يستدعى مرة واحدة بعد الالتزام)"""
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        callback(list(dict.fromkeys(items)))
+        return
+
+    batches = _pending_batches(connection)
+    batch = batches.get(key)
+    # done: already run without a new list (captureOnCommitCallbacks(execute=True) in tests)
+    if batch is None or batch.done:
+        batch = batches[key] = _Batch(key, callback)
+        transaction.on_commit(batch, using=using)
+    batch.items.update(dict.fromkeys(items))
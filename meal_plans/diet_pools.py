@@ -0,0 +1,182 @@
+"""
+مجموعات الأطعمة المحسوبة مسبقاً لكل نظام غذائي
+Precomputed diet-plan food pools
+
+Each diet plan maps its roles (proteins, vegetables, grains, fruits, fats) to
+a tagging rule: English terms matched inside ``name``, Arabic terms matched
+inside ``name_ar`` and/or category names, plus the pool size. The pools are
+built for every diet plan at once from the in-process food catalogue and kept
+until the catalogue generation changes, so meal generation picks from ready
+lists of food IDs instead of running ``icontains`` queries on every request.
+
+Diet plans without their own rules use the category-based default pools.
+"""
+
+import threading
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from .food_catalogue import get_food_catalogue
+
+
+class PoolRule(NamedTuple):
+    """قاعدة تصنيف لدور واحد في نظام غذائي"""
+    limit: int
+    terms: Tuple[str, ...] = ()
+    terms_ar: Tuple[str, ...] = ()
+    categories: Tuple[str, ...] = ()
+
+    def matches(self, record) -> bool:
+        name = (record.name or '').lower()
+        if any(term in name for term in self.terms):
+            return True
+        name_ar = record.name_ar or ''
+        if any(term in name_ar for term in self.terms_ar):
+            return True
+        return record.category.name in self.categories or record.category.name_ar in self.categories
+
+
+DEFAULT_DIET_PLAN = 'default'
+
+DIET_POOL_RULES: Dict[str, Dict[str, PoolRule]] = {
+    # Keto foods: high fat, low carb
+    'keto': {
+        'proteins': PoolRule(
+            10,
+            ('chicken', 'salmon', 'eggs', 'beef', 'turkey', 'tuna'),
+            ('دجاج', 'سلمون', 'بيض', 'لحم'),
+        ),
+        'vegetables': PoolRule(
+            8,
+            ('broccoli', 'spinach', 'cauliflower', 'zucchini', 'bell peppers', 'cucumber'),
+            ('بروكلي', 'سبانخ', 'قرنبيط', 'خيار'),
+        ),
+        'fats': PoolRule(
+            6,
+            ('olive oil', 'avocado', 'almonds', 'walnuts', 'coconut oil', 'butter'),
+            ('زيت زيتون', 'أفوكادو', 'لوز', 'جوز'),
+        ),
+        'fruits': PoolRule(2, ('avocado', 'lemon'), ('أفوكادو', 'ليمون')),
+    },
+    # Balanced diet: variety of foods
+    'balanced': {
+        'grains': PoolRule(
+            6,
+            ('rice', 'oats', 'quinoa', 'bread'),
+            ('أرز', 'شوفان', 'كينوا', 'خبز'),
+        ),
+        'proteins': PoolRule(
+            8,
+            ('chicken', 'salmon', 'eggs', 'yogurt', 'beans', 'lentils'),
+            ('دجاج', 'سلمون', 'بيض', 'زبادي', 'فول', 'عدس'),
+        ),
+        'vegetables': PoolRule(
+            8,
+            ('broccoli', 'spinach', 'carrots', 'tomatoes', 'bell peppers', 'cucumber'),
+            ('بروكلي', 'سبانخ', 'جزر', 'طماطم', 'فلفل', 'خيار'),
+        ),
+        'fruits': PoolRule(
+            6,
+            ('apple', 'banana', 'orange', 'blueberries', 'strawberries', 'avocado'),
+            ('تفاح', 'موز', 'برتقال', 'توت', 'فراولة', 'أفوكادو'),
+        ),
+        'fats': PoolRule(
+            4,
+            ('olive oil', 'almonds', 'walnuts', 'avocado'),
+            ('زيت زيتون', 'لوز', 'جوز', 'أفوكادو'),
+        ),
+    },
+    # High protein diet
+    'high_protein': {
+        'proteins': PoolRule(
+            10, ('chicken', 'salmon', 'eggs', 'beef', 'turkey', 'tuna', 'yogurt', 'cottage cheese'),
+        ),
+        'vegetables': PoolRule(6, ('broccoli', 'spinach', 'asparagus', 'green beans')),
+        'grains': PoolRule(4, ('rice', 'oats', 'quinoa')),
+        'fats': PoolRule(3, ('olive oil', 'almonds', 'avocado')),
+    },
+    # Mediterranean diet
+    'mediterranean': {
+        'proteins': PoolRule(6, ('salmon', 'tuna', 'chicken', 'eggs')),
+        'vegetables': PoolRule(8, ('tomatoes', 'bell peppers', 'cucumber', 'olives', 'spinach', 'broccoli')),
+        'fruits': PoolRule(4, ('olives', 'grapes', 'figs', 'pomegranate')),
+        'grains': PoolRule(3, ('rice', 'oats')),
+        'fats': PoolRule(4, ('olive oil', 'olives', 'almonds', 'walnuts')),
+    },
+    # Default balanced diet - use categories as fallback
+    DEFAULT_DIET_PLAN: {
+        'grains': PoolRule(6, categories=('Grains', 'الحبوب')),
+        'proteins': PoolRule(8, categories=('Protein', 'البروتين')),
+        'vegetables': PoolRule(8, categories=('Vegetables', 'الخضروات')),
+        'fruits': PoolRule(6, categories=('Fruits', 'الفواكه')),
+        'fats': PoolRule(4, categories=('Healthy Fats', 'الدهون الصحية', 'Nuts & Seeds', 'المكسرات والبذور')),
+    },
+}
+
+
+class DietPools:
+    """معرفات الأطعمة لكل دور في كل نظام غذائي، لجيل واحد من كتالوج الأطعمة"""
+
+    def __init__(self, pools: Dict[str, Dict[str, Tuple[int, ...]]], generation=None):
+        self.pools = pools
+        self.generation = generation
+
+    def get(self, diet_plan: Optional[str]) -> Dict[str, Tuple[int, ...]]:
+        return self.pools.get(diet_plan) or self.pools[DEFAULT_DIET_PLAN]
+
+    @classmethod
+    def build(cls, catalogue, rules=DIET_POOL_RULES):
+        """بناء جميع المجموعات بمرور واحد على الأطعمة النشطة (بترتيب المعرف)"""
+        active = catalogue.active()
+        pools = {}
+        for diet_plan, roles in rules.items():
+            pools[diet_plan] = {}
+            for role, rule in roles.items():
+                food_ids = []
+                for record in active:
+                    if len(food_ids) >= rule.limit:
+                        break
+                    if rule.matches(record):
+                        food_ids.append(record.id)
+                pools[diet_plan][role] = tuple(food_ids)
+        return cls(pools, catalogue.generation)
+
+
+_lock = threading.Lock()
+_pools: Optional[DietPools] = None
+
+
+def get_diet_pools() -> DietPools:
+    """الحصول على مجموعات الأنظمة الغذائية، مع إعادة بنائها عند تغيّر كتالوج الأطعمة"""
+    global _pools
+    catalogue = get_food_catalogue()
+    pools = _pools
+    if pools is not None and pools.generation == catalogue.generation:
+        return pools
+
+    with _lock:
+        pools = _pools
+        if pools is None or pools.generation != catalogue.generation:
+            pools = _pools = DietPools.build(catalogue)
+    return pools
+
+
+def get_diet_pool_ids(diet_plan: Optional[str]) -> Dict[str, Tuple[int, ...]]:
+    """معرفات الأطعمة لكل دور في النظام الغذائي"""
+    return get_diet_pools().get(diet_plan)
+
+
+def get_diet_pool_food_ids(diet_plan: Optional[str]) -> List[int]:
+    """جميع معرفات الأطعمة في النظام الغذائي (بدون تكرار)"""
+    food_ids = {}
+    for pool in get_diet_pool_ids(diet_plan).values():
+        food_ids.update(dict.fromkeys(pool))
+    return list(food_ids)
+
+
+def get_diet_pool_records(diet_plan: Optional[str]) -> Dict[str, list]:
+    """سجلات الأطعمة (من كتالوج الأطعمة) لكل دور في النظام الغذائي"""
+    catalogue = get_food_catalogue()
+    return {
+        role: [catalogue.get(food_id) for food_id in food_ids if food_id in catalogue]
+        for role, food_ids in get_diet_pool_ids(diet_plan).items()
+    }
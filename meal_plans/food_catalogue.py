@@ -0,0 +1,194 @@
+"""
+كتالوج الأطعمة في الذاكرة
+In-process food catalogue cache
+
+A compact, read-only copy of every ``Food`` row (names, category and per-100g
+nutrients) held by each worker process. It is loaded lazily on first use and
+dropped whenever a ``Food`` or ``FoodCategory`` is saved or deleted (see
+``meal_plans.signals``). With ``FOOD_CATALOGUE_SHARED_GENERATION`` enabled (the
+default) a generation number kept in the Django cache makes the other workers
+reload too, as long as they share a cache backend (``CACHE_REDIS_URL``). A
+worker reads that number at most every
+``FOOD_CATALOGUE_GENERATION_CHECK_INTERVAL`` seconds rather than on every
+lookup, so other workers follow an invalidation within that interval (the
+invalidating worker reloads at once). As a safety net a worker also reloads a catalogue older than
+``CATALOGUE_CACHE_TIMEOUT`` seconds, so a per-process cache or a missed
+invalidation leaves it stale for a bounded time only.
+
+Code that changes foods with ``QuerySet.update()`` or ``bulk_create()`` sends
+no signals and must call ``invalidate_food_catalogue()`` itself.
+"""
+
+import threading
+import time
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import MICRONUTRIENT_KEYS, NUTRITION_TOTAL_KEYS, Food
+
+
+GENERATION_CACHE_KEY = 'meal_plans:food_catalogue:generation'
+DEFAULT_MAX_AGE = 300
+DEFAULT_GENERATION_CHECK_INTERVAL = 5
+
+
+class CategoryRecord(NamedTuple):
+    id: int
+    name: str
+    name_ar: str
+
+
+class FoodRecord(NamedTuple):
+    """سجل مختصر لطعام واحد (القيم الغذائية لكل 100 جرام بترتيب NUTRITION_TOTAL_KEYS ثم MICRONUTRIENT_KEYS)"""
+    id: int
+    name: str
+    name_ar: str
+    category: CategoryRecord
+    is_active: bool
+    per_100g: Tuple[float, ...]
+    micronutrients: Tuple[float, ...] = ()
+
+    @property
+    def category_id(self):
+        return self.category.id
+
+    def get_nutrition_for_amount(self, amount_in_grams):
+        """نفس حساب Food.get_nutrition_for_amount"""
+        factor = amount_in_grams / 100
+        return {key: value * factor for key, value in zip(NUTRITION_TOTAL_KEYS, self.per_100g)}
+
+
+class FoodCatalogue:
+    """جميع الأطعمة (النشطة وغير النشطة) مفهرسة حسب المعرف"""
+
+    def __init__(self, records: Iterable[FoodRecord], generation=None):
+        self.records: Dict[int, FoodRecord] = {record.id: record for record in records}
+        self.generation = generation
+        self.loaded_at = timezone.now()
+        self.loaded = time.monotonic()
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, food_id):
+        return food_id in self.records
+
+    def get(self, food_id) -> Optional[FoodRecord]:
+        return self.records.get(food_id)
+
+    def active(self):
+        """الأطعمة النشطة بترتيب المعرف"""
+        return [record for record in self.records.values() if record.is_active]
+
+    @classmethod
+    def load(cls, generation=None):
+        """تحميل الكتالوج باستعلام واحد"""
+        rows = Food.objects.order_by('id').values_list(
+            'id', 'name', 'name_ar', 'is_active',
+            'category_id', 'category__name', 'category__name_ar',
+            *[f'{key}_per_100g' for key in NUTRITION_TOTAL_KEYS],
+            *MICRONUTRIENT_KEYS
+        )
+        split = len(NUTRITION_TOTAL_KEYS)
+        categories = {}
+        records = []
+        for food_id, name, name_ar, is_active, category_id, category_name, category_name_ar, *values in rows:
+            category = categories.get(category_id)
+            if category is None:
+                category = categories[category_id] = CategoryRecord(category_id, category_name, category_name_ar)
+            records.append(FoodRecord(
+                food_id, name, name_ar, category, is_active,
+                tuple(values[:split]), tuple(values[split:])
+            ))
+        return cls(records, generation)
+
+
+_lock = threading.Lock()
+_catalogue: Optional[FoodCatalogue] = None
+_local_generation = 0
+# آخر رقم جيل مشترك مقروء ووقت قراءته (monotonic)
+_shared: Optional[Tuple[int, float]] = None
+_stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+
+def _shared_enabled() -> bool:
+    return getattr(settings, 'FOOD_CATALOGUE_SHARED_GENERATION', True)
+
+
+def _shared_generation():
+    global _shared
+    if not _shared_enabled():
+        return None
+    now = time.monotonic()
+    seen = _shared
+    interval = getattr(settings, 'FOOD_CATALOGUE_GENERATION_CHECK_INTERVAL', DEFAULT_GENERATION_CHECK_INTERVAL)
+    if seen is not None and now - seen[1] < interval:
+        return seen[0]
+    generation = cache.get(GENERATION_CACHE_KEY)
+    if generation is None:
+        # Seeded from the clock so a flushed cache never repeats a generation
+        cache.add(GENERATION_CACHE_KEY, int(time.time() * 1000), None)
+        generation = cache.get(GENERATION_CACHE_KEY)
+    _shared = (generation, now)
+    return generation
+
+
+def _expired(catalogue: FoodCatalogue) -> bool:
+    max_age = getattr(settings, 'CATALOGUE_CACHE_TIMEOUT', DEFAULT_MAX_AGE)
+    return time.monotonic() - catalogue.loaded >= max_age
+
+
+def get_food_catalogue() -> FoodCatalogue:
+    """الحصول على كتالوج الأطعمة، مع تحميله عند أول استخدام أو بعد أي تعديل"""
+    global _catalogue, _local_generation
+    shared = _shared_generation()
+    catalogue = _catalogue
+    if catalogue is not None and catalogue.generation == (_local_generation, shared) and not _expired(catalogue):
+        with _lock:
+            _stats['hits'] += 1
+        return catalogue
+
+    with _lock:
+        catalogue = _catalogue
+        generation = (_local_generation, shared)
+        if catalogue is not None and catalogue.generation == generation:
+            if not _expired(catalogue):
+                _stats['hits'] += 1
+                return catalogue
+            # Reloaded on age: a new generation so the indexes built from the
+            # catalogue (search, names, diet pools, nutrient matrix) follow
+            _local_generation += 1
+            generation = (_local_generation, shared)
+        _stats['misses'] += 1
+        catalogue = _catalogue = FoodCatalogue.load(generation)
+    return catalogue
+
+
+def invalidate_food_catalogue():
+    """إلغاء الكتالوج في هذه العملية وفي العمليات الأخرى (عبر رقم الجيل المشترك)"""
+    global _local_generation, _shared
+    with _lock:
+        _local_generation += 1
+        _stats['invalidations'] += 1
+    if _shared_enabled():
+        try:
+            _shared = (cache.incr(GENERATION_CACHE_KEY), time.monotonic())
+        except ValueError:
+            _shared = None
+            _shared_generation()
+
+
+def get_food_catalogue_stats() -> Dict:
+    """عدادات الكتالوج للمراقبة"""
+    catalogue = _catalogue
+    lookups = _stats['hits'] + _stats['misses']
+    return {
+        **_stats,
+        'hit_ratio': round(_stats['hits'] / lookups, 4) if lookups else None,
+        'size': len(catalogue) if catalogue is not None else 0,
+        'loaded_at': catalogue.loaded_at.isoformat() if catalogue is not None else None,
+        'shared_generation': _shared_enabled(),
+    }
@@ -0,0 +1,124 @@
+"""
+تحويل أسماء الأطعمة إلى أطعمة من الكتالوج
+Food-name resolver
+
+Templates and seed commands refer to foods by their Arabic or English name.
+The resolver maps those names to catalogue records in three deterministic
+steps:
+
+1. exact ``name_ar`` / ``name`` match,
+2. normalised match (diacritics, alef/hamza variants, taa marbuta, the
+   definite article and English case are folded, as in the food search),
+3. substring fallback: the first food whose normalised ``name_ar`` contains
+   the normalised name, else the first whose ``name`` does.
+
+Within each step active foods win over inactive ones, then the lowest ID.
+The index is built from the in-process food catalogue and rebuilt whenever
+the catalogue generation changes; resolved names are memoised per index.
+"""
+
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .food_catalogue import get_food_catalogue
+from .food_search import TOKEN_PATTERN, normalize_text, strip_article
+
+
+def name_key(name: Optional[str]) -> str:
+    """المفتاح الموحد لاسم الطعام"""
+    return ' '.join(strip_article(token) or token for token in TOKEN_PATTERN.findall(normalize_text(name)))
+
+
+class FoodNameIndex:
+    """فهرس أسماء الأطعمة (مطابقة تامة، ثم موحدة، ثم جزئية)"""
+
+    def __init__(self, catalogue):
+        self.catalogue = catalogue
+        self.generation = catalogue.generation
+        # الأطعمة النشطة أولاً ثم حسب المعرف
+        self.records = sorted(catalogue.records.values(), key=lambda record: (not record.is_active, record.id))
+        self.exact: Dict[str, int] = {}
+        self.normalized: Dict[str, int] = {}
+        self.keys: List[Tuple[str, str, int]] = []
+        for record in self.records:
+            for name in (record.name_ar, record.name):
+                if name:
+                    self.exact.setdefault(name.strip(), record.id)
+                    key = name_key(name)
+                    if key:
+                        self.normalized.setdefault(key, record.id)
+            self.keys.append((name_key(record.name_ar), name_key(record.name), record.id))
+        self._resolved: Dict[str, Optional[int]] = {}
+
+    def _lookup(self, name: str) -> Optional[int]:
+        name = name.strip()
+        if not name:
+            return None
+        if name in self.exact:
+            return self.exact[name]
+        key = name_key(name)
+        if not key:
+            return None
+        if key in self.normalized:
+            return self.normalized[key]
+        for position in (0, 1):
+            for entry in self.keys:
+                if key in entry[position]:
+                    return entry[2]
+        return None
+
+    def resolve_id(self, name: Optional[str]) -> Optional[int]:
+        """معرف الطعام المطابق للاسم (أو None)"""
+        if not name:
+            return None
+        if name not in self._resolved:
+            self._resolved[name] = self._lookup(name)
+        return self._resolved[name]
+
+    def resolve(self, name: Optional[str]):
+        """سجل الطعام المطابق للاسم من الكتالوج (أو None)"""
+        food_id = self.resolve_id(name)
+        return self.catalogue.get(food_id) if food_id is not None else None
+
+
+_lock = threading.Lock()
+_index: Optional[FoodNameIndex] = None
+
+
+def get_food_name_index() -> FoodNameIndex:
+    """الحصول على فهرس الأسماء، مع إعادة بنائه عند تغيّر كتالوج الأطعمة"""
+    global _index
+    catalogue = get_food_catalogue()
+    index = _index
+    if index is not None and index.generation == catalogue.generation:
+        return index
+
+    with _lock:
+        index = _index
+        if index is None or index.generation != catalogue.generation:
+            index = _index = FoodNameIndex(catalogue)
+    return index
+
+
+def resolve_food(name: Optional[str]):
+    """سجل الطعام المطابق للاسم (أو None)"""
+    return get_food_name_index().resolve(name)
+
+
+def resolve_food_names(names: Iterable[str]) -> Tuple[Dict[str, object], List[str]]:
+    """
+    تحويل مجموعة أسماء دفعة واحدة
+
+    Returns the resolved records by name and the sorted list of names that
+    matched no food.
+    """
+    index = get_food_name_index()
+    resolved = {}
+    unresolved = set()
+    for name in names:
+        record = index.resolve(name)
+        if record is None:
+            unresolved.add(name)
+        else:
+            resolved[name] = record
+    return resolved, sorted(unresolved)
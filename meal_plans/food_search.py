@@ -0,0 +1,234 @@
+"""
+البحث عن الأطعمة بالعربية والإنجليزية
+Arabic-aware food search index
+
+Food names, categories and descriptions are normalised (diacritics and
+tatweel removed, alef/hamza variants, taa marbuta and alef maqsura folded,
+English case-folded) and split into tokens. The sorted token table is built
+from the in-process food catalogue and rebuilt whenever the catalogue
+generation changes, so a typeahead query is a few bisects in memory instead
+of ``icontains`` scans over the ``Food`` table.
+
+Every query token must match (as a prefix, or anywhere inside a word for
+tokens of two letters or more). Infix candidates come from a bigram index of
+the vocabulary, so only words sharing every bigram of the query token are
+checked. Results are ranked by where and how well they matched.
+"""
+
+import re
+import threading
+from bisect import bisect_left
+from typing import Dict, List, Optional, Set, Tuple
+
+from django.db.models import Case, IntegerField, Value, When
+from rest_framework.filters import BaseFilterBackend
+
+from .food_catalogue import get_food_catalogue
+from .models import Food
+
+
+ARABIC_DIACRITICS = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]')
+ARABIC_FOLDING = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ة': 'ه',
+    'ى': 'ي', 'ئ': 'ي', 'ی': 'ي',
+    'ؤ': 'و',
+    'ک': 'ك',
+})
+TOKEN_PATTERN = re.compile(r'\w+')
+ARABIC_ARTICLE_PREFIXES = ('وال', 'بال', 'لل', 'ال')
+
+# أوزان الحقول وطرق المطابقة في الترتيب
+FIELD_WEIGHTS = {'name': 3.0, 'category': 1.5, 'description': 1.0}
+EXACT_MATCH, PREFIX_MATCH, INFIX_MATCH = 3.0, 2.0, 1.0
+MIN_INFIX_LENGTH = 2
+NGRAM_LENGTH = 2
+
+
+def normalize_text(text: Optional[str]) -> str:
+    """توحيد النص العربي والإنجليزي للبحث"""
+    if not text:
+        return ''
+    text = ARABIC_DIACRITICS.sub('', text)
+    return text.translate(ARABIC_FOLDING).casefold()
+
+
+def strip_article(token: str) -> Optional[str]:
+    """الكلمة بدون أداة التعريف (أو None إذا لم تبدأ بها)"""
+    for prefix in ARABIC_ARTICLE_PREFIXES:
+        if token.startswith(prefix) and len(token) - len(prefix) >= 2:
+            return token[len(prefix):]
+    return None
+
+
+def ngrams(token: str) -> set:
+    """المقاطع الثنائية في الكلمة"""
+    return {token[start:start + NGRAM_LENGTH] for start in range(len(token) - NGRAM_LENGTH + 1)}
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """تقسيم النص الموحد إلى كلمات، مع إضافة الكلمة بدون أداة التعريف"""
+    tokens = []
+    for token in TOKEN_PATTERN.findall(normalize_text(text)):
+        tokens.append(token)
+        stripped = strip_article(token)
+        if stripped:
+            tokens.append(stripped)
+    return tokens
+
+
+class FoodSearchIndex:
+    """جدول كلمات مرتب: (الكلمة، الطعام، الحقل)"""
+
+    def __init__(self, generation=None):
+        self.generation = generation
+        self.entries: List[Tuple[str, int, str]] = []
+        self.tokens: List[str] = []
+        self.vocabulary: List[str] = []
+        self.ngrams: Dict[str, Set[int]] = {}
+        self.names: Dict[int, str] = {}
+        self.categories: Dict[int, int] = {}
+
+    @classmethod
+    def build(cls, catalogue, descriptions: Dict[int, str]):
+        index = cls(catalogue.generation)
+        entries = set()
+        for record in catalogue.active():
+            index.names[record.id] = ' '.join(TOKEN_PATTERN.findall(normalize_text(record.name_ar or record.name)))
+            index.categories[record.id] = record.category.id
+            sources = (
+                ('name', record.name_ar), ('name', record.name),
+                ('category', record.category.name_ar), ('category', record.category.name),
+                ('description', descriptions.get(record.id)),
+            )
+            for field, text in sources:
+                for token in tokenize(text):
+                    entries.add((token, record.id, field))
+        index.entries = sorted(entries)
+        index.tokens = [token for token, _, _ in index.entries]
+        index.vocabulary = sorted(set(index.tokens))
+        for position, token in enumerate(index.vocabulary):
+            for gram in ngrams(token):
+                index.ngrams.setdefault(gram, set()).add(position)
+        return index
+
+    def _infix_candidates(self, query_token: str) -> List[int]:
+        """مواقع الكلمات في المفردات التي تحتوي كل مقاطع كلمة البحث"""
+        postings = sorted((self.ngrams.get(gram, set()) for gram in ngrams(query_token)), key=len)
+        if not postings or not postings[0]:
+            return []
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates &= posting
+            if not candidates:
+                return []
+        return sorted(candidates)
+
+    def _matches(self, query_token: str) -> Dict[int, float]:
+        """أفضل درجة لكل طعام يطابق كلمة البحث"""
+        scores = {}
+
+        def add(token, kind):
+            position = bisect_left(self.tokens, token)
+            while position < len(self.tokens) and self.tokens[position] == token:
+                _, food_id, field = self.entries[position]
+                score = FIELD_WEIGHTS[field] * kind
+                if score > scores.get(food_id, 0):
+                    scores[food_id] = score
+                position += 1
+
+        position = bisect_left(self.vocabulary, query_token)
+        while position < len(self.vocabulary) and self.vocabulary[position].startswith(query_token):
+            token = self.vocabulary[position]
+            add(token, EXACT_MATCH if token == query_token else PREFIX_MATCH)
+            position += 1
+
+        if len(query_token) >= MIN_INFIX_LENGTH:
+            for position in self._infix_candidates(query_token):
+                token = self.vocabulary[position]
+                if query_token in token and not token.startswith(query_token):
+                    add(token, INFIX_MATCH)
+
+        return scores
+
+    def search(self, query: str, category_id: Optional[int] = None) -> List[int]:
+        """معرفات الأطعمة المطابقة مرتبة حسب الأهمية"""
+        query_tokens = list(dict.fromkeys(TOKEN_PATTERN.findall(normalize_text(query))))
+        if not query_tokens:
+            return []
+
+        scores = None
+        for query_token in query_tokens:
+            matches = self._matches(query_token)
+            stripped = strip_article(query_token)
+            if stripped:
+                for food_id, score in self._matches(stripped).items():
+                    matches[food_id] = max(score, matches.get(food_id, 0))
+            if scores is None:
+                scores = matches
+            else:
+                scores = {food_id: scores[food_id] + score for food_id, score in matches.items() if food_id in scores}
+            if not scores:
+                return []
+
+        phrase = ' '.join(query_tokens)
+        ranked = []
+        for food_id, score in scores.items():
+            if category_id is not None and self.categories.get(food_id) != category_id:
+                continue
+            name = self.names.get(food_id, '')
+            if name == phrase:
+                score += 10
+            elif name.startswith(phrase):
+                score += 5
+            ranked.append((-score, len(name), food_id))
+
+        ranked.sort()
+        return [food_id for _, _, food_id in ranked]
+
+
+_lock = threading.Lock()
+_index: Optional[FoodSearchIndex] = None
+
+
+def get_food_search_index() -> FoodSearchIndex:
+    """الحصول على فهرس البحث، مع إعادة بنائه عند تغيّر كتالوج الأطعمة"""
+    global _index
+    catalogue = get_food_catalogue()
+    index = _index
+    if index is not None and index.generation == catalogue.generation:
+        return index
+
+    with _lock:
+        index = _index
+        if index is None or index.generation != catalogue.generation:
+            descriptions = dict(Food.objects.filter(is_active=True).values_list('id', 'description'))
+            index = _index = FoodSearchIndex.build(catalogue, descriptions)
+    return index
+
+
+def search_food_ids(query: str, category_id: Optional[int] = None) -> List[int]:
+    """البحث عن الأطعمة النشطة وإرجاع معرفاتها مرتبة حسب الأهمية"""
+    return get_food_search_index().search(query, category_id)
+
+
+def order_by_ids(queryset, food_ids: List[int]):
+    """تصفية QuerySet للأطعمة المحددة مع الحفاظ على ترتيب البحث"""
+    if not food_ids:
+        return queryset.none()
+    ranking = Case(
+        *[When(id=food_id, then=Value(position)) for position, food_id in enumerate(food_ids)],
+        output_field=IntegerField()
+    )
+    return queryset.filter(id__in=food_ids).order_by(ranking)
+
+
+class FoodSearchFilter(BaseFilterBackend):
+    """فلتر البحث للأطعمة عبر فهرس البحث (?search=)"""
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        return order_by_ids(queryset, search_food_ids(query))
@@ -1,8 +1,9 @@
 from django.core.management.base import BaseCommand
 from meal_plans.models import (
-    MealPlanTemplate, Food, FoodCategory, MealType, 
+    MealPlanTemplate, FoodCategory, MealType, 
     Recipe, MealPlan, Meal, MealIngredient
 )
+from meal_plans.food_names import resolve_food
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from datetime import date, timedelta
@@ -281,18 +282,18 @@ class Command(BaseCommand):
                     
                     # Add ingredients to the meal
                     for ingredient_data in meal_data['ingredients']:
-                        try:
-                            food = Food.objects.get(name=ingredient_data['food'])
-                            MealIngredient.objects.create(
-                                meal=meal,
-                                food=food,
-                                amount=ingredient_data['amount'],
-                                notes=ingredient_data['notes']
-                            )
-                        except Food.DoesNotExist:
+                        food = resolve_food(ingredient_data['food'])
+                        if food is None:
                             self.stdout.write(
                                 self.style.WARNING(f'Food not found: {ingredient_data["food"]}')
                             )
+                            continue
+                        MealIngredient.objects.create(
+                            meal=meal,
+                            food_id=food.id,
+                            amount=ingredient_data['amount'],
+                            notes=ingredient_data['notes']
+                        )
                 
                 self.stdout.write(f'Created sample meal plan: {sample_plan.title}')
             else:
@@ -7,6 +7,7 @@ from django.core.management.base import BaseCommand
 from django.db.utils import IntegrityError
 from django.utils import timezone
 from meal_plans.models import FoodCategory, Food, MealType, MealPlanTemplate, Meal, MealIngredient, MealPlan
+from meal_plans.food_names import resolve_food
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -305,6 +306,7 @@ class Command(BaseCommand):
                     
                     meal = Meal.objects.create(
                         meal_plan=temp_meal_plan,
+                        template=template,
                         meal_type=meal_data['type'],
                         name=meal_data['name'],
                         day_of_week=1
@@ -312,15 +314,15 @@ class Command(BaseCommand):
                     
                     # إضافة المكونات
                     for ingredient_data in meal_data['ingredients']:
-                        try:
-                            food = Food.objects.get(name_ar=ingredient_data['food'])
-                            MealIngredient.objects.create(
-                                meal=meal,
-                                food=food,
-                                amount=ingredient_data['amount']
-                            )
-                        except Food.DoesNotExist:
+                        food = resolve_food(ingredient_data['food'])
+                        if food is None:
                             self.stdout.write(f'تحذير: لم يتم العثور على الطعام: {ingredient_data["food"]}')
+                            continue
+                        MealIngredient.objects.create(
+                            meal=meal,
+                            food_id=food.id,
+                            amount=ingredient_data['amount']
+                        )
                 
                 self.stdout.write(f'تم إنشاء {len(template_data["meals"])} وجبة للقالب')
             else:
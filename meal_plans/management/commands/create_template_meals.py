@@ -207,6 +207,7 @@ class Command(BaseCommand):
             for meal_data in meals_data:
                 meal = Meal.objects.create(
                     meal_plan=meal_plan,
+                    template=template,
                     meal_type=meal_data['meal_type'],
                     name=meal_data['name'],
                     day_of_week=0  # يوم الأحد
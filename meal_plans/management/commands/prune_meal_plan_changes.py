@@ -0,0 +1,23 @@
+"""
+حذف التغييرات القديمة من سجل تغييرات خطط الوجبات
+Prune the meal-plan change feed
+"""
+
+from django.core.management.base import BaseCommand
+
+from meal_plans.change_feed import prune_changes
+
+
+class Command(BaseCommand):
+    help = 'حذف تغييرات خطط الوجبات الأقدم من مدة الاحتفاظ (MEAL_PLAN_FEED_RETENTION_DAYS)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            help='مدة الاحتفاظ بالأيام (الافتراضي من الإعدادات)'
+        )
+
+    def handle(self, *args, **options):
+        deleted = prune_changes(options['days'])
+        self.stdout.write(self.style.SUCCESS(f'✅ تم حذف {deleted} تغيير'))
@@ -0,0 +1,42 @@
+"""
+إعادة بناء القيم الغذائية المخزنة للوجبات والخطط
+Rebuild materialized meal and plan nutrition totals
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from meal_plans.nutrition_totals import find_stale_totals, rebuild_all_totals
+
+
+class Command(BaseCommand):
+    help = 'إعادة بناء القيم الغذائية المخزنة للوجبات وأيام الخطط أو التحقق منها'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--plan',
+            type=int,
+            action='append',
+            dest='plans',
+            help='معرف خطة الوجبات (يمكن تكراره)'
+        )
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='التحقق فقط من تطابق القيم المخزنة مع المكونات دون تعديل'
+        )
+
+    def handle(self, *args, **options):
+        plans = options['plans']
+
+        if options['verify']:
+            stale = find_stale_totals(plans)
+            if not stale:
+                self.stdout.write(self.style.SUCCESS('✅ جميع القيم الغذائية المخزنة مطابقة'))
+                return
+            for kind, row_id, field, stored, expected in stale:
+                self.stdout.write(f'  {kind} {row_id}: {field} stored={stored} expected={expected}')
+            raise CommandError(f'❌ {len(stale)} قيمة غير مطابقة')
+
+        self.stdout.write('بدء إعادة بناء القيم الغذائية المخزنة...')
+        rebuild_all_totals(plans)
+        self.stdout.write(self.style.SUCCESS('✅ تم إعادة بناء القيم الغذائية المخزنة بنجاح'))
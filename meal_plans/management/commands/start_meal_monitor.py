@@ -15,6 +15,7 @@ from django.core.management.base import BaseCommand, CommandError
 from django.contrib.auth.models import User
 from meal_plans.models import MealPlan, Meal, MealIngredient, Food
 from django.db.models import Q, Count
+from meal_plans.diet_pools import get_diet_pool_food_ids
 
 # Try to import schedule, fallback to time-based approach if not available
 try:
@@ -94,15 +95,6 @@ class MealMonitor:
             "Authorization": f"Token {self.doctor_token}",
             "Content-Type": "application/json"
         }
-        self.food_mappings = {
-            'keto': ['صدر دجاج', 'سلمون', 'السبانخ', 'بروكلي', 'الأفوكادو', 'اللوز', 'زيت الزيتون', 'البيض'],
-            'low_carb': ['صدر دجاج', 'سلمون', 'السبانخ', 'بروكلي', 'الأفوكادو', 'اللوز', 'زيت الزيتون', 'البيض'],
-            'weight_loss': ['صدر دجاج', 'سلمون', 'السبانخ', 'بروكلي', 'الأفوكادو', 'اللوز', 'زيت الزيتون', 'البيض'],
-            'weight_gain': ['صدر دجاج', 'سلمون', 'السبانخ', 'بروكلي', 'الأفوكادو', 'اللوز', 'زيت الزيتون', 'البيض'],
-            'muscle_building': ['صدر دجاج', 'سلمون', 'السبانخ', 'بروكلي', 'الأفوكادو', 'اللوز', 'زيت الزيتون', 'البيض'],
-            'health_maintenance': ['صدر دجاج', 'سلمون', 'السبانخ', 'بروكلي', 'الأفوكادو', 'اللوز', 'زيت الزيتون', 'البيض'],
-            'weight_maintenance': ['صدر دجاج', 'سلمون', 'السبانخ', 'بروكلي', 'الأفوكادو', 'اللوز', 'زيت الزيتون', 'البيض']
-        }
         
     def log(self, message, level="INFO"):
         """Log message with timestamp"""
@@ -138,22 +130,20 @@ class MealMonitor:
             return Meal.objects.none()
     
     def get_foods_for_diet_plan(self, diet_plan):
-        """Get appropriate foods for a diet plan"""
+        """Get appropriate foods for a diet plan (IDs from the precomputed diet pools)"""
         try:
-            food_names = self.food_mappings.get(diet_plan, self.food_mappings['health_maintenance'])
-            foods = Food.objects.filter(name_ar__in=food_names, is_active=True)
-            return foods
+            return get_diet_pool_food_ids(diet_plan)
         except Exception as e:
             self.log(f"Error getting foods for diet plan {diet_plan}: {e}", "ERROR")
-            return Food.objects.none()
+            return []
     
     def add_ingredients_to_meal(self, meal):
         """Add ingredients to a specific meal"""
         try:
             meal_plan = meal.meal_plan
-            foods = self.get_foods_for_diet_plan(meal_plan.diet_plan)
+            food_ids = self.get_foods_for_diet_plan(meal_plan.diet_plan)
             
-            if not foods.exists():
+            if not food_ids:
                 self.log(f"No foods available for diet plan: {meal_plan.diet_plan}", "WARNING")
                 return False
             
@@ -162,7 +152,8 @@ class MealMonitor:
             
             # Add 2-4 random ingredients
             num_ingredients = random.randint(2, 4)
-            selected_foods = foods.order_by('?')[:num_ingredients]
+            selected_ids = random.sample(food_ids, min(num_ingredients, len(food_ids)))
+            selected_foods = list(Food.objects.filter(id__in=selected_ids))
             
             for food in selected_foods:
                 amount = random.uniform(50, 200)
@@ -172,7 +163,7 @@ class MealMonitor:
                     amount=round(amount, 1)
                 )
             
-            self.log(f"Added {selected_foods.count()} ingredients to meal {meal.id}: {meal.name}")
+            self.log(f"Added {len(selected_foods)} ingredients to meal {meal.id}: {meal.name}")
             return True
             
         except Exception as e:
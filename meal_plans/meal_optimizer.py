@@ -0,0 +1,388 @@
+"""
+محسّن خطط الوجبات
+Constraint-based meal-plan optimizer
+
+Builds a 7-day plan from the diet-plan food pools (``meal_plans.diet_pools``).
+Every meal slot gets a share of the daily targets (``MEAL_CALORIE_SPLITS``)
+and a fixed composition of roles (``MEAL_COMPONENTS``); foods rotate through
+each pool by day and slot, so the same plan and pools always give the same
+week. Ingredient amounts are then solved per meal as a bounded least-squares
+problem:
+
+* calories must equal the meal's share of the daily target,
+* protein / carbs / fat (in kcal) should be as close as possible to theirs,
+* each portion stays inside its gram bounds and, all else equal, close to
+  the usual portion for its role.
+
+Each meal has at most four ingredients, so its problem is a 4x4 system: a
+primal active-set method solves the equality-constrained normal equations of
+the free ingredients (pinning the others to a bound) and usually settles in
+a few solves; if it does not, every free / lower / upper combination (3^n)
+is tried. The whole week is solved in one pass without any corrective
+rescaling. A meal whose calorie share cannot be reached inside the bounds
+falls back to the closest bounded portions and is reported as out of
+tolerance.
+
+The solver is plain Python rather than a vectorised (numpy) solve: numpy is
+not a dependency of the project, and at this size the per-call overhead of
+an array library would outweigh the arithmetic it saves.
+"""
+
+from itertools import product
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+from .models import NUTRITION_TOTAL_KEYS
+
+
+MACRO_KEYS = ('protein', 'carbs', 'fat')
+KCAL_PER_GRAM = {'protein': 4, 'carbs': 4, 'fat': 9}
+SUMMARY_KEYS = ('calories', 'protein', 'carbs', 'fat', 'fiber')
+
+# ترتيب الوجبات اليومية ونصيب كل وجبة من السعرات
+MEAL_SLOTS = ('breakfast', 'morning_snack', 'lunch', 'afternoon_snack', 'dinner')
+MEAL_CALORIE_SPLITS = {
+    'breakfast': 0.25,
+    'morning_snack': 0.10,
+    'lunch': 0.30,
+    'afternoon_snack': 0.10,
+    'dinner': 0.25,
+}
+
+
+class Component(NamedTuple):
+    """مكون في الوجبة: الدور، الكمية المعتادة، الحدود بالجرام، والملاحظة"""
+    role: str
+    grams: float
+    min_grams: float
+    max_grams: float
+    notes: str
+
+
+MEAL_COMPONENTS: Dict[str, Sequence[Component]] = {
+    'breakfast': (
+        Component('proteins', 100, 50, 250, 'مطبوخ'),
+        Component('grains', 50, 20, 200, 'مطبوخ'),
+        Component('vegetables', 150, 50, 250, 'طازج'),
+        Component('fats', 10, 5, 50, 'للطبخ'),
+    ),
+    'lunch': (
+        Component('proteins', 150, 60, 300, 'مطبوخ'),
+        Component('grains', 80, 30, 300, 'مطبوخ'),
+        Component('vegetables', 200, 50, 300, 'طازج'),
+        Component('fats', 15, 5, 60, 'للطبخ'),
+    ),
+    'dinner': (
+        Component('proteins', 120, 50, 300, 'مطبوخ'),
+        Component('vegetables', 180, 50, 300, 'طازج'),
+        Component('fats', 8, 5, 50, 'للطبخ'),
+    ),
+    'snack': (
+        Component('fruits', 100, 50, 300, 'طازج'),
+        Component('fats', 15, 5, 60, 'طازج'),
+    ),
+}
+
+# أوزان دالة الهدف (لكل سعرة حرارية من الفرق)
+CALORIE_WEIGHT = 100.0
+MACRO_WEIGHT = 1.0
+PORTION_WEIGHT = 0.05
+CALORIE_TOLERANCE = 5
+
+
+class PlannedIngredient(NamedTuple):
+    food: object
+    role: str
+    amount: float
+    notes: str
+
+    def nutrition(self) -> Dict[str, float]:
+        return self.food.get_nutrition_for_amount(self.amount)
+
+
+class PlannedMeal(NamedTuple):
+    day_of_week: int
+    slot: str
+    ingredients: List[PlannedIngredient]
+    targets: Dict[str, float]
+    totals: Dict[str, float]
+
+    @property
+    def calorie_error(self) -> float:
+        return self.totals['calories'] - self.targets['calories']
+
+
+class WeekPlan(NamedTuple):
+    meals: List[PlannedMeal]
+    targets: Dict[str, float]
+    daily_totals: Dict[int, Dict[str, float]]
+
+    @property
+    def within_tolerance(self) -> bool:
+        """هل حققت كل الأيام السعرات المطلوبة (ضمن CALORIE_TOLERANCE)"""
+        return all(
+            abs(totals['calories'] - self.targets['calories']) <= CALORIE_TOLERANCE
+            for totals in self.daily_totals.values()
+        )
+
+    def summary(self) -> Dict:
+        """ملخص للاستجابة: الأهداف ومجموع كل يوم"""
+        return {
+            'targets': self.targets,
+            'daily_totals': [
+                {'day_of_week': day, **{key: round(value, 1) for key, value in totals.items()}}
+                for day, totals in sorted(self.daily_totals.items())
+            ],
+            'within_tolerance': self.within_tolerance,
+        }
+
+
+def component_slot(slot: str) -> str:
+    return 'snack' if 'snack' in slot else slot
+
+
+def _solve_linear(matrix: List[List[float]], vector: List[float]) -> Optional[List[float]]:
+    """حل نظام خطي صغير بطريقة الحذف مع اختيار المحور (None إذا كان شاذاً)"""
+    size = len(vector)
+    rows = [list(matrix[i]) + [vector[i]] for i in range(size)]
+    for column in range(size):
+        pivot = max(range(column, size), key=lambda row: abs(rows[row][column]))
+        if abs(rows[pivot][column]) < 1e-12:
+            return None
+        rows[column], rows[pivot] = rows[pivot], rows[column]
+        for row in range(column + 1, size):
+            factor = rows[row][column] / rows[column][column]
+            if factor:
+                for k in range(column, size + 1):
+                    rows[row][k] -= factor * rows[column][k]
+    solution = [0.0] * size
+    for row in range(size - 1, -1, -1):
+        value = rows[row][size] - sum(rows[row][k] * solution[k] for k in range(row + 1, size))
+        solution[row] = value / rows[row][row]
+    return solution
+
+
+def solve_portions(columns, weights, targets, calorie_column, calorie_target, lower, upper,
+                   max_iterations: Optional[int] = None):
+    """
+    حل المربعات الصغرى المقيدة لمقادير وجبة واحدة (بوحدة 100 جرام)
+
+    ``columns[i]`` holds the row values of ingredient ``i`` (one per entry of
+    ``targets``); the objective is ``sum(weights[r] * (row_r(x) - targets[r])**2)``
+    subject to ``calorie_column . x == calorie_target`` and
+    ``lower <= x <= upper``. Returns the amounts and whether the calorie
+    equality could be met.
+
+    A primal active-set method usually finishes in a few solves; if it does
+    not settle within ``max_iterations`` (default ``4 * n + 4``), every
+    free / lower / upper combination is tried instead.
+    """
+    size = len(columns)
+    rows = range(len(targets))
+    # Normal equations: M x = b
+    matrix = [[sum(weights[r] * columns[i][r] * columns[j][r] for r in rows) for j in range(size)] for i in range(size)]
+    vector = [sum(weights[r] * columns[i][r] * targets[r] for r in rows) for i in range(size)]
+
+    def solve(states, constrained):
+        """حل المتغيرات الحرة مع تثبيت الباقي على حدودها: (x, مضاعف لاغرانج) أو None"""
+        free = [i for i in range(size) if states[i] == 0]
+        x = [lower[i] if states[i] < 0 else upper[i] if states[i] > 0 else 0.0 for i in range(size)]
+        fixed_calories = sum(calorie_column[i] * x[i] for i in range(size) if states[i])
+        if not free:
+            if constrained and abs(fixed_calories - calorie_target) > 1e-6:
+                return None
+            return x, 0.0
+        reduced = [[matrix[i][j] for j in free] for i in free]
+        rhs = [vector[i] - sum(matrix[i][j] * x[j] for j in range(size) if states[j]) for i in free]
+        if constrained:
+            for position, i in enumerate(free):
+                reduced[position].append(calorie_column[i])
+            reduced.append([calorie_column[i] for i in free] + [0.0])
+            rhs.append(calorie_target - fixed_calories)
+        solution = _solve_linear(reduced, rhs)
+        if solution is None:
+            return None
+        for position, i in enumerate(free):
+            x[i] = solution[position]
+        return x, (solution[-1] if constrained else 0.0)
+
+    def feasible(x):
+        return all(lower[i] - 1e-9 <= x[i] <= upper[i] + 1e-9 for i in range(size))
+
+    def active_set(constrained):
+        states = [0] * size
+        for _ in range(4 * size + 4 if max_iterations is None else max_iterations):
+            result = solve(states, constrained)
+            if result is None:
+                return None
+            x, multiplier = result
+            # Fix the free amount furthest outside its bounds
+            worst, worst_state, worst_excess = None, 0, 1e-9
+            for i in range(size):
+                if states[i] == 0:
+                    excess = max(lower[i] - x[i], x[i] - upper[i])
+                    if excess > worst_excess:
+                        worst, worst_state, worst_excess = i, (-1 if x[i] < lower[i] else 1), excess
+            if worst is not None:
+                states[worst] = worst_state
+                continue
+            # Release the bound amount whose gradient points back inside
+            gradient = [sum(matrix[i][j] * x[j] for j in range(size)) - vector[i] + multiplier * calorie_column[i] for i in range(size)]
+            release, release_gradient = None, 1e-9
+            for i in range(size):
+                pull = -gradient[i] if states[i] < 0 else gradient[i] if states[i] > 0 else 0
+                if pull > release_gradient:
+                    release, release_gradient = i, pull
+            if release is None:
+                return x
+            states[release] = 0
+        return None
+
+    def objective(x):
+        return sum(
+            weights[r] * (sum(columns[i][r] * x[i] for i in range(size)) - targets[r]) ** 2
+            for r in rows
+        )
+
+    lowest = sum(calorie_column[i] * lower[i] for i in range(size))
+    highest = sum(calorie_column[i] * upper[i] for i in range(size))
+    for constrained in (True, False):
+        if constrained and not lowest - 1e-6 <= calorie_target <= highest + 1e-6:
+            continue
+        x = active_set(constrained)
+        if x is not None:
+            return x, constrained
+        best = None
+        for states in product((0, -1, 1), repeat=size):
+            result = solve(states, constrained)
+            if result is None or not feasible(result[0]):
+                continue
+            score = objective(result[0])
+            if best is None or score < best[0]:
+                best = (score, result[0])
+        if best is not None:
+            return best[1], constrained
+    return list(lower), False
+
+
+def optimize_meal(foods: Sequence, components: Sequence[Component], targets: Dict[str, float]) -> List[PlannedIngredient]:
+    """حساب مقادير مكونات وجبة واحدة لتحقيق أهدافها"""
+    calorie_index = NUTRITION_TOTAL_KEYS.index('calories')
+    macro_indexes = [NUTRITION_TOTAL_KEYS.index(key) for key in MACRO_KEYS]
+
+    # Rows: calories, macros (as kcal), then one portion row per ingredient
+    macro_weights = [MACRO_WEIGHT if targets.get(key) else 0.0 for key in MACRO_KEYS]
+    weights = [CALORIE_WEIGHT, *macro_weights, *[PORTION_WEIGHT] * len(foods)]
+    row_targets = [targets['calories'], *[(targets.get(key) or 0) * KCAL_PER_GRAM[key] for key in MACRO_KEYS]]
+
+    columns = []
+    calorie_column = []
+    for position, food in enumerate(foods):
+        per_100g = [value or 0 for value in food.per_100g]
+        calories = per_100g[calorie_index]
+        scale = max(calories, 50)
+        portions = [0.0] * len(foods)
+        portions[position] = scale
+        columns.append([
+            calories,
+            *[per_100g[index] * KCAL_PER_GRAM[key] for index, key in zip(macro_indexes, MACRO_KEYS)],
+            *portions,
+        ])
+        calorie_column.append(calories)
+    for position, component in enumerate(components):
+        row_targets.append(max(calorie_column[position], 50) * component.grams / 100)
+
+    lower = [component.min_grams / 100 for component in components]
+    upper = [component.max_grams / 100 for component in components]
+    amounts, _ = solve_portions(columns, weights, row_targets, calorie_column, targets['calories'], lower, upper)
+
+    return [
+        PlannedIngredient(food, component.role, round(amount * 100, 1), component.notes)
+        for food, component, amount in zip(foods, components, amounts)
+    ]
+
+
+def _meal_totals(ingredients: Sequence[PlannedIngredient]) -> Dict[str, float]:
+    totals = dict.fromkeys(SUMMARY_KEYS, 0.0)
+    for ingredient in ingredients:
+        nutrition = ingredient.nutrition()
+        for key in SUMMARY_KEYS:
+            totals[key] += nutrition.get(key) or 0
+    return totals
+
+
+def _pick_foods(pools: Dict[str, list], components: Sequence[Component], turn: int) -> list:
+    """اختيار طعام لكل مكون بالتناوب على مجموعته، بدون تكرار الطعام في الوجبة"""
+    foods = []
+    for component in components:
+        pool = pools[component.role]
+        food = pool[turn % len(pool)]
+        for offset in range(1, len(pool)):
+            if food not in foods:
+                break
+            food = pool[(turn + offset) % len(pool)]
+        foods.append(food)
+    return foods
+
+
+def optimize_week_plan(pools: Dict[str, list], targets: Dict[str, float], days: int = 7,
+                       slots: Sequence[str] = MEAL_SLOTS, splits: Dict[str, float] = MEAL_CALORIE_SPLITS,
+                       components: Dict[str, Sequence[Component]] = MEAL_COMPONENTS) -> WeekPlan:
+    """
+    بناء خطة أسبوعية من مجموعات الأطعمة
+
+    ``pools`` maps a role to its food records (``FoodRecord`` from the food
+    catalogue), ``targets`` holds the daily ``calories`` and optionally
+    ``protein`` / ``carbs`` / ``fat`` in grams. Roles missing from the pools
+    are left out of the meal.
+
+    Meals are solved from the least to the most flexible (fewest components
+    and smallest share first); each one gets its share of what is still left
+    of the day's targets, so a small meal that hits a bound is made up by the
+    larger meals of the same day. Whatever is still missing afterwards is
+    offered once more to each meal, most flexible first.
+    """
+    target_keys = ('calories', *MACRO_KEYS)
+    day_targets = {key: targets.get(key) or 0 for key in target_keys}
+
+    planned = []
+    for position, slot in enumerate(slots):
+        meal_components = [component for component in components[component_slot(slot)] if pools.get(component.role)]
+        if meal_components:
+            planned.append((position, slot, meal_components))
+    solve_order = sorted(planned, key=lambda item: (len(item[2]), splits[item[1]], item[0]))
+
+    meals = []
+    daily_totals = {}
+    for day in range(days):
+        day_totals = daily_totals.setdefault(day, dict.fromkeys(SUMMARY_KEYS, 0.0))
+        remaining = dict(day_targets)
+        remaining_share = sum(splits[slot] for _, slot, _ in planned)
+        day_meals = {}
+        for position, slot, meal_components in solve_order:
+            share = splits[slot] / remaining_share if remaining_share else 0
+            meal_targets = {key: max(remaining[key], 0) * share for key in target_keys}
+            foods = _pick_foods(pools, meal_components, day * len(slots) + position)
+            ingredients = optimize_meal(foods, meal_components, meal_targets)
+            totals = _meal_totals(ingredients)
+            for key in target_keys:
+                remaining[key] -= totals[key]
+            remaining_share -= splits[slot]
+            day_meals[position] = (foods, meal_components, PlannedMeal(day, slot, ingredients, meal_targets, totals))
+
+        for position, slot, meal_components in reversed(solve_order):
+            if abs(remaining['calories']) <= CALORIE_TOLERANCE / 2:
+                break
+            foods, meal_components, meal = day_meals[position]
+            meal_targets = dict(meal.targets, calories=max(meal.totals['calories'] + remaining['calories'], 0))
+            ingredients = optimize_meal(foods, meal_components, meal_targets)
+            totals = _meal_totals(ingredients)
+            remaining['calories'] -= totals['calories'] - meal.totals['calories']
+            day_meals[position] = (foods, meal_components, PlannedMeal(day, slot, ingredients, meal_targets, totals))
+
+        for position in sorted(day_meals):
+            meal = day_meals[position][2]
+            for key in SUMMARY_KEYS:
+                day_totals[key] += meal.totals[key]
+            meals.append(meal)
+
+    return WeekPlan(meals, day_targets, daily_totals)
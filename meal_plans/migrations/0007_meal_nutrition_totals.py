@@ -0,0 +1,107 @@
+# Generated by Django 5.2.7 on 2026-10-18 01:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+NUTRITION_KEYS = ['calories', 'protein', 'carbs', 'fat', 'fiber', 'sugar', 'sodium']
+
+
+def backfill_totals(apps, schema_editor):
+    """حساب القيم المخزنة للوجبات وأيام الخطط الموجودة"""
+    Meal = apps.get_model('meal_plans', 'Meal')
+    MealIngredient = apps.get_model('meal_plans', 'MealIngredient')
+    MealPlanDayNutrition = apps.get_model('meal_plans', 'MealPlanDayNutrition')
+
+    meals = {meal.id: meal for meal in Meal.objects.all()}
+    if not meals:
+        return
+    for meal in meals.values():
+        for key in NUTRITION_KEYS:
+            setattr(meal, f'total_{key}', 0)
+
+    rows = MealIngredient.objects.order_by('id').values_list(
+        'meal_id', 'amount', *[f'food__{key}_per_100g' for key in NUTRITION_KEYS]
+    )
+    for meal_id, amount, *per_100g in rows:
+        meal = meals[meal_id]
+        for key, value in zip(NUTRITION_KEYS, per_100g):
+            setattr(meal, f'total_{key}', getattr(meal, f'total_{key}') + value * (amount / 100))
+    Meal.objects.bulk_update(meals.values(), [f'total_{key}' for key in NUTRITION_KEYS], batch_size=500)
+
+    days = {}
+    for meal in sorted(meals.values(), key=lambda meal: meal.id):
+        day = days.setdefault((meal.meal_plan_id, meal.day_of_week), MealPlanDayNutrition(
+            meal_plan_id=meal.meal_plan_id, day_of_week=meal.day_of_week
+        ))
+        day.meals_count += 1
+        for key in NUTRITION_KEYS:
+            setattr(day, key, getattr(day, key) + getattr(meal, f'total_{key}'))
+    MealPlanDayNutrition.objects.bulk_create(days.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meal_plans', '0006_alter_patientmealselection_unique_together'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='meal',
+            name='total_calories',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='meal',
+            name='total_carbs',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='meal',
+            name='total_fat',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='meal',
+            name='total_fiber',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='meal',
+            name='total_protein',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='meal',
+            name='total_sodium',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='meal',
+            name='total_sugar',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='MealPlanDayNutrition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day_of_week', models.IntegerField()),
+                ('meals_count', models.IntegerField(default=0)),
+                ('calories', models.FloatField(default=0)),
+                ('protein', models.FloatField(default=0)),
+                ('carbs', models.FloatField(default=0)),
+                ('fat', models.FloatField(default=0)),
+                ('fiber', models.FloatField(default=0)),
+                ('sugar', models.FloatField(default=0)),
+                ('sodium', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('meal_plan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='day_nutrition', to='meal_plans.mealplan')),
+            ],
+            options={
+                'ordering': ['day_of_week'],
+                'unique_together': {('meal_plan', 'day_of_week')},
+            },
+        ),
+        migrations.RunPython(backfill_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-18 01:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def link_template_meals(apps, schema_editor):
+    """ربط وجبات القوالب الموجودة بقوالبها عبر عنوان الخطة 'Template <id>'"""
+    MealPlan = apps.get_model('meal_plans', 'MealPlan')
+    MealPlanTemplate = apps.get_model('meal_plans', 'MealPlanTemplate')
+    Meal = apps.get_model('meal_plans', 'Meal')
+
+    template_ids = set(MealPlanTemplate.objects.values_list('id', flat=True))
+    plans = MealPlan.objects.filter(title__regex=r'^Template [0-9]+$').values_list('id', 'title')
+    for plan_id, title in plans:
+        template_id = int(title.split(' ', 1)[1])
+        if template_id in template_ids:
+            Meal.objects.filter(meal_plan_id=plan_id).update(template_id=template_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meal_plans', '0007_meal_nutrition_totals'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='meal',
+            name='template',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='template_meals', to='meal_plans.mealplantemplate'),
+        ),
+        migrations.RunPython(link_template_meals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:40
+
+from django.db import migrations, models
+
+
+MACRO_KEYS = ('calories', 'protein', 'carbs', 'fat')
+
+
+def _number(value):
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def store_selection_totals(apps, schema_editor):
+    """حفظ القيم الغذائية لكل اختيار من مجموع مكوناته (كما كان يحسبها طلب GET)"""
+    PatientMealSelection = apps.get_model('meal_plans', 'PatientMealSelection')
+    changed = []
+    for selection in PatientMealSelection.objects.only('id', 'ingredients', *MACRO_KEYS).iterator():
+        totals = dict.fromkeys(MACRO_KEYS, 0.0)
+        for ingredient in selection.ingredients or []:
+            if not isinstance(ingredient, dict):
+                continue
+            amount = _number(ingredient.get('amount') or ingredient.get('quantity'))
+            for key in MACRO_KEYS:
+                value = _number(ingredient.get(key))
+                if not value and amount > 0:
+                    value = round(_number(ingredient.get(f'{key}_per_100g')) * amount / 100, 1)
+                totals[key] += value
+
+        updated = False
+        for key in MACRO_KEYS:
+            value = round(totals[key], 1)
+            if value > 0 and value != getattr(selection, key):
+                setattr(selection, key, value)
+                updated = True
+        if updated:
+            changed.append(selection)
+
+    PatientMealSelection.objects.bulk_update(changed, MACRO_KEYS, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meal_plans', '0008_meal_template'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='patientmealselection',
+            index=models.Index(fields=['patient', '-selected_at'], name='selection_patient_recent_idx'),
+        ),
+        migrations.RunPython(store_selection_totals, migrations.RunPython.noop),
+    ]
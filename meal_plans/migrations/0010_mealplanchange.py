@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meal_plans', '0009_patientmealselection_selection_patient_recent_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MealPlanChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('meal_plan_id', models.BigIntegerField()),
+                ('kind', models.CharField(choices=[('plan', 'Meal plan'), ('meal', 'Meals'), ('ingredient', 'Meal ingredients'), ('selection', 'Patient selections')], max_length=20)),
+                ('action', models.CharField(choices=[('saved', 'Saved'), ('deleted', 'Deleted')], default='saved', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='meal_plan_changes', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'id'], name='plan_change_user_version_idx'), models.Index(fields=['created_at'], name='plan_change_created_idx')],
+            },
+        ),
+    ]
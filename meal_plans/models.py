@@ -4,6 +4,11 @@ from django.utils.translation import gettext_lazy as _
 
 User = get_user_model()
 
+# القيم الغذائية المخزنة مسبقاً للوجبات والخطط
+NUTRITION_TOTAL_KEYS = ['calories', 'protein', 'carbs', 'fat', 'fiber', 'sugar', 'sodium']
+# Vitamins and minerals are stored per 100g too, in columns without the suffix
+MICRONUTRIENT_KEYS = ['vitamin_a', 'vitamin_c', 'vitamin_d', 'calcium', 'iron']
+
 
 class FoodCategory(models.Model):
     name = models.CharField(max_length=100)
@@ -161,6 +166,14 @@ class MealPlan(models.Model):
         self.is_active = False
         self.save()
 
+    def get_total_nutrition(self):
+        """Total nutrition for the whole plan, rolled up from the per-day totals"""
+        total = {key: 0 for key in NUTRITION_TOTAL_KEYS}
+        for day in self.day_nutrition.all():
+            for key in total:
+                total[key] += getattr(day, key)
+        return total
+
     def save(self, *args, **kwargs):
         # If this is a new meal plan and it's being set as active
         if not self.pk and self.is_active:
@@ -190,6 +203,10 @@ class MealType(models.Model):
 
 class Meal(models.Model):
     meal_plan = models.ForeignKey(MealPlan, on_delete=models.CASCADE, related_name='meals')
+    # Set on the sample meals that belong to a template (shown by MealPlanTemplateSerializer)
+    template = models.ForeignKey(
+        MealPlanTemplate, on_delete=models.SET_NULL, null=True, blank=True, related_name='template_meals'
+    )
     meal_type = models.ForeignKey(MealType, on_delete=models.CASCADE)
     day_of_week = models.IntegerField(choices=[
         (0, _('Monday')),
@@ -205,20 +222,25 @@ class Meal(models.Model):
     instructions = models.TextField(blank=True)
     prep_time = models.IntegerField(blank=True, null=True, help_text="Preparation time in minutes")
     
+    # Materialized nutrition totals, kept current by meal_plans.nutrition_totals
+    total_calories = models.FloatField(default=0, editable=False)
+    total_protein = models.FloatField(default=0, editable=False)
+    total_carbs = models.FloatField(default=0, editable=False)
+    total_fat = models.FloatField(default=0, editable=False)
+    total_fiber = models.FloatField(default=0, editable=False)
+    total_sugar = models.FloatField(default=0, editable=False)
+    total_sodium = models.FloatField(default=0, editable=False)
+    
     def __str__(self):
         return f"{self.meal_plan.title} - {self.get_day_of_week_display()} - {self.meal_type.name} - {self.name}"
 
     def get_total_nutrition(self):
-        """Calculate total nutrition for this meal"""
-        total = {
-            'calories': 0,
-            'protein': 0,
-            'carbs': 0,
-            'fat': 0,
-            'fiber': 0,
-            'sugar': 0,
-            'sodium': 0,
-        }
+        """Total nutrition for this meal (stored totals, no ingredient queries)"""
+        return {key: getattr(self, f'total_{key}') for key in NUTRITION_TOTAL_KEYS}
+
+    def calculate_total_nutrition(self):
+        """Calculate total nutrition for this meal from its ingredients"""
+        total = {key: 0 for key in NUTRITION_TOTAL_KEYS}
         
         for ingredient in self.ingredients.all():
             nutrition = ingredient.food.get_nutrition_for_amount(ingredient.amount)
@@ -228,6 +250,31 @@ class Meal(models.Model):
         return total
 
 
+class MealPlanDayNutrition(models.Model):
+    """Materialized nutrition totals for one day of a meal plan"""
+    meal_plan = models.ForeignKey(MealPlan, on_delete=models.CASCADE, related_name='day_nutrition')
+    day_of_week = models.IntegerField()
+    meals_count = models.IntegerField(default=0)
+    calories = models.FloatField(default=0)
+    protein = models.FloatField(default=0)
+    carbs = models.FloatField(default=0)
+    fat = models.FloatField(default=0)
+    fiber = models.FloatField(default=0)
+    sugar = models.FloatField(default=0)
+    sodium = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['meal_plan', 'day_of_week']
+        ordering = ['day_of_week']
+
+    def __str__(self):
+        return f"{self.meal_plan.title} - day {self.day_of_week}"
+
+    def get_nutrition(self):
+        return {key: getattr(self, key) for key in NUTRITION_TOTAL_KEYS}
+
+
 class MealIngredient(models.Model):
     meal = models.ForeignKey(Meal, on_delete=models.CASCADE, related_name='ingredients')
     food = models.ForeignKey(Food, on_delete=models.CASCADE)
@@ -337,6 +384,40 @@ class PatientMealSelection(models.Model):
         # Removed 'selected_at' from unique_together to avoid constraint violations
         # when multiple meals are saved at the same time
         unique_together = ['patient', 'meal_plan', 'meal_name', 'meal_type']
+        indexes = [
+            # قراءة اختيارات المريض الأحدث أولاً مع التصفية حسب التاريخ
+            models.Index(fields=['patient', '-selected_at'], name='selection_patient_recent_idx'),
+        ]
     
     def __str__(self):
-        return f"{self.patient.username} - {self.meal_name} ({self.meal_type})"
\ No newline at end of file
+        return f"{self.patient.username} - {self.meal_name} ({self.meal_type})"
+
+class MealPlanChange(models.Model):
+    """تغيير على خطة وجبات في سجل تغييرات المستخدم (المعرف هو رقم الإصدار)"""
+    KIND_CHOICES = [
+        ('plan', 'Meal plan'),
+        ('meal', 'Meals'),
+        ('ingredient', 'Meal ingredients'),
+        ('selection', 'Patient selections'),
+    ]
+    ACTION_CHOICES = [
+        ('saved', 'Saved'),
+        ('deleted', 'Deleted'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='meal_plan_changes')
+    # بدون مفتاح أجنبي: يبقى التغيير بعد حذف الخطة
+    meal_plan_id = models.BigIntegerField()
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES, default='saved')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # آخر إصدار للمستخدم والتغييرات بعد إصدار معين
+            models.Index(fields=['user', 'id'], name='plan_change_user_version_idx'),
+            models.Index(fields=['created_at'], name='plan_change_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} v{self.id} - {self.kind} {self.action} ({self.meal_plan_id})"
@@ -0,0 +1,190 @@
+"""
+مصفوفة القيم الغذائية
+Nutrient matrix engine
+
+An in-memory, array-backed table of the food catalogue: one row per food,
+one column per nutrient (values per 100g). Nutrition for a whole meal, recipe
+or plan is computed as one batch of (food, amount) lines against this table
+instead of reading ``*_per_100g`` attributes ingredient by ingredient.
+
+The project has no numpy dependency, so "batch" here means the per-line work
+is pushed into C-level builtins (slicing, ``zip``, ``map``) column by column
+rather than a vectorised multiply: it still performs one scalar multiply and
+one ``round`` per line and nutrient, which keeps the results identical to the
+per-food calculation.
+"""
+
+import threading
+from array import array
+from itertools import repeat
+from operator import mul
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .food_catalogue import get_food_catalogue
+from .models import MICRONUTRIENT_KEYS, NUTRITION_TOTAL_KEYS, Food
+
+
+NUTRIENT_FIELDS = [
+    'calories', 'protein', 'carbs', 'fat', 'fiber',
+    'sugar', 'sodium', 'vitamin_a', 'vitamin_c', 'vitamin_d',
+    'calcium', 'iron'
+]
+
+
+CATALOGUE_FIELDS = NUTRITION_TOTAL_KEYS + MICRONUTRIENT_KEYS
+
+
+def _source_column(field: str) -> Optional[str]:
+    """اسم عمود Food المقابل للقيمة الغذائية (أو None إذا لم يكن موجوداً)"""
+    # Macros live in ``<field>_per_100g``; vitamins and minerals are also per
+    # 100g but their columns carry no suffix (``vitamin_a``, ``iron``...).
+    for column in (f'{field}_per_100g', field):
+        try:
+            Food._meta.get_field(column)
+        except Exception:
+            continue
+        return column
+    return None
+
+
+NUTRIENT_COLUMNS = {field: _source_column(field) for field in NUTRIENT_FIELDS}
+
+
+class NutrientMatrix:
+    """جدول القيم الغذائية لكل 100 جرام (صف لكل طعام، عمود لكل قيمة)"""
+
+    def __init__(self, fields: Sequence[str] = NUTRIENT_FIELDS):
+        self.fields = list(fields)
+        self.width = len(self.fields)
+        self.columns = [_source_column(field) for field in self.fields]
+        self.index: Dict[int, int] = {}
+        self.inactive = set()
+        self.data = array('d')
+        self.stamp = None
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, food_id):
+        return food_id in self.index
+
+    def is_active(self, food_id) -> bool:
+        return food_id in self.index and food_id not in self.inactive
+
+    def _append_rows(self, rows: Iterable[Tuple]):
+        """إضافة صفوف (المعرف، نشط، القيم...) من قاعدة البيانات"""
+        source = [column for column in self.columns if column]
+        for row in rows:
+            food_id, is_active, values = row[0], row[1], dict(zip(source, row[2:]))
+            self.index[food_id] = len(self.index)
+            self.data.extend(
+                float(values[column] or 0) if column else 0.0
+                for column in self.columns
+            )
+            if not is_active:
+                self.inactive.add(food_id)
+
+    def copy(self) -> 'NutrientMatrix':
+        matrix = NutrientMatrix(self.fields)
+        matrix.index = dict(self.index)
+        matrix.inactive = set(self.inactive)
+        matrix.data = array('d', self.data)
+        matrix.stamp = self.stamp
+        return matrix
+
+    @classmethod
+    def from_catalogue(cls, catalogue, fields: Sequence[str] = NUTRIENT_FIELDS):
+        """بناء الجدول من كتالوج الأطعمة في الذاكرة (بدون استعلامات)"""
+        matrix = cls(fields)
+        positions = [
+            CATALOGUE_FIELDS.index(field) if column and field in CATALOGUE_FIELDS else None
+            for field, column in zip(matrix.fields, matrix.columns)
+        ]
+        for record in catalogue.records.values():
+            values = record.per_100g + record.micronutrients
+            matrix.index[record.id] = len(matrix.index)
+            matrix.data.extend(
+                float(values[position] or 0) if position is not None and position < len(values) else 0.0
+                for position in positions
+            )
+            if not record.is_active:
+                matrix.inactive.add(record.id)
+        matrix.stamp = catalogue.generation
+        return matrix
+
+    def with_rows(self, food_ids: Iterable[int]) -> 'NutrientMatrix':
+        """
+        الجدول نفسه إذا كانت كل الأطعمة موجودة، وإلا نسخة تضم الصفوف الناقصة
+
+        Foods created since the catalogue was loaded are read into a copy:
+        the shared matrix is never changed while other threads compute with it.
+        """
+        missing = {food_id for food_id in food_ids if food_id not in self.index}
+        if not missing:
+            return self
+        source = [column for column in self.columns if column]
+        matrix = self.copy()
+        matrix._append_rows(
+            Food.objects.filter(id__in=missing).order_by('id').values_list('id', 'is_active', *source)
+        )
+        return matrix
+
+    def row(self, food_id: int) -> List[float]:
+        """القيم الغذائية لكل 100 جرام لطعام واحد"""
+        offset = self.index[food_id] * self.width
+        return list(self.data[offset:offset + self.width])
+
+    def compute(self, lines: Sequence[Tuple[int, float]], precision: int = 2) -> Tuple[List[Dict[str, float]], Dict[str, float]]:
+        """
+        حساب القيم الغذائية لمجموعة من السطور (طعام، كمية بالجرام) دفعة واحدة
+
+        Each line is scaled by ``amount / 100`` and rounded to ``precision``;
+        the totals are the rounded sum of the rounded lines, matching the
+        calculator's historical results. The rows of the batch are sliced out
+        of the table once and transposed, then every nutrient column is
+        multiplied and rounded with ``map`` over all lines at once.
+        """
+        if not lines:
+            return [], {field: 0.0 for field in self.fields}
+
+        width, data, index = self.width, self.data, self.index
+        factors = [amount / 100.0 for _, amount in lines]
+        rows = (data[offset:offset + width] for offset in [index[food_id] * width for food_id, _ in lines])
+        columns = [
+            list(map(round, map(mul, column, factors), repeat(precision)))
+            for column in zip(*rows)
+        ]
+
+        per_line = [dict(zip(self.fields, values)) for values in zip(*columns)]
+        return per_line, {field: round(sum(column), precision) for field, column in zip(self.fields, columns)}
+
+    def compute_groups(self, groups: Sequence[Sequence[Tuple[int, float]]], precision: int = 2):
+        """حساب عدة مجموعات (مثل وجبات خطة كاملة) في تمريرة واحدة"""
+        matrix = self.with_rows(food_id for lines in groups for food_id, _ in lines)
+        if matrix is not self:
+            _replace_matrix(self, matrix)
+        return [matrix.compute(lines, precision) for lines in groups]
+
+
+_lock = threading.Lock()
+_matrix: Optional[NutrientMatrix] = None
+
+
+def _replace_matrix(current: NutrientMatrix, matrix: NutrientMatrix) -> None:
+    """استبدال الجدول المشترك بالنسخة الموسعة (إذا لم يستبدل بجدول أحدث)"""
+    global _matrix
+    with _lock:
+        if _matrix is current:
+            _matrix = matrix
+
+
+def get_nutrient_matrix() -> NutrientMatrix:
+    """الحصول على جدول القيم الغذائية، مع إعادة بنائه فقط عند تغيّر كتالوج الأطعمة"""
+    global _matrix
+    catalogue = get_food_catalogue()
+    matrix = _matrix
+    if matrix is None or matrix.stamp != catalogue.generation:
+        matrix = NutrientMatrix.from_catalogue(catalogue)
+        with _lock:
+            _matrix = matrix
+    return matrix
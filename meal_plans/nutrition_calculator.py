@@ -4,20 +4,19 @@ Iraqi Advanced Nutrition Calculator
 """
 
 from decimal import Decimal, ROUND_HALF_UP
-from typing import Dict, List, Any, Optional
-from django.db.models import Q
+from typing import Dict, List, Any, Optional, Tuple, Union
 from .models import Food, Meal, Recipe, MealPlan, MealIngredient, RecipeIngredient
+from .food_catalogue import FoodRecord, get_food_catalogue
+from .food_search import order_by_ids, search_food_ids
+from .nutrient_matrix import NUTRIENT_COLUMNS, NUTRIENT_FIELDS, get_nutrient_matrix
+from .plan_graph import PlanGraph, load_plan_graph
 
 
 class IraqiNutritionCalculator:
     """حاسبة القيم الغذائية العراقية المتقدمة"""
     
     def __init__(self):
-        self.nutrition_fields = [
-            'calories', 'protein', 'carbs', 'fat', 'fiber', 
-            'sugar', 'sodium', 'vitamin_a', 'vitamin_c', 'vitamin_d', 
-            'calcium', 'iron'
-        ]
+        self.nutrition_fields = list(NUTRIENT_FIELDS)
         
         # أسماء القيم الغذائية بالعربية العراقية
         self.arabic_names = {
@@ -57,41 +56,28 @@ class IraqiNutritionCalculator:
         
         nutrition = {}
         for field in self.nutrition_fields:
-            value = getattr(food, f'{field}_per_100g', 0) * factor
+            column = NUTRIENT_COLUMNS.get(field)
+            value = ((getattr(food, column) or 0) if column else 0) * factor
             nutrition[field] = round(float(value), 2)
         
         return nutrition
 
     def calculate_meal_nutrition(self, meal: Meal) -> Dict[str, Any]:
         """حساب القيم الغذائية لوجبة كاملة"""
-        total_nutrition = {field: 0.0 for field in self.nutrition_fields}
-        ingredients_detail = []
-        
-        for ingredient in meal.ingredients.all():
-            ingredient_nutrition = self.calculate_food_nutrition(
-                ingredient.food, 
-                ingredient.amount
-            )
-            
-            # إضافة للقيم الإجمالية
-            for field in self.nutrition_fields:
-                total_nutrition[field] += ingredient_nutrition[field]
-            
-            # تفاصيل المكون
-            ingredients_detail.append({
-                'food_name': ingredient.food.name_ar or ingredient.food.name,
-                'food_name_en': ingredient.food.name,
-                'amount_grams': ingredient.amount,
-                'amount_description': f"{ingredient.amount} جرام",
-                'notes': ingredient.notes,
-                'nutrition': ingredient_nutrition,
-                'nutrition_arabic': self._format_nutrition_arabic(ingredient_nutrition)
-            })
-        
-        # تقريب القيم
-        for field in self.nutrition_fields:
-            total_nutrition[field] = round(total_nutrition[field], 2)
-        
+        ingredients = list(meal.ingredients.all())
+        (lines, total_nutrition), = get_nutrient_matrix().compute_groups([
+            [(ingredient.food_id, ingredient.amount) for ingredient in ingredients]
+        ])
+        return self._build_meal_nutrition(meal, ingredients, lines, total_nutrition)
+
+    def _build_meal_nutrition(self, meal: Meal, ingredients: List[MealIngredient],
+                              lines: List[Dict[str, float]], total_nutrition: Dict[str, float]) -> Dict[str, Any]:
+        """تجميع نتيجة الوجبة من القيم المحسوبة في جدول القيم الغذائية"""
+        ingredients_detail = [
+            self._ingredient_detail(ingredient, ingredient_nutrition)
+            for ingredient, ingredient_nutrition in zip(ingredients, lines)
+        ]
+
         return {
             'meal_name': meal.name,
             'meal_description': meal.description,
@@ -103,35 +89,28 @@ class IraqiNutritionCalculator:
             'instructions': meal.instructions
         }
 
+    def _ingredient_detail(self, ingredient, ingredient_nutrition: Dict[str, float]) -> Dict[str, Any]:
+        """تفاصيل المكون"""
+        return {
+            'food_name': ingredient.food.name_ar or ingredient.food.name,
+            'food_name_en': ingredient.food.name,
+            'amount_grams': ingredient.amount,
+            'amount_description': f"{ingredient.amount} جرام",
+            'notes': ingredient.notes,
+            'nutrition': ingredient_nutrition,
+            'nutrition_arabic': self._format_nutrition_arabic(ingredient_nutrition)
+        }
+
     def calculate_recipe_nutrition(self, recipe: Recipe) -> Dict[str, Any]:
         """حساب القيم الغذائية لوصفة كاملة"""
-        total_nutrition = {field: 0.0 for field in self.nutrition_fields}
-        ingredients_detail = []
-        
-        for ingredient in recipe.ingredients.all():
-            ingredient_nutrition = self.calculate_food_nutrition(
-                ingredient.food, 
-                ingredient.amount
-            )
-            
-            # إضافة للقيم الإجمالية
-            for field in self.nutrition_fields:
-                total_nutrition[field] += ingredient_nutrition[field]
-            
-            # تفاصيل المكون
-            ingredients_detail.append({
-                'food_name': ingredient.food.name_ar or ingredient.food.name,
-                'food_name_en': ingredient.food.name,
-                'amount_grams': ingredient.amount,
-                'amount_description': f"{ingredient.amount} جرام",
-                'notes': ingredient.notes,
-                'nutrition': ingredient_nutrition,
-                'nutrition_arabic': self._format_nutrition_arabic(ingredient_nutrition)
-            })
-        
-        # تقريب القيم
-        for field in self.nutrition_fields:
-            total_nutrition[field] = round(total_nutrition[field], 2)
+        ingredients = list(recipe.ingredients.all())
+        (lines, total_nutrition), = get_nutrient_matrix().compute_groups([
+            [(ingredient.food_id, ingredient.amount) for ingredient in ingredients]
+        ])
+        ingredients_detail = [
+            self._ingredient_detail(ingredient, ingredient_nutrition)
+            for ingredient, ingredient_nutrition in zip(ingredients, lines)
+        ]
         
         # حساب القيم لكل حصة
         servings = recipe.servings or 1
@@ -157,13 +136,24 @@ class IraqiNutritionCalculator:
             'instructions': recipe.instructions
         }
 
-    def calculate_daily_plan_nutrition(self, meal_plan: MealPlan) -> Dict[str, Any]:
+    def calculate_daily_plan_nutrition(self, meal_plan: Union[MealPlan, PlanGraph]) -> Dict[str, Any]:
         """حساب القيم الغذائية للخطة اليومية الكاملة"""
+        graph = meal_plan if isinstance(meal_plan, PlanGraph) else load_plan_graph(meal_plan)
+        meal_plan = graph.plan
+        meals = graph.meals
+        meal_ingredients = [graph.ingredients_for(meal) for meal in meals]
+        
+        # حساب جميع وجبات الخطة دفعة واحدة
+        results = get_nutrient_matrix().compute_groups([
+            [(ingredient.food_id, ingredient.amount) for ingredient in ingredients]
+            for ingredients in meal_ingredients
+        ])
+        
         total_nutrition = {field: 0.0 for field in self.nutrition_fields}
         meals_detail = []
         
-        for meal in meal_plan.meals.all():
-            meal_nutrition = self.calculate_meal_nutrition(meal)
+        for meal, ingredients, (lines, meal_total) in zip(meals, meal_ingredients, results):
+            meal_nutrition = self._build_meal_nutrition(meal, ingredients, lines, meal_total)
             
             # إضافة للقيم الإجمالية
             for field in self.nutrition_fields:
@@ -202,43 +192,39 @@ class IraqiNutritionCalculator:
 
     def calculate_custom_nutrition(self, foods_data: List[Dict[str, Any]]) -> Dict[str, Any]:
         """حساب القيم الغذائية لقائمة مخصصة من الأطعمة"""
-        total_nutrition = {field: 0.0 for field in self.nutrition_fields}
-        foods_detail = []
+        foods = []
+        lines = []
+        known_foods, unknown_food_ids = load_foods_by_id(item.get('food_id') for item in foods_data)
         
         for item in foods_data:
-            food_id = item.get('food_id')
             amount = float(item.get('amount', 0))
-            
-            try:
-                food = Food.objects.get(id=food_id, is_active=True)
-                food_nutrition = self.calculate_food_nutrition(food, amount)
-                
-                # إضافة للقيم الإجمالية
-                for field in self.nutrition_fields:
-                    total_nutrition[field] += food_nutrition[field]
-                
-                foods_detail.append({
-                    'food_name': food.name_ar or food.name,
-                    'food_name_en': food.name,
-                    'food_category': food.category.name_ar or food.category.name,
-                    'amount_grams': amount,
-                    'amount_description': f"{amount} جرام",
-                    'nutrition': food_nutrition,
-                    'nutrition_arabic': self._format_nutrition_arabic(food_nutrition)
-                })
-                
-            except Food.DoesNotExist:
+            food = known_foods.get(normalize_food_id(item.get('food_id')))
+            if food is None:
                 continue
+            
+            foods.append((food, amount))
+            lines.append((food.id, amount))
         
-        # تقريب القيم
-        for field in self.nutrition_fields:
-            total_nutrition[field] = round(total_nutrition[field], 2)
+        (foods_nutrition, total_nutrition), = get_nutrient_matrix().compute_groups([lines])
+        
+        foods_detail = []
+        for (food, amount), food_nutrition in zip(foods, foods_nutrition):
+            foods_detail.append({
+                'food_name': food.name_ar or food.name,
+                'food_name_en': food.name,
+                'food_category': food.category.name_ar or food.category.name,
+                'amount_grams': amount,
+                'amount_description': f"{amount} جرام",
+                'nutrition': food_nutrition,
+                'nutrition_arabic': self._format_nutrition_arabic(food_nutrition)
+            })
         
         return {
             'total_nutrition': total_nutrition,
             'total_nutrition_arabic': self._format_nutrition_arabic(total_nutrition),
             'foods_count': len(foods_detail),
-            'foods_detail': foods_detail
+            'foods_detail': foods_detail,
+            'unknown_food_ids': unknown_food_ids
         }
 
     def _format_nutrition_arabic(self, nutrition: Dict[str, float]) -> Dict[str, str]:
@@ -314,12 +300,8 @@ class IraqiNutritionCalculator:
         return " | ".join(summary_parts)
 
     def search_iraqi_foods(self, query: str) -> List[Food]:
-        """البحث عن الأطعمة العراقية"""
-        return Food.objects.filter(
-            Q(name_ar__icontains=query) | 
-            Q(name__icontains=query) |
-            Q(description__icontains=query)
-        ).filter(is_active=True)
+        """البحث عن الأطعمة العراقية (مرتبة حسب الأهمية عبر فهرس البحث)"""
+        return order_by_ids(Food.objects.filter(is_active=True).select_related('category'), search_food_ids(query))
 
     def get_food_suggestions(self, category: str = None) -> List[Food]:
         """اقتراحات الأطعمة العراقية"""
@@ -332,6 +314,87 @@ class IraqiNutritionCalculator:
 
 
 # دالة مساعدة للاستخدام في الـ views
+def normalize_food_id(food_id) -> Optional[int]:
+    """تحويل معرف الطعام القادم من الطلب إلى رقم (أو None إذا كان غير صالح)"""
+    try:
+        return int(food_id)
+    except (TypeError, ValueError):
+        return None
+
+
+def load_foods_by_id(food_ids) -> Tuple[Dict[int, FoodRecord], List[Any]]:
+    """
+    جلب الأطعمة النشطة لقائمة معرفات من كتالوج الأطعمة (مع الفئة)
+
+    Duplicate ids are looked up once. Returns the food records keyed by id and
+    the requested ids (as sent, in order, without duplicates) that do not
+    match an active food.
+    """
+    catalogue = get_food_catalogue()
+    requested = _unique_food_ids(food_ids)
+    foods = {}
+    for _, normalized in requested:
+        record = catalogue.get(normalized)
+        if record is not None and record.is_active:
+            foods[normalized] = record
+    unknown = [food_id for food_id, normalized in requested if normalized not in foods]
+    return foods, unknown
+
+
+def _unique_food_ids(food_ids) -> List[Tuple[Any, Optional[int]]]:
+    """المعرفات بدون تكرار مع قيمتها الرقمية: [(المعرف كما أُرسل، الرقم أو None)]"""
+    requested = {}
+    for food_id in food_ids:
+        normalized = normalize_food_id(food_id)
+        requested.setdefault(normalized if normalized is not None else repr(food_id), (food_id, normalized))
+    return list(requested.values())
+
+
+def calculate_food_list_totals(foods_list: List[Dict[str, Any]], foods: Dict[int, FoodRecord]):
+    """
+    حساب مجموع القيم الغذائية لقائمة أطعمة (بنفس طريقة Food.get_nutrition_for_amount)
+
+    ``foods`` comes from ``load_foods_by_id``; items whose food is missing are
+    skipped. Returns the totals, the per-item detail and the unknown ids.
+    """
+    total_nutrition = {
+        'calories': 0,
+        'protein': 0,
+        'carbs': 0,
+        'fat': 0,
+        'fiber': 0,
+        'sugar': 0,
+        'sodium': 0,
+    }
+    detailed_nutrition = []
+    
+    for item in foods_list:
+        food_id = item.get('food_id')
+        amount = float(item.get('amount', 0))
+        
+        food = foods.get(normalize_food_id(food_id))
+        if food is None:
+            continue
+        
+        nutrition = food.get_nutrition_for_amount(amount)
+        
+        detailed_nutrition.append({
+            'food_id': food_id,
+            'food_name': food.name,
+            'amount': amount,
+            'nutrition': nutrition
+        })
+        
+        for key in total_nutrition:
+            total_nutrition[key] += nutrition.get(key, 0)
+    
+    unknown_food_ids = [
+        food_id for food_id, normalized in _unique_food_ids(item.get('food_id') for item in foods_list)
+        if normalized not in foods
+    ]
+    return total_nutrition, detailed_nutrition, unknown_food_ids
+
+
 def calculate_meal_nutrition_iraqi(meal_id: int) -> Dict[str, Any]:
     """حساب القيم الغذائية لوجبة بالطريقة العراقية"""
     try:
@@ -355,8 +418,8 @@ def calculate_recipe_nutrition_iraqi(recipe_id: int) -> Dict[str, Any]:
 def calculate_daily_plan_nutrition_iraqi(meal_plan_id: int) -> Dict[str, Any]:
     """حساب القيم الغذائية للخطة اليومية بالطريقة العراقية"""
     try:
-        meal_plan = MealPlan.objects.get(id=meal_plan_id)
+        graph = load_plan_graph(meal_plan_id)
         calculator = IraqiNutritionCalculator()
-        return calculator.calculate_daily_plan_nutrition(meal_plan)
+        return calculator.calculate_daily_plan_nutrition(graph)
     except MealPlan.DoesNotExist:
         return {'error': 'خطة الوجبات غير موجودة'}
@@ -0,0 +1,160 @@
+"""
+القيم الغذائية المخزنة للوجبات والخطط
+Materialized meal and plan nutrition totals
+
+``Meal.total_*`` holds the sum of a meal's ingredients and
+``MealPlanDayNutrition`` rolls those up per day of a plan, so reads never
+re-sum ingredient rows. The signal handlers in ``meal_plans.signals`` call
+the refresh functions below whenever ingredients, meals or a food's per-100g
+values change; code that writes with ``bulk_create``/``update`` (which send
+no signals) must call them itself.
+"""
+
+from typing import Dict, Iterable, Optional
+
+from django.db import transaction
+
+from .models import (
+    NUTRITION_TOTAL_KEYS, Meal, MealIngredient, MealPlan, MealPlanDayNutrition
+)
+
+
+MEAL_TOTAL_FIELDS = [f'total_{key}' for key in NUTRITION_TOTAL_KEYS]
+FOOD_NUTRITION_FIELDS = [f'{key}_per_100g' for key in NUTRITION_TOTAL_KEYS]
+
+
+def compute_meal_totals(meal_ids: Iterable[int]) -> Dict[int, Dict[str, float]]:
+    """حساب القيم الغذائية لعدة وجبات من مكوناتها باستعلام واحد"""
+    totals = {meal_id: {key: 0 for key in NUTRITION_TOTAL_KEYS} for meal_id in meal_ids}
+    if not totals:
+        return totals
+
+    rows = MealIngredient.objects.filter(meal_id__in=totals.keys()).order_by('id').values_list(
+        'meal_id', 'amount', *[f'food__{field}' for field in FOOD_NUTRITION_FIELDS]
+    )
+    # Same arithmetic as Food.get_nutrition_for_amount
+    for meal_id, amount, *per_100g in rows:
+        factor = amount / 100
+        meal_total = totals[meal_id]
+        for key, value in zip(NUTRITION_TOTAL_KEYS, per_100g):
+            meal_total[key] += value * factor
+
+    return totals
+
+
+@transaction.atomic
+def refresh_meal_totals(meal_ids: Iterable[int]):
+    """تحديث القيم المخزنة لعدة وجبات ثم تحديث أيام الخطط التابعة لها"""
+    meals = list(Meal.objects.filter(id__in=set(meal_ids)).only('id', 'meal_plan_id', 'day_of_week'))
+    if not meals:
+        return
+
+    totals = compute_meal_totals(meal.id for meal in meals)
+    days_by_plan = {}
+    for meal in meals:
+        for key in NUTRITION_TOTAL_KEYS:
+            setattr(meal, f'total_{key}', totals[meal.id][key])
+        days_by_plan.setdefault(meal.meal_plan_id, set()).add(meal.day_of_week)
+
+    Meal.objects.bulk_update(meals, MEAL_TOTAL_FIELDS)
+
+    for plan_id, days in days_by_plan.items():
+        refresh_plan_totals(plan_id, days)
+
+
+@transaction.atomic
+def refresh_plan_totals(plan_id: int, days: Optional[Iterable[int]] = None):
+    """
+    إعادة بناء المجاميع اليومية لخطة وجبات من القيم المخزنة للوجبات
+
+    Only the given days are rebuilt when ``days`` is passed; days left without
+    meals lose their rollup row.
+    """
+    if not MealPlan.objects.filter(id=plan_id).exists():
+        return
+
+    meals = Meal.objects.filter(meal_plan_id=plan_id)
+    existing = MealPlanDayNutrition.objects.filter(meal_plan_id=plan_id)
+    if days is not None:
+        days = set(days)
+        meals = meals.filter(day_of_week__in=days)
+        existing = existing.filter(day_of_week__in=days)
+
+    rollup = {}
+    for day, *values in meals.order_by('id').values_list('day_of_week', *MEAL_TOTAL_FIELDS):
+        day_total = rollup.setdefault(day, dict({key: 0 for key in NUTRITION_TOTAL_KEYS}, meals_count=0))
+        day_total['meals_count'] += 1
+        for key, value in zip(NUTRITION_TOTAL_KEYS, values):
+            day_total[key] += value
+
+    existing = {row.day_of_week: row for row in existing}
+    to_create, to_update = [], []
+    for day, values in rollup.items():
+        row = existing.pop(day, None)
+        if row is None:
+            to_create.append(MealPlanDayNutrition(meal_plan_id=plan_id, day_of_week=day, **values))
+            continue
+        for key, value in values.items():
+            setattr(row, key, value)
+        to_update.append(row)
+
+    if to_create:
+        MealPlanDayNutrition.objects.bulk_create(to_create)
+    if to_update:
+        MealPlanDayNutrition.objects.bulk_update(to_update, ['meals_count', *NUTRITION_TOTAL_KEYS])
+    if existing:
+        MealPlanDayNutrition.objects.filter(id__in=[row.id for row in existing.values()]).delete()
+
+
+def refresh_food_totals(food_id: int):
+    """تحديث جميع الوجبات التي تستخدم طعاماً تغيرت قيمه الغذائية"""
+    meal_ids = set(MealIngredient.objects.filter(food_id=food_id).values_list('meal_id', flat=True))
+    if meal_ids:
+        refresh_meal_totals(meal_ids)
+
+
+def rebuild_all_totals(plan_ids: Optional[Iterable[int]] = None):
+    """إعادة بناء جميع القيم المخزنة (للأمر rebuild_nutrition_totals)"""
+    plans = MealPlan.objects.all()
+    if plan_ids is not None:
+        plans = plans.filter(id__in=plan_ids)
+
+    for plan_id in plans.values_list('id', flat=True).iterator():
+        meal_ids = list(Meal.objects.filter(meal_plan_id=plan_id).values_list('id', flat=True))
+        if meal_ids:
+            refresh_meal_totals(meal_ids)
+        refresh_plan_totals(plan_id)
+
+
+def find_stale_totals(plan_ids: Optional[Iterable[int]] = None, tolerance: float = 0.01):
+    """مقارنة القيم المخزنة بالقيم المحسوبة من المكونات وإرجاع الاختلافات"""
+    meals = Meal.objects.all()
+    if plan_ids is not None:
+        meals = meals.filter(meal_plan_id__in=plan_ids)
+
+    stale = []
+    stored = {row[0]: row[1:] for row in meals.values_list('id', 'meal_plan_id', 'day_of_week', *MEAL_TOTAL_FIELDS)}
+    computed = compute_meal_totals(stored.keys())
+    expected_days = {}
+    for meal_id, (plan_id, day, *values) in stored.items():
+        day_total = expected_days.setdefault((plan_id, day), {key: 0 for key in NUTRITION_TOTAL_KEYS})
+        for key, value in zip(NUTRITION_TOTAL_KEYS, values):
+            day_total[key] += value
+            if abs(value - computed[meal_id][key]) > tolerance:
+                stale.append(('meal', meal_id, key, value, computed[meal_id][key]))
+
+    days = MealPlanDayNutrition.objects.all()
+    if plan_ids is not None:
+        days = days.filter(meal_plan_id__in=plan_ids)
+    for row in days:
+        expected = expected_days.pop((row.meal_plan_id, row.day_of_week), None)
+        if expected is None:
+            stale.append(('day', row.id, 'meals_count', row.meals_count, 0))
+            continue
+        for key in NUTRITION_TOTAL_KEYS:
+            if abs(getattr(row, key) - expected[key]) > tolerance:
+                stale.append(('day', row.id, key, getattr(row, key), expected[key]))
+    for (plan_id, day) in expected_days:
+        stale.append(('day', f'{plan_id}/{day}', 'missing', None, None))
+
+    return stale
@@ -0,0 +1,124 @@
+"""
+قراءة اختيارات وجبات المريض
+Read path for patient meal selections
+
+``PatientMealSelection`` rows are already unique per (patient, meal plan,
+meal name, meal type) and store their nutrition totals when they are saved,
+so the read path is a plain filtered query on
+``(patient, selected_at)``: date filters become a range on the indexed
+``selected_at`` column, pagination happens in the database, and each row is
+returned as stored. Nothing here adjusts or writes anything.
+"""
+
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import MealPlan, PatientMealSelection
+from .plan_graph import meals_prefetch
+
+
+def parse_day(value: Optional[str]) -> Optional[date]:
+    """تاريخ بصيغة YYYY-MM-DD (أو None إذا كان غير صالح)"""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+
+def day_bounds(day: date) -> Tuple[datetime, datetime]:
+    """بداية اليوم ونهايته في المنطقة الزمنية الحالية (نفس نطاق selected_at__date)"""
+    start = datetime.combine(day, time.min)
+    if settings.USE_TZ:
+        start = timezone.make_aware(start)
+    return start, start + timedelta(days=1)
+
+
+def patient_selections(patient_id, meal_plan_id: Optional[int] = None, day: Optional[date] = None):
+    """QuerySet لاختيارات المريض (الأحدث أولاً)"""
+    selections = PatientMealSelection.objects.filter(patient_id=patient_id)
+    if meal_plan_id is not None:
+        selections = selections.filter(meal_plan_id=meal_plan_id)
+    if day is not None:
+        start, end = day_bounds(day)
+        selections = selections.filter(selected_at__gte=start, selected_at__lt=end)
+    return selections.order_by('-selected_at', '-id')
+
+
+def selections_total_calories(selections) -> float:
+    """مجموع السعرات المحفوظة للاختيارات (استعلام واحد)"""
+    return round(selections.aggregate(total=Sum('calories'))['total'] or 0, 1)
+
+
+def selection_entry(selection: PatientMealSelection) -> Dict:
+    """اختيار واحد بصيغة الاستجابة (القيم الغذائية كما حُفظت)"""
+    return {
+        'id': selection.id,
+        'meal_name': selection.meal_name,
+        'meal_type': selection.meal_type,
+        'selected_at': selection.selected_at.isoformat(),
+        'calories': selection.calories,
+        'nutrition_info': {
+            'calories': selection.calories,
+            'protein': selection.protein,
+            'carbs': selection.carbs,
+            'fat': selection.fat
+        },
+        'ingredients': selection.ingredients or [],
+        'notes': selection.notes,
+        'is_confirmed': selection.is_confirmed
+    }
+
+
+def _plan_ingredient_entry(ingredient) -> Dict:
+    food = ingredient.food
+    amount = ingredient.amount or 0
+    entry = {
+        'food_id': food.id,
+        'food_name_ar': food.name_ar or food.name or 'Unknown',
+        'food_name': food.name or 'Unknown',
+        'amount': amount,
+        'unit': 'g',  # Default unit is grams
+    }
+    for key in ('calories', 'protein', 'carbs', 'fat'):
+        per_100g = getattr(food, f'{key}_per_100g') or 0
+        entry[f'{key}_per_100g'] = per_100g
+        entry[key] = round(per_100g * amount / 100, 1)
+    entry['notes'] = ingredient.notes or ''
+    return entry
+
+
+def plan_meal_entries(patient_id, day: Optional[date] = None) -> List[Dict]:
+    """وجبات خطط المريض النشطة بصيغة الاختيارات (عدد ثابت من الاستعلامات)"""
+    plans = MealPlan.objects.filter(patient_id=patient_id, is_active=True)
+    if day is not None:
+        plans = plans.filter(start_date__lte=day, end_date__gte=day)
+
+    entries = []
+    for meal_plan in plans.prefetch_related(meals_prefetch()):
+        for meal in meal_plan.meals.all():
+            ingredients = [_plan_ingredient_entry(ingredient) for ingredient in meal.ingredients.all()]
+            # المجموع من القيم المدورة للمكونات ليطابق ما يعرض
+            totals = {
+                key: round(sum(ingredient[key] for ingredient in ingredients), 1)
+                for key in ('calories', 'protein', 'carbs', 'fat')
+            }
+            entries.append({
+                'id': f"meal_{meal.id}",
+                'meal_name': meal.name or 'Unknown Meal',
+                'meal_type': meal.meal_type.name if meal.meal_type else 'unknown',
+                'selected_at': meal_plan.created_at.isoformat(),
+                'calories': totals['calories'],
+                'nutrition_info': totals,
+                'ingredients': ingredients,
+                'notes': meal.description or '',
+                'is_confirmed': True,
+                'is_doctor_selected': True,
+                'meal_plan_title': meal_plan.title or 'Unknown Plan'
+            })
+    return entries
@@ -0,0 +1,107 @@
+"""
+تحميل خطة الوجبات كاملة
+Plan graph loading
+
+Fetches a meal plan together with its meals, meal types, ingredients and
+foods in a fixed number of queries, whatever the size of the plan, and hands
+them back as a read-only graph. Model instances in the graph carry Django's
+prefetch caches, so serializers and ``meal.ingredients.all()`` read from
+memory instead of going back to the database.
+"""
+
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Mapping, Tuple, Union
+
+from django.db.models import Prefetch, prefetch_related_objects
+
+from .models import Food, Meal, MealIngredient, MealPlan, MealPlanTemplate, MealType
+
+
+PLAN_RELATED_FIELDS = ('patient', 'doctor', 'template')
+
+
+def meals_with_ingredients(queryset=None):
+    """QuerySet للوجبات مع نوع الوجبة والمكونات والأطعمة (استعلامان)"""
+    if queryset is None:
+        queryset = Meal.objects.all()
+    return queryset.select_related('meal_type').prefetch_related(
+        Prefetch('ingredients', queryset=MealIngredient.objects.select_related('food'))
+    )
+
+
+def meals_prefetch(lookup: str = 'meals') -> Prefetch:
+    """Prefetch للوجبات مع نوع الوجبة والمكونات والأطعمة (استعلامان)"""
+    return Prefetch(lookup, queryset=meals_with_ingredients())
+
+
+def with_plan_graph(queryset=None):
+    """
+    QuerySet لخطط الوجبات مع كل ما يحتاجه MealPlanSerializer
+
+    The plan rows with patient, doctor and template, plus one query each for
+    meals, ingredients and per-day totals, however many plans are listed.
+    """
+    if queryset is None:
+        queryset = MealPlan.objects.all()
+    return queryset.select_related(*PLAN_RELATED_FIELDS).prefetch_related(meals_prefetch(), 'day_nutrition')
+
+
+def with_template_meals(queryset=None):
+    """QuerySet لقوالب الوجبات مع وجباتها ومكوناتها وأطعمتها (ثلاثة استعلامات إضافية)"""
+    if queryset is None:
+        queryset = MealPlanTemplate.objects.all()
+    return queryset.select_related('created_by').prefetch_related(
+        Prefetch('template_meals', queryset=meals_with_ingredients(Meal.objects.order_by('id')))
+    )
+
+
+@dataclass(frozen=True)
+class PlanGraph:
+    """خطة وجبات محمّلة بالكامل (للقراءة فقط)"""
+    plan: MealPlan
+    meals: Tuple[Meal, ...]
+    ingredients: Mapping[int, Tuple[MealIngredient, ...]]
+    foods: Mapping[int, Food]
+    meal_types: Mapping[int, MealType]
+
+    def ingredients_for(self, meal: Meal) -> Tuple[MealIngredient, ...]:
+        """مكونات وجبة معينة"""
+        return self.ingredients.get(meal.id, ())
+
+    @property
+    def ingredients_count(self) -> int:
+        return sum(len(ingredients) for ingredients in self.ingredients.values())
+
+
+def load_plan_graph(meal_plan: Union[MealPlan, int]) -> PlanGraph:
+    """
+    تحميل خطة الوجبات مع الوجبات والمكونات والأطعمة وأنواع الوجبات
+
+    Accepts a plan id (raises ``MealPlan.DoesNotExist``) or an already loaded
+    plan. Costs at most four queries: the plan, its meals with meal types,
+    their ingredients with foods, and the plan's per-day nutrition totals.
+    """
+    if not isinstance(meal_plan, MealPlan):
+        meal_plan = MealPlan.objects.select_related(*PLAN_RELATED_FIELDS).get(id=meal_plan)
+
+    prefetch_related_objects([meal_plan], meals_prefetch(), 'day_nutrition')
+
+    meals = tuple(meal_plan.meals.all())
+    ingredients = {}
+    foods = {}
+    meal_types = {}
+    for meal in meals:
+        meal_types[meal.meal_type_id] = meal.meal_type
+        meal_ingredients = tuple(meal.ingredients.all())
+        ingredients[meal.id] = meal_ingredients
+        for ingredient in meal_ingredients:
+            foods[ingredient.food_id] = ingredient.food
+
+    return PlanGraph(
+        plan=meal_plan,
+        meals=meals,
+        ingredients=MappingProxyType(ingredients),
+        foods=MappingProxyType(foods),
+        meal_types=MappingProxyType(meal_types),
+    )
@@ -0,0 +1,175 @@
+"""
+حفظ وجبات الخطط دفعة واحدة
+Bulk meal-plan persistence
+
+Meals for a plan are described as ``MealDraft`` records, validated as a whole
+(meal types and foods resolved with one query each) and written with
+``bulk_create`` inside a single transaction: either every meal and ingredient
+is saved or nothing is. ``bulk_create`` sends no signals, so the stored
+nutrition totals are refreshed explicitly afterwards.
+"""
+
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from django.db import transaction
+
+from .change_feed import batched_changes
+from .models import Food, Meal, MealIngredient, MealType
+from .nutrition_totals import refresh_meal_totals, refresh_plan_totals
+from .signals import totals_refresh_suppressed
+
+
+DAYS_OF_WEEK = range(7)
+
+
+class PlanPayloadError(ValueError):
+    """بيانات الوجبات غير صالحة (تحتوي على جميع الأخطاء)"""
+
+    def __init__(self, errors: List[str]):
+        self.errors = errors
+        super().__init__('; '.join(errors))
+
+
+class IngredientDraft(NamedTuple):
+    food_id: int
+    amount: float
+    notes: str = ''
+
+
+class MealDraft(NamedTuple):
+    meal_type_id: int
+    day_of_week: int
+    name: str
+    description: str = ''
+    instructions: str = ''
+    prep_time: Optional[int] = None
+    ingredients: Tuple[IngredientDraft, ...] = ()
+
+
+def _as_int(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _as_float(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_selected_meals(selected_meals: Sequence[Dict]) -> List[MealDraft]:
+    """
+    التحقق من قائمة الوجبات المرسلة وتحويلها إلى MealDraft
+
+    Every meal needs ``meal_type_id``, ``day_of_week`` (0-6) and ``name``; every
+    ingredient needs an existing ``food_id`` and a non-negative ``amount``.
+    All problems are collected and raised together as ``PlanPayloadError``.
+    """
+    errors = []
+    drafts = []
+    for position, meal_data in enumerate(selected_meals, start=1):
+        if not isinstance(meal_data, dict):
+            errors.append(f'meal {position}: invalid meal')
+            continue
+        meal_type_id = _as_int(meal_data.get('meal_type_id'))
+        day_of_week = _as_int(meal_data.get('day_of_week'))
+        name = meal_data.get('name')
+        if meal_type_id is None:
+            errors.append(f'meal {position}: meal_type_id is required')
+        if day_of_week is None:
+            errors.append(f'meal {position}: day_of_week is required')
+        elif day_of_week not in DAYS_OF_WEEK:
+            errors.append(f'meal {position}: day_of_week must be between 0 and 6')
+        if not name:
+            errors.append(f'meal {position}: name is required')
+
+        ingredients = []
+        for ingredient_position, ingredient_data in enumerate(meal_data.get('ingredients') or [], start=1):
+            food_id = _as_int(ingredient_data.get('food_id')) if isinstance(ingredient_data, dict) else None
+            amount = _as_float(ingredient_data.get('amount')) if isinstance(ingredient_data, dict) else None
+            if food_id is None:
+                errors.append(f'meal {position}, ingredient {ingredient_position}: food_id is required')
+                continue
+            if amount is None or amount < 0:
+                errors.append(f'meal {position}, ingredient {ingredient_position}: invalid amount')
+                continue
+            ingredients.append(IngredientDraft(food_id, amount, ingredient_data.get('notes') or ''))
+
+        drafts.append(MealDraft(
+            meal_type_id=meal_type_id,
+            day_of_week=day_of_week,
+            name=name,
+            description=meal_data.get('description') or '',
+            instructions=meal_data.get('instructions') or '',
+            prep_time=_as_int(meal_data.get('prep_time')),
+            ingredients=tuple(ingredients),
+        ))
+
+    errors += validate_drafts(drafts)
+    if errors:
+        raise PlanPayloadError(errors)
+    return drafts
+
+
+def validate_drafts(drafts: Iterable[MealDraft]) -> List[str]:
+    """التحقق من وجود أنواع الوجبات والأطعمة المستخدمة (استعلام واحد لكل منهما)"""
+    drafts = list(drafts)
+    meal_type_ids = {draft.meal_type_id for draft in drafts if draft.meal_type_id is not None}
+    food_ids = {ingredient.food_id for draft in drafts for ingredient in draft.ingredients}
+    known_meal_types = set(MealType.objects.filter(id__in=meal_type_ids).values_list('id', flat=True))
+    known_foods = set(Food.objects.filter(id__in=food_ids).values_list('id', flat=True)) if food_ids else set()
+
+    errors = [f'meal type not found: {meal_type_id}' for meal_type_id in sorted(meal_type_ids - known_meal_types)]
+    errors += [f'food not found: {food_id}' for food_id in sorted(food_ids - known_foods)]
+    return errors
+
+
+def get_meal_types_by_name(names: Iterable[str]) -> Dict[str, MealType]:
+    """أنواع الوجبات حسب الاسم باستعلام واحد"""
+    return {meal_type.name: meal_type for meal_type in MealType.objects.filter(name__in=set(names))}
+
+
+def save_plan_meals(meal_plan, drafts: Sequence[MealDraft], replace: bool = False) -> List[Meal]:
+    """
+    حفظ وجبات ومكونات خطة دفعة واحدة داخل معاملة واحدة
+
+    With ``replace`` the plan's existing meals are deleted first. The drafts
+    are expected to be validated (``parse_selected_meals`` or
+    ``validate_drafts``). Returns the created meals in draft order.
+    """
+    with transaction.atomic(), batched_changes(meal_plan.id, 'meal'):
+        removed_days = set()
+        if replace:
+            existing = Meal.objects.filter(meal_plan=meal_plan)
+            removed_days = set(existing.values_list('day_of_week', flat=True))
+            with totals_refresh_suppressed():
+                existing.delete()
+
+        meals = Meal.objects.bulk_create([
+            Meal(
+                meal_plan=meal_plan,
+                meal_type_id=draft.meal_type_id,
+                day_of_week=draft.day_of_week,
+                name=draft.name,
+                description=draft.description,
+                instructions=draft.instructions,
+                prep_time=draft.prep_time,
+            )
+            for draft in drafts
+        ])
+        MealIngredient.objects.bulk_create([
+            MealIngredient(meal=meal, food_id=ingredient.food_id, amount=ingredient.amount, notes=ingredient.notes)
+            for meal, draft in zip(meals, drafts)
+            for ingredient in draft.ingredients
+        ])
+
+        # bulk_create sends no signals
+        refresh_meal_totals(meal.id for meal in meals)
+        emptied_days = removed_days - {draft.day_of_week for draft in drafts}
+        if emptied_days:
+            refresh_plan_totals(meal_plan.id, emptied_days)
+
+    return meals
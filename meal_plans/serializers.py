@@ -1,8 +1,10 @@
 from rest_framework import serializers
+from dr_mays_nutrition import instrumentation
 from .models import (
     FoodCategory, Food, MealPlanTemplate, MealPlan, MealType, 
-    Meal, MealIngredient, MealPlanProgress, Recipe, RecipeIngredient
+    Meal, MealIngredient, MealPlanDayNutrition, MealPlanProgress, Recipe, RecipeIngredient
 )
+from .nutrition_totals import MEAL_TOTAL_FIELDS
 
 
 class FoodCategorySerializer(serializers.ModelSerializer):
@@ -30,13 +32,8 @@ class MealPlanTemplateSerializer(serializers.ModelSerializer):
     
     def get_meals(self, obj):
         meals = []
-        # البحث عن الوجبات المرتبطة بهذا القالب
-        # نستخدم MealPlan مع title يحتوي على Template ID
-        template_meals = Meal.objects.filter(
-            meal_plan__title__startswith=f'Template {obj.id}'
-        )
-        
-        for meal in template_meals:
+        # الوجبات المرتبطة بهذا القالب (تُحمّل مسبقاً عبر with_template_meals)
+        for meal in obj.template_meals.all():
             meal_data = {
                 'id': meal.id,
                 'meal_type': meal.meal_type.name_ar if meal.meal_type else meal.meal_type.name,
@@ -97,20 +94,34 @@ class MealSerializer(serializers.ModelSerializer):
     class Meta:
         model = Meal
         fields = '__all__'
+        # Template sample meals are managed with their template; totals are
+        # kept by meal_plans.nutrition_totals
+        read_only_fields = ['template', *MEAL_TOTAL_FIELDS]
     
     def get_total_nutrition(self, obj):
         return obj.get_total_nutrition()
     
     def get_other_ingredients_count(self, obj):
         """Calculate the number of ingredients beyond the first 3 displayed"""
-        total_ingredients = obj.ingredients.count()
+        if 'ingredients' in getattr(obj, '_prefetched_objects_cache', {}):
+            total_ingredients = len(obj.ingredients.all())
+        else:
+            total_ingredients = obj.ingredients.count()
         if total_ingredients > 3:
             return total_ingredients - 3
         return 0
 
 
+class MealPlanDayNutritionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = MealPlanDayNutrition
+        exclude = ['id', 'meal_plan']
+
+
 class MealPlanSerializer(serializers.ModelSerializer):
     meals = MealSerializer(many=True, read_only=True)
+    day_nutrition = MealPlanDayNutritionSerializer(many=True, read_only=True)
+    total_nutrition = serializers.SerializerMethodField()
     patient_name = serializers.CharField(source='patient.get_full_name', read_only=True)
     doctor_name = serializers.CharField(source='doctor.get_full_name', read_only=True)
     template_name = serializers.CharField(source='template.name', read_only=True)
@@ -122,6 +133,9 @@ class MealPlanSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ['doctor', 'delivered_at', 'acknowledged_at']
     
+    def get_total_nutrition(self, obj):
+        return obj.get_total_nutrition()
+    
     def get_diet_plan_display(self, obj):
         """ترجمة نوع النظام الغذائي للعربية"""
         diet_translations = {
@@ -143,13 +157,18 @@ class MealPlanSerializer(serializers.ModelSerializer):
         return diet_translations.get(obj.diet_plan, obj.diet_plan or 'غير محدد')
     
     def update(self, instance, validated_data):
-        print(f"🔍 MealPlanSerializer.update called with data:", validated_data)
-        print(f"🔍 Current instance data: start_date={instance.start_date}, end_date={instance.end_date}")
+        previous_dates = (instance.start_date, instance.end_date)
         
         # تحديث البيانات
         updated_instance = super().update(instance, validated_data)
         
-        print(f"✅ Updated instance data: start_date={updated_instance.start_date}, end_date={updated_instance.end_date}")
+        instrumentation.event(
+            'meal_plan.updated',
+            meal_plan_id=updated_instance.id,
+            fields=sorted(validated_data),
+            previous_dates=previous_dates,
+            dates=(updated_instance.start_date, updated_instance.end_date),
+        )
         return updated_instance
 
 
@@ -256,7 +275,7 @@ class MealPlanCreateSerializer(serializers.ModelSerializer):
                         )
                     except Exception as e:
                         # If food creation fails, just create the meal without ingredients
-                        print(f"Failed to create ingredient: {e}")
+                        instrumentation.warning('meal.ingredient_create_failed', meal_id=meal.id, error=str(e))
                         
                 elif isinstance(ingredient_data, dict):
                     # If ingredient is a dictionary with food details
@@ -0,0 +1,187 @@
+"""
+إشارات تحديث القيم المخزنة
+Signal handlers keeping materialized nutrition totals, the in-process food
+catalogue and the public template catalogue cache current
+
+Refreshes run in ``transaction.on_commit`` so they see the final state of
+the transaction (including cascaded deletes) and never run for rolled back
+writes; meal totals are refreshed once per transaction for all the meals
+touched (``commit_batches``), not once per saved ingredient. Deletes
+cascaded from a meal or plan are skipped: the meal (or plan) is going away
+and its own handler takes care of the plan's day rows.
+The template catalogue version is likewise bumped only once the change is
+committed, so a concurrent request cannot cache pre-commit data under the
+new version.
+
+``totals_refresh_suppressed()`` switches the totals handlers off for code
+that writes in bulk and calls the refresh functions itself.
+
+Writes to plans, their meals, ingredients and selections are recorded in the
+per-user change feed (``change_feed``), also on commit and once per plan and
+kind in a transaction; cascaded deletes are covered by the change recorded
+for the plan or meal being deleted. A saved ingredient reads its meal once
+(``ingredient_changed``) to tell a template ingredient, which changes the
+template catalogue, from a plan ingredient, which goes to the change feed.
+"""
+
+import threading
+from contextlib import contextmanager
+from functools import partial
+
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .change_feed import record_change
+from .commit_batches import on_commit_batch
+from .food_catalogue import invalidate_food_catalogue
+from .models import Food, FoodCategory, Meal, MealIngredient, MealPlan, MealPlanTemplate, PatientMealSelection
+from .nutrition_totals import (
+    FOOD_NUTRITION_FIELDS, refresh_food_totals, refresh_meal_totals, refresh_plan_totals
+)
+from .template_catalogue import bump_catalogue_version
+
+
+_suppressed = threading.local()
+
+
+@contextmanager
+def totals_refresh_suppressed():
+    """تعطيل تحديث المجاميع من الإشارات مؤقتاً (المستدعي يحدّثها بنفسه)"""
+    _suppressed.depth = getattr(_suppressed, 'depth', 0) + 1
+    try:
+        yield
+    finally:
+        _suppressed.depth -= 1
+
+
+def _refresh_suppressed():
+    return getattr(_suppressed, 'depth', 0) > 0
+
+
+def _deleted_with(origin, *models):
+    """هل الحذف ناتج عن حذف أحد النماذج المحددة (حذف متتالي)"""
+    if isinstance(origin, QuerySet):
+        return origin.model in models
+    return isinstance(origin, models)
+
+
+def _refresh_meals_on_commit(meal_id):
+    on_commit_batch('meal_totals', refresh_meal_totals, [meal_id])
+
+
+@receiver(post_save, sender=MealIngredient)
+def meal_ingredient_saved(sender, instance, **kwargs):
+    if _refresh_suppressed():
+        return
+    _refresh_meals_on_commit(instance.meal_id)
+
+
+@receiver(post_delete, sender=MealIngredient)
+def meal_ingredient_deleted(sender, instance, origin=None, **kwargs):
+    if _refresh_suppressed() or _deleted_with(origin, Meal, MealPlan):
+        return
+    _refresh_meals_on_commit(instance.meal_id)
+
+
+@receiver(post_save, sender=Meal)
+def meal_saved(sender, instance, **kwargs):
+    # Meal.save() writes back whatever totals the instance holds, so they are
+    # recomputed; the meal can also move to another day, so the whole plan is
+    # re-rolled.
+    if _refresh_suppressed():
+        return
+    _refresh_meals_on_commit(instance.id)
+    transaction.on_commit(partial(refresh_plan_totals, instance.meal_plan_id))
+
+
+@receiver(post_delete, sender=Meal)
+def meal_deleted(sender, instance, origin=None, **kwargs):
+    if _refresh_suppressed() or _deleted_with(origin, MealPlan):
+        return
+    transaction.on_commit(partial(refresh_plan_totals, instance.meal_plan_id))
+
+
+@receiver(post_save, sender=Food)
+def food_saved(sender, instance, created=False, update_fields=None, **kwargs):
+    if created:
+        return
+    if update_fields is not None and not set(update_fields) & set(FOOD_NUTRITION_FIELDS):
+        return
+    transaction.on_commit(partial(refresh_food_totals, instance.id))
+
+
+# كتالوج القوالب العامة
+
+@receiver(post_save, sender=MealPlanTemplate)
+@receiver(post_delete, sender=MealPlanTemplate)
+@receiver(post_save, sender=Food)
+@receiver(post_delete, sender=Food)
+def catalogue_source_changed(sender, instance, **kwargs):
+    transaction.on_commit(bump_catalogue_version)
+
+
+@receiver(post_save, sender=Meal)
+@receiver(post_delete, sender=Meal)
+def catalogue_meal_changed(sender, instance, **kwargs):
+    if instance.template_id is not None:
+        transaction.on_commit(bump_catalogue_version)
+
+
+# كتالوج الأطعمة في الذاكرة
+
+@receiver(post_save, sender=Food)
+@receiver(post_delete, sender=Food)
+@receiver(post_save, sender=FoodCategory)
+@receiver(post_delete, sender=FoodCategory)
+def food_catalogue_changed(sender, instance, **kwargs):
+    transaction.on_commit(invalidate_food_catalogue)
+
+
+# سجل تغييرات الخطط لكل مستخدم
+
+def _action(signal):
+    return 'deleted' if signal is post_delete else 'saved'
+
+
+@receiver(post_save, sender=MealPlan)
+@receiver(post_delete, sender=MealPlan)
+def meal_plan_changed(sender, instance, signal, **kwargs):
+    # المستخدمون من النسخة نفسها: بعد الحذف لا يمكن قراءتهم من الخطة
+    record_change(instance.id, 'plan', _action(signal), (instance.patient_id, instance.doctor_id))
+
+
+@receiver(post_save, sender=Meal)
+@receiver(post_delete, sender=Meal)
+def plan_meal_changed(sender, instance, signal, origin=None, **kwargs):
+    if _deleted_with(origin, MealPlan) or instance.template_id is not None:
+        return
+    record_change(instance.meal_plan_id, 'meal', _action(signal))
+
+
+@receiver(post_save, sender=MealIngredient)
+@receiver(post_delete, sender=MealIngredient)
+def ingredient_changed(sender, instance, signal, origin=None, **kwargs):
+    # مكون قالب يغير كتالوج القوالب ومكون خطة يسجل في سجل التغييرات:
+    # الوجبة تقرأ مرة واحدة لكل حفظ للحالتين
+    if _deleted_with(origin, Meal, MealPlan, MealPlanTemplate, Food):
+        return
+    if MealIngredient.meal.is_cached(instance):
+        meal_plan_id, template_id = instance.meal.meal_plan_id, instance.meal.template_id
+    else:
+        meal_plan_id, template_id = Meal.objects.filter(id=instance.meal_id).values_list(
+            'meal_plan_id', 'template_id'
+        ).first() or (None, None)
+    if template_id is not None:
+        transaction.on_commit(bump_catalogue_version)
+    else:
+        record_change(meal_plan_id, 'ingredient', _action(signal))
+
+
+@receiver(post_save, sender=PatientMealSelection)
+@receiver(post_delete, sender=PatientMealSelection)
+def plan_selection_changed(sender, instance, signal, origin=None, **kwargs):
+    if _deleted_with(origin, MealPlan):
+        return
+    record_change(instance.meal_plan_id, 'selection', _action(signal))
@@ -0,0 +1,92 @@
+"""
+كتالوج قوالب الوجبات العامة
+Public meal template catalogue cache
+
+The serialized public template list and template details are cached under a
+catalogue version number. Any change to a template, a template meal, one of
+its ingredients or a food bumps the version (after the transaction commits),
+so stale entries are simply never read again. The version also drives the
+ETag / Last-Modified headers of the public endpoints.
+
+The version lives in the Django cache, so every worker sees a bump only when
+they share a cache backend (``CACHE_REDIS_URL``). The version and the
+entries also expire after ``CATALOGUE_CACHE_TIMEOUT`` seconds, which bounds
+how long a process with its own cache, or a missed bump, can serve stale
+data.
+"""
+
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+CATALOGUE_CACHE_PREFIX = 'meal_plans:template_catalogue'
+CATALOGUE_VERSION_KEY = f'{CATALOGUE_CACHE_PREFIX}:version'
+CATALOGUE_MODIFIED_KEY = f'{CATALOGUE_CACHE_PREFIX}:modified'
+DEFAULT_CATALOGUE_TIMEOUT = 300
+
+
+def _timeout() -> int:
+    return getattr(settings, 'CATALOGUE_CACHE_TIMEOUT', DEFAULT_CATALOGUE_TIMEOUT)
+
+
+def _initial_version():
+    # Seeded from the clock so a flushed or expired version never reissues an old ETag
+    now = time.time()
+    cache.add(CATALOGUE_VERSION_KEY, int(now * 1000), _timeout())
+    cache.add(CATALOGUE_MODIFIED_KEY, now, _timeout())
+
+
+def get_catalogue_version() -> int:
+    """رقم إصدار الكتالوج الحالي"""
+    version = cache.get(CATALOGUE_VERSION_KEY)
+    if version is None:
+        _initial_version()
+        version = cache.get(CATALOGUE_VERSION_KEY)
+    return version
+
+
+def get_catalogue_modified() -> float:
+    """وقت آخر تعديل على الكتالوج (timestamp)"""
+    modified = cache.get(CATALOGUE_MODIFIED_KEY)
+    if modified is None:
+        _initial_version()
+        modified = cache.get(CATALOGUE_MODIFIED_KEY)
+    return modified
+
+
+def bump_catalogue_version():
+    """زيادة رقم الإصدار بعد أي تعديل يؤثر على القوالب"""
+    try:
+        cache.incr(CATALOGUE_VERSION_KEY)
+    except ValueError:
+        _initial_version()
+    cache.set(CATALOGUE_MODIFIED_KEY, time.time(), _timeout())
+
+
+def catalogue_key(*parts) -> str:
+    """مفتاح التخزين المؤقت لجزء من الكتالوج ضمن الإصدار الحالي"""
+    return ':'.join([CATALOGUE_CACHE_PREFIX, str(get_catalogue_version()), *map(str, parts)])
+
+
+def get_or_build(key: str, build):
+    """قراءة قيمة من الكتالوج أو بناؤها وتخزينها"""
+    data = cache.get(key)
+    if data is None:
+        data = build()
+        cache.set(key, data, _timeout())
+    return data
+
+
+def catalogue_etag(request, template_id=None) -> str:
+    """ETag لقائمة القوالب أو لقالب واحد (للاستخدام مع condition)"""
+    if template_id is None:
+        return f'templates-{get_catalogue_version()}'
+    return f'templates-{get_catalogue_version()}-{template_id}'
+
+
+def catalogue_last_modified(request, template_id=None):
+    """Last-Modified للكتالوج (للاستخدام مع condition)"""
+    return datetime.fromtimestamp(int(get_catalogue_modified()), tz=timezone.utc)
@@ -0,0 +1,929 @@
+"""
+اختبارات خطط الوجبات
+Meal plan tests
+"""
+
+import copy
+import json
+import random
+import threading
+from datetime import date, timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from accounts.models import User
+
+from .calorie_adjustment import MACRO_KEYS, _Portion, _solve_factor, adjust_selections
+from .commit_batches import on_commit_batch
+from . import food_catalogue
+from .food_catalogue import (
+    GENERATION_CACHE_KEY, FoodRecord, get_food_catalogue, get_food_catalogue_stats, invalidate_food_catalogue
+)
+from .food_search import get_food_search_index, search_food_ids
+from .meal_optimizer import CALORIE_TOLERANCE, MEAL_COMPONENTS, component_slot, optimize_week_plan, solve_portions
+from .models import (
+    Food, FoodCategory, Meal, MealIngredient, MealPlan, MealPlanChange, MealPlanTemplate, MealType
+)
+from .nutrient_matrix import get_nutrient_matrix
+from .nutrition_calculator import IraqiNutritionCalculator
+from .nutrition_totals import refresh_meal_totals
+from .plan_persistence import IngredientDraft, PlanPayloadError, parse_selected_meals, save_plan_meals
+from .plan_graph import load_plan_graph, with_plan_graph
+
+
+def create_users(suffix=''):
+    doctor = User.objects.create_user(username=f'doctor{suffix}', password='x', role='doctor')
+    patient = User.objects.create_user(username=f'patient{suffix}', password='x', role='patient')
+    return doctor, patient
+
+
+def create_foods(count):
+    category = FoodCategory.objects.create(name='Test')
+    return [
+        Food.objects.create(
+            name=f'Food {index}', category=category, calories_per_100g=100 + index,
+            protein_per_100g=10, carbs_per_100g=10, fat_per_100g=5,
+        )
+        for index in range(count)
+    ]
+
+
+def create_plan(doctor, patient, foods, meals, ingredients_per_meal, meal_types=None):
+    """خطة بعدد محدد من الوجبات والمكونات لكل وجبة"""
+    meal_types = meal_types or [MealType.objects.create(name='Lunch', order=1)]
+    start = date(2026, 1, 1)
+    plan = MealPlan.objects.create(
+        patient=patient, doctor=doctor, title='Plan', start_date=start, end_date=start + timedelta(days=6),
+        target_calories=2000, target_protein=100, target_carbs=250, target_fat=70, is_active=False,
+    )
+    for index in range(meals):
+        meal = Meal.objects.create(
+            meal_plan=plan, meal_type=meal_types[index % len(meal_types)], day_of_week=index % 7,
+            name=f'Meal {index}',
+        )
+        MealIngredient.objects.bulk_create([
+            MealIngredient(meal=meal, food=foods[(index + offset) % len(foods)], amount=100)
+            for offset in range(ingredients_per_meal)
+        ])
+    return plan
+
+
+class PlanGraphQueryCountTests(TestCase):
+    """عدد استعلامات تحميل الخطة لا يزيد مع عدد الوجبات والمكونات"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor, cls.patient = create_users()
+        foods = create_foods(12)
+        meal_types = [MealType.objects.create(name=name, order=order) for order, name in enumerate(('A', 'B', 'C'))]
+        cls.small = create_plan(cls.doctor, cls.patient, foods, meals=1, ingredients_per_meal=1,
+                                meal_types=meal_types)
+        cls.large = create_plan(cls.doctor, cls.patient, foods, meals=14, ingredients_per_meal=6,
+                                meal_types=meal_types)
+
+    def walk(self, plan):
+        """قراءة كل ما يعرضه MealPlanSerializer من الخطة المحمّلة"""
+        seen = [plan.patient, plan.doctor, plan.template, list(plan.day_nutrition.all())]
+        for meal in plan.meals.all():
+            seen.append(meal.meal_type.name)
+            for ingredient in meal.ingredients.all():
+                seen.append(ingredient.food.name)
+        return seen
+
+    def test_load_plan_graph_by_id(self):
+        for plan in (self.small, self.large):
+            with self.assertNumQueries(4):
+                graph = load_plan_graph(plan.id)
+            with self.assertNumQueries(0):
+                self.walk(graph.plan)
+                for meal in graph.meals:
+                    graph.ingredients_for(meal)
+        self.assertEqual(graph.ingredients_count, 14 * 6)
+        self.assertEqual(len(graph.foods), 12)
+        self.assertEqual(len(graph.meal_types), 3)
+
+    def test_load_plan_graph_with_loaded_plan(self):
+        for plan in (self.small, self.large):
+            plan = MealPlan.objects.get(id=plan.id)
+            with self.assertNumQueries(3):
+                load_plan_graph(plan)
+
+    def test_with_plan_graph(self):
+        plans = MealPlan.objects.filter(id__in=[self.small.id, self.large.id])
+        for queryset in (plans.filter(id=self.small.id), plans):
+            with self.assertNumQueries(4):
+                for plan in with_plan_graph(queryset):
+                    self.walk(plan)
+
+
+class MealPlanEndpointQueryCountTests(TestCase):
+    """عدد استعلامات واجهات خطط الوجبات ثابت مهما كبرت الخطط"""
+
+    LIST_QUERIES = 5      # count, plans, meals, ingredients, day totals
+    DETAIL_QUERIES = 4    # plan, meals, ingredients, day totals
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor, cls.patient = create_users()
+        cls.foods = create_foods(10)
+        cls.meal_types = [MealType.objects.create(name=name, order=order) for order, name in enumerate(('A', 'B'))]
+        cls.plan = create_plan(cls.doctor, cls.patient, cls.foods, meals=1, ingredients_per_meal=1,
+                               meal_types=cls.meal_types)
+
+    def add_plans(self):
+        """خطط أكبر بوجبات ومكونات أكثر"""
+        return [
+            create_plan(self.doctor, self.patient, self.foods, meals=7 * size, ingredients_per_meal=size + 2,
+                        meal_types=self.meal_types)
+            for size in (1, 2, 3)
+        ]
+
+    def get(self, user, url, queries):
+        client = APIClient()
+        client.force_authenticate(user)
+        with self.assertNumQueries(queries):
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_meal_plan_list(self):
+        for user in (self.doctor, self.patient):
+            self.get(user, '/api/meals/meal-plans/', self.LIST_QUERIES)
+        self.add_plans()
+        for user in (self.doctor, self.patient):
+            data = self.get(user, '/api/meals/meal-plans/', self.LIST_QUERIES)
+            self.assertEqual(data['count'], 4)
+
+    def test_meal_plan_detail(self):
+        self.get(self.doctor, f'/api/meals/meal-plans/{self.plan.id}/', self.DETAIL_QUERIES)
+        for plan in self.add_plans():
+            data = self.get(self.patient, f'/api/meals/meal-plans/{plan.id}/', self.DETAIL_QUERIES)
+            self.assertEqual(len(data['meals']), plan.meals.count())
+
+    def test_patient_meal_plan_list(self):
+        url = f'/api/meals/patients/{self.patient.id}/meal-plans/'
+        self.get(self.doctor, url, self.LIST_QUERIES)
+        self.add_plans()
+        for user in (self.doctor, self.patient):
+            data = self.get(user, url, self.LIST_QUERIES)
+            self.assertEqual(data['count'], 4)
+
+
+class MealSerializerTests(TestCase):
+    """حقول الوجبة التي لا يكتبها العميل"""
+
+    def test_template_and_totals_are_read_only(self):
+        doctor, patient = create_users()
+        plan = create_plan(doctor, patient, create_foods(1), meals=0, ingredients_per_meal=0)
+        meal_type = MealType.objects.create(name='Dinner')
+        template = MealPlanTemplate.objects.create(
+            name='Public', plan_type='balanced', target_calories=1500, target_protein_percentage=30,
+            target_carbs_percentage=40, target_fat_percentage=30, created_by=doctor, is_public=True,
+        )
+        client = APIClient()
+        client.force_authenticate(doctor)
+        response = client.post(f'/api/meals/meal-plans/{plan.id}/meals/', {
+            'meal_plan': plan.id, 'meal_type': meal_type.id, 'day_of_week': 0, 'name': 'Injected',
+            'template': template.id, 'total_calories': 9999,
+        }, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        meal = Meal.objects.get(id=response.json()['id'])
+        self.assertIsNone(meal.template_id)
+        self.assertEqual(meal.total_calories, 0)
+        self.assertFalse(template.template_meals.exists())
+
+
+class BulkNutritionCalculatorTests(TestCase):
+    """حساب القيم الغذائية لعدة قوائم"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor, _ = create_users()
+        cls.food = create_foods(1)[0]
+
+    def setUp(self):
+        invalidate_food_catalogue()
+
+    def post(self, details):
+        client = APIClient()
+        client.force_authenticate(self.doctor)
+        return client.post('/api/meals/nutrition-calculator/bulk/', {
+            'lists': [{'id': 1, 'foods': [{'food_id': self.food.id, 'amount': 100}]}],
+            'details': details,
+        }, format='json')
+
+    def test_details_flag_is_parsed_as_boolean(self):
+        for details, expected in ((True, True), ('true', True), ('1', True), (False, False), ('false', False),
+                                  ('0', False)):
+            response = self.post(details)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual('detailed_nutrition' in response.json()['results'][0], expected, details)
+
+        self.assertEqual(self.post('maybe').status_code, 400)
+
+    def test_streamed_as_ndjson(self):
+        client = APIClient()
+        client.force_authenticate(self.doctor)
+        response = client.post('/api/meals/nutrition-calculator/bulk/?stream=1', {
+            'lists': [{'id': index, 'foods': [{'food_id': self.food.id, 'amount': 100}]} for index in range(3)],
+        }, format='json')
+
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([line['id'] for line in lines], [0, 1, 2])
+        self.assertEqual(lines[0]['total_nutrition']['calories'], self.food.calories_per_100g)
+
+
+class NutritionCalculatorTests(TestCase):
+    """حاسبة القيم الغذائية: المعرفات المكررة وغير المعروفة وعدد الاستعلامات"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor, _ = create_users()
+        cls.foods = create_foods(30)
+
+    def setUp(self):
+        invalidate_food_catalogue()
+
+    def get(self, foods):
+        client = APIClient()
+        client.force_authenticate(self.doctor)
+        return client.get('/api/meals/nutrition-calculator/', {'foods': json.dumps(foods)})
+
+    def test_duplicate_food_ids_count_every_item(self):
+        food = self.foods[0]
+        response = self.get([{'food_id': food.id, 'amount': 100}, {'food_id': str(food.id), 'amount': 50}])
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([item['amount'] for item in data['detailed_nutrition']], [100, 50])
+        self.assertEqual(data['total_nutrition']['calories'], food.calories_per_100g * 1.5)
+        self.assertEqual(data['unknown_food_ids'], [])
+
+    def test_unknown_food_ids_listed_once_in_request_order(self):
+        food = self.foods[0]
+        food_ids = [99999, food.id, 'abc', 99999, None, 'abc']
+        Food.objects.filter(id=self.foods[1].id).update(is_active=False)
+        invalidate_food_catalogue()
+        food_ids.append(self.foods[1].id)
+
+        response = self.get([{'food_id': food_id, 'amount': 100} for food_id in food_ids])
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['unknown_food_ids'], [99999, 'abc', None, self.foods[1].id])
+        self.assertEqual([item['food_id'] for item in data['detailed_nutrition']], [food.id])
+        self.assertEqual(data['total_nutrition']['calories'], food.calories_per_100g)
+
+    def test_query_count_does_not_grow_with_foods(self):
+        # التحميل الأول للكتالوج استعلام واحد، ثم لا استعلامات مهما زاد عدد الأطعمة
+        with self.assertNumQueries(1):
+            self.get([{'food_id': self.foods[0].id, 'amount': 100}])
+        for count in (1, 30):
+            with self.assertNumQueries(0):
+                response = self.get([{'food_id': food.id, 'amount': 100} for food in self.foods[:count]])
+            self.assertEqual(len(response.json()['detailed_nutrition']), count)
+
+    def test_invalid_json_is_rejected(self):
+        client = APIClient()
+        client.force_authenticate(self.doctor)
+        response = client.get('/api/meals/nutrition-calculator/', {'foods': '[{'})
+        self.assertEqual(response.status_code, 400)
+
+
+class TemplateCatalogueConditionalTests(TestCase):
+    """قوالب الوجبات العامة: 304 للطلب المكرر وETag جديد بعد تعديل القالب"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor, _ = create_users()
+        cls.template = MealPlanTemplate.objects.create(
+            name='Public', plan_type='balanced', description='', target_calories=1500,
+            target_protein_percentage=30, target_carbs_percentage=40, target_fat_percentage=30,
+            created_by=cls.doctor, is_public=True,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def urls(self):
+        return ('/api/meals/meal-templates/', f'/api/meals/meal-templates/{self.template.id}/')
+
+    def test_repeated_get_with_if_none_match_is_not_modified(self):
+        for url in self.urls():
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            etag = response['ETag']
+
+            with self.assertNumQueries(0):
+                repeated = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(repeated.status_code, 304, url)
+            self.assertEqual(repeated['ETag'], etag)
+            self.assertEqual(repeated.content, b'')
+
+    def test_template_change_changes_etag(self):
+        etags = {url: self.client.get(url)['ETag'] for url in self.urls()}
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.template.name = 'Renamed'
+            self.template.save()
+
+        for url, etag in etags.items():
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(self.client.get(self.urls()[1]).json()['name'], 'Renamed')
+
+
+class NutrientMatrixEquivalenceTests(TestCase):
+    """جدول القيم الغذائية يعطي نفس نتائج الحساب لكل طعام على حدة"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor, cls.patient = create_users()
+        category = FoodCategory.objects.create(name='Seeded')
+        rng = random.Random(7)
+        cls.foods = [
+            Food.objects.create(
+                name=f'Seeded {index}', category=category,
+                calories_per_100g=rng.uniform(0, 900), protein_per_100g=rng.uniform(0, 40),
+                carbs_per_100g=rng.uniform(0, 90), fat_per_100g=rng.uniform(0, 60),
+                fiber_per_100g=rng.uniform(0, 15), sugar_per_100g=rng.uniform(0, 50),
+                sodium_per_100g=rng.uniform(0, 800), vitamin_a=rng.uniform(0, 3000),
+                vitamin_c=rng.uniform(0, 130), vitamin_d=rng.uniform(0, 10),
+                calcium=rng.uniform(0, 300), iron=rng.uniform(0, 8),
+            )
+            for index in range(30)
+        ]
+        cls.amounts = [round(rng.uniform(1, 350), 1) for _ in range(60)]
+
+    def setUp(self):
+        invalidate_food_catalogue()
+        self.calculator = IraqiNutritionCalculator()
+
+    def expected(self, pairs):
+        lines = [self.calculator.calculate_food_nutrition(food, amount) for food, amount in pairs]
+        totals = {
+            field: round(sum(line[field] for line in lines), 2)
+            for field in self.calculator.nutrition_fields
+        }
+        return lines, totals
+
+    def test_meal_matches_per_food_calculation(self):
+        plan = create_plan(self.doctor, self.patient, self.foods, 1, 0)
+        meal = plan.meals.get()
+        get_nutrient_matrix()
+        # طعام أضيف بعد بناء الجدول يقرأ من قاعدة البيانات
+        late = Food.objects.create(
+            name='Late', category=self.foods[0].category, calories_per_100g=52.3, protein_per_100g=0.3,
+            carbs_per_100g=13.8, fat_per_100g=0.2, vitamin_c=4.6, calcium=6, iron=0.12,
+        )
+        foods = self.foods + [late]
+        pairs = [(foods[index % len(foods)], amount) for index, amount in enumerate(self.amounts)]
+        MealIngredient.objects.bulk_create([
+            MealIngredient(meal=meal, food=food, amount=amount) for food, amount in pairs
+        ])
+
+        result = self.calculator.calculate_meal_nutrition(meal)
+
+        lines, totals = self.expected(pairs)
+        self.assertEqual([detail['nutrition'] for detail in result['ingredients_detail']], lines)
+        self.assertEqual(result['total_nutrition'], totals)
+
+    def test_custom_list_matches_per_food_calculation(self):
+        pairs = list(zip(self.foods, reversed(self.amounts)))
+
+        result = self.calculator.calculate_custom_nutrition([
+            {'food_id': food.id, 'amount': amount} for food, amount in pairs
+        ])
+
+        lines, totals = self.expected(pairs)
+        self.assertEqual([detail['nutrition'] for detail in result['foods_detail']], lines)
+        self.assertEqual(result['total_nutrition'], totals)
+
+    def test_vitamins_and_minerals_are_included(self):
+        food = self.foods[0]
+        result = self.calculator.calculate_custom_nutrition([{'food_id': food.id, 'amount': 200}])
+
+        for field in ('vitamin_a', 'vitamin_c', 'vitamin_d', 'calcium', 'iron'):
+            self.assertEqual(result['total_nutrition'][field], round(getattr(food, field) * 2, 2))
+            self.assertGreater(result['total_nutrition'][field], 0)
+
+
+class PlanPersistenceTests(TestCase):
+    """حفظ الوجبات المختارة: تحقق كامل ثم حفظ الكل أو لا شيء"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor, cls.patient = create_users()
+        cls.foods = create_foods(3)
+        cls.meal_type = MealType.objects.create(name='Lunch', order=1)
+        cls.plan = create_plan(cls.doctor, cls.patient, cls.foods, 2, 2, [cls.meal_type])
+
+    def meal(self, day, name='Meal', amount=100):
+        return {
+            'meal_type_id': self.meal_type.id, 'day_of_week': day, 'name': name,
+            'ingredients': [{'food_id': food.id, 'amount': amount} for food in self.foods],
+        }
+
+    def post(self, selected_meals):
+        client = APIClient()
+        client.force_authenticate(self.doctor)
+        return client.post(
+            f'/api/meals/meal-plans/{self.plan.id}/save-selected-meals/', {'selected_meals': selected_meals},
+            format='json'
+        )
+
+    def saved_meals(self):
+        return sorted(Meal.objects.filter(meal_plan=self.plan).values_list('name', flat=True))
+
+    def test_day_of_week_out_of_range_is_reported_with_other_errors(self):
+        with self.assertRaises(PlanPayloadError) as raised:
+            parse_selected_meals([self.meal(7), self.meal(-1), dict(self.meal(3), name='')])
+
+        self.assertEqual(raised.exception.errors, [
+            'meal 1: day_of_week must be between 0 and 6',
+            'meal 2: day_of_week must be between 0 and 6',
+            'meal 3: name is required',
+        ])
+
+    def test_invalid_meal_saves_nothing(self):
+        response = self.post([self.meal(0, 'New'), self.meal(9, 'Bad')])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['details'], ['meal 2: day_of_week must be between 0 and 6'])
+        self.assertEqual(self.saved_meals(), ['Meal 0', 'Meal 1'])
+
+    def test_database_error_rolls_back_every_write(self):
+        drafts = parse_selected_meals([self.meal(0, 'New'), self.meal(1, 'Broken')])
+        # amount NULL fails on the ingredient insert, after the old meals were deleted and the new ones inserted
+        drafts[1] = drafts[1]._replace(ingredients=(IngredientDraft(self.foods[0].id, None),))
+
+        with self.assertRaises(IntegrityError):
+            save_plan_meals(self.plan, drafts, replace=True)
+
+        self.assertEqual(self.saved_meals(), ['Meal 0', 'Meal 1'])
+        self.assertEqual(MealIngredient.objects.filter(meal__meal_plan=self.plan).count(), 4)
+
+    def test_query_count_does_not_grow_with_meals(self):
+        def count_queries(meals):
+            drafts = parse_selected_meals([self.meal(index % 7, f'Meal {index}') for index in range(meals)])
+            with CaptureQueriesContext(connection) as queries:
+                save_plan_meals(self.plan, drafts, replace=True)
+            return len(queries)
+
+        # the first save creates the per-day totals rows; later saves only update them
+        count_queries(7)
+        self.assertEqual(count_queries(7), count_queries(21))
+        self.assertEqual(Meal.objects.filter(meal_plan=self.plan).count(), 21)
+        self.assertEqual(MealIngredient.objects.filter(meal__meal_plan=self.plan).count(), 63)
+
+
+class FoodCatalogueTests(TestCase):
+    """كتالوج الأطعمة في الذاكرة يعاد تحميله بعد التعديل أو انتهاء المهلة"""
+
+    def test_reloaded_after_food_change(self):
+        food = create_foods(1)[0]
+        invalidate_food_catalogue()
+        catalogue = get_food_catalogue()
+        self.assertIs(get_food_catalogue(), catalogue)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            food.name = 'Renamed'
+            food.save()
+        self.assertEqual(get_food_catalogue().get(food.id).name, 'Renamed')
+
+    def test_reloaded_after_max_age(self):
+        food = create_foods(1)[0]
+        invalidate_food_catalogue()
+        catalogue = get_food_catalogue()
+        # تعديل لا يرسل إشارات (QuerySet.update) ولا يلغي الكتالوج
+        Food.objects.filter(id=food.id).update(name='Updated')
+        self.assertIs(get_food_catalogue(), catalogue)
+
+        with override_settings(CATALOGUE_CACHE_TIMEOUT=0):
+            self.assertEqual(get_food_catalogue().get(food.id).name, 'Updated')
+            # الفهارس المبنية من الكتالوج تتبع إعادة التحميل
+            self.assertEqual(search_food_ids('updated'), [food.id])
+
+    @override_settings(FOOD_CATALOGUE_GENERATION_CHECK_INTERVAL=60)
+    def test_shared_generation_read_once_per_interval(self):
+        invalidate_food_catalogue()
+        catalogue = get_food_catalogue()
+
+        with mock.patch.object(food_catalogue, 'cache', wraps=cache) as shared:
+            for _ in range(20):
+                self.assertIs(get_food_catalogue(), catalogue)
+        self.assertEqual(shared.get.call_count, 0)
+
+    @override_settings(FOOD_CATALOGUE_GENERATION_CHECK_INTERVAL=60)
+    def test_other_process_invalidation_seen_after_interval(self):
+        invalidate_food_catalogue()
+        catalogue = get_food_catalogue()
+        # عملية أخرى ألغت الكتالوج
+        cache.incr(GENERATION_CACHE_KEY)
+        self.assertIs(get_food_catalogue(), catalogue)
+
+        with override_settings(FOOD_CATALOGUE_GENERATION_CHECK_INTERVAL=0):
+            self.assertIsNot(get_food_catalogue(), catalogue)
+
+    def test_stats_count_every_lookup_across_threads(self):
+        invalidate_food_catalogue()
+        get_food_catalogue()
+        before = get_food_catalogue_stats()
+
+        def lookups():
+            for _ in range(500):
+                get_food_catalogue()
+                invalidate_food_catalogue()
+
+        # التحميل من قاعدة البيانات خارج ما يختبر هنا (وSQLite لا يقبل الخيوط)
+        empty = mock.patch.object(
+            food_catalogue.FoodCatalogue, 'load', side_effect=lambda generation: food_catalogue.FoodCatalogue((), generation)
+        )
+        threads = [threading.Thread(target=lookups) for _ in range(4)]
+        with empty:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        invalidate_food_catalogue()
+
+        stats = get_food_catalogue_stats()
+        self.assertEqual(stats['hits'] + stats['misses'] - before['hits'] - before['misses'], 2000)
+        self.assertEqual(stats['invalidations'] - before['invalidations'], 2001)
+
+
+class FoodSearchTests(TestCase):
+    """البحث عن الأطعمة"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = FoodCategory.objects.create(name='Grains', name_ar='حبوب')
+        names = [('Basmati Rice', 'رز بسمتي'), ('Brown rice', 'الرز الأسمر'), ('Chicken tikka', 'تكة دجاج'),
+                 ('Rice pudding', 'محلبي بالرز'), ('Lentil soup', 'شوربة عدس')]
+        cls.foods = [
+            Food.objects.create(name=name, name_ar=name_ar, category=category, calories_per_100g=100,
+                                protein_per_100g=5, carbs_per_100g=20, fat_per_100g=1)
+            for name, name_ar in names
+        ]
+        # الإشارات تلغي الكتالوج بعد الالتزام، والاختبار لا يلتزم
+        invalidate_food_catalogue()
+
+    def test_infix_matches_agree_with_full_scan(self):
+        index = get_food_search_index()
+        for query in ('ic', 'ice', 'rz', 'لرز', 'دجا', 'ikk', 'ntil', 'zz'):
+            expected = {
+                token for token in index.vocabulary if query in token and not token.startswith(query)
+            }
+            found = {index.vocabulary[position] for position in index._infix_candidates(query)}
+            self.assertEqual({token for token in found if not token.startswith(query)}, expected, query)
+
+        self.assertEqual(set(search_food_ids('ice')), {self.foods[0].id, self.foods[1].id, self.foods[3].id})
+
+    def test_invalid_page_is_not_found(self):
+        client = APIClient()
+        for page in ('999', 'abc'):
+            response = client.get('/api/meals/iraqi-nutrition/search-foods/', {'q': 'rice', 'page': page})
+            self.assertEqual(response.status_code, 404, page)
+        response = client.get('/api/meals/iraqi-nutrition/search-foods/', {'q': 'rice'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 3)
+
+
+class NutritionTotalsTests(TestCase):
+    """تحديث القيم الغذائية المخزنة مرة واحدة لكل معاملة"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor, cls.patient = create_users()
+        cls.foods = create_foods(3)
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.plan = create_plan(cls.doctor, cls.patient, cls.foods, meals=2, ingredients_per_meal=0)
+        cls.meals = list(cls.plan.meals.order_by('id'))
+
+    def test_ingredient_writes_refresh_totals_once(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            for meal in self.meals:
+                for food in self.foods:
+                    MealIngredient.objects.create(meal=meal, food=food, amount=50)
+            MealIngredient.objects.filter(meal=self.meals[1]).first().delete()
+
+        refreshes = [callback for callback in callbacks if getattr(callback, 'callback', None) is refresh_meal_totals]
+        self.assertEqual(len(refreshes), 1)
+        self.assertEqual(list(refreshes[0].items), [meal.id for meal in self.meals])
+
+        first, second = Meal.objects.filter(id__in=[meal.id for meal in self.meals]).order_by('id')
+        self.assertAlmostEqual(first.total_calories, sum(food.calories_per_100g for food in self.foods) / 2)
+        self.assertAlmostEqual(second.total_calories, sum(food.calories_per_100g for food in self.foods[1:]) / 2)
+
+    def test_verify_fails_on_stale_totals(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            MealIngredient.objects.create(meal=self.meals[0], food=self.foods[0], amount=100)
+        call_command('rebuild_nutrition_totals', verify=True, stdout=StringIO())
+
+        Meal.objects.filter(id=self.meals[0].id).update(total_calories=0)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_nutrition_totals', verify=True, stdout=StringIO())
+
+
+class CommitBatchTests(TestCase):
+    """دفعة واحدة لكل مفتاح في المعاملة، وتسقط مع نقطة الحفظ المتراجع عنها"""
+
+    def setUp(self):
+        self.calls = []
+
+    def add(self, key, *items):
+        on_commit_batch(key, lambda batch: self.calls.append((key, batch)), items)
+
+    def test_one_callback_per_key(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            for index in range(500):
+                self.add('meals', index % 10)
+            self.add('plans', 1)
+            self.add('meals', 3, 10)
+
+        self.assertEqual(len(callbacks), 2)
+        self.assertEqual(self.calls, [('meals', list(range(11))), ('plans', [1])])
+
+    def test_savepoint_rollback_drops_its_batch(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    self.add('meals', 1)
+                    raise IntegrityError
+            except IntegrityError:
+                pass
+            self.add('meals', 2)
+
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self.calls, [('meals', [2])])
+
+    def test_batch_before_rolled_back_savepoint_still_runs(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add('meals', 1)
+            try:
+                with transaction.atomic():
+                    self.add('meals', 2)
+                    self.add('plans', 5)
+                    raise IntegrityError
+            except IntegrityError:
+                pass
+            self.add('meals', 3)
+
+        # 2 joined the batch registered before the savepoint; plans was registered inside it
+        self.assertEqual(self.calls, [('meals', [1, 2]), ('meals', [3])])
+
+    def test_new_batch_after_callbacks_ran(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add('meals', 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add('meals', 2)
+        self.assertEqual(self.calls, [('meals', [1]), ('meals', [2])])
+
+
+class ChangeFeedTests(TestCase):
+    """تغيير واحد لكل خطة ونوع في المعاملة"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor, cls.patient = create_users()
+        cls.foods = create_foods(3)
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.plan = create_plan(cls.doctor, cls.patient, cls.foods, meals=2, ingredients_per_meal=0)
+        cls.meals = list(cls.plan.meals.order_by('id'))
+
+    def setUp(self):
+        # التغييرات المسجلة عند إنشاء الخطة لا تحسب
+        self.version = MealPlanChange.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+    def changes(self, kind):
+        return list(MealPlanChange.objects.filter(
+            meal_plan_id=self.plan.id, kind=kind, id__gt=self.version
+        ).order_by('user_id'))
+
+    def test_ingredient_writes_record_one_change(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for meal in self.meals:
+                for food in self.foods:
+                    MealIngredient.objects.create(meal=meal, food=food, amount=50)
+            MealIngredient.objects.filter(meal=self.meals[1]).first().delete()
+
+        changes = self.changes('ingredient')
+        self.assertEqual([change.user_id for change in changes], sorted([self.doctor.id, self.patient.id]))
+        self.assertEqual({change.action for change in changes}, {'deleted'})
+
+    def test_ingredient_save_reads_meal_once(self):
+        # الحفظ والوجبة فقط: التحديث والتسجيل بعد الالتزام
+        with self.assertNumQueries(2):
+            MealIngredient.objects.create(meal_id=self.meals[0].id, food=self.foods[0], amount=50)
+
+    def test_deleted_plan_is_recorded_for_its_users(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.plan.title = 'Renamed'
+            self.plan.save()
+            MealPlan.objects.get(id=self.plan.id).delete()
+
+        changes = self.changes('plan')
+        self.assertEqual([change.user_id for change in changes], sorted([self.doctor.id, self.patient.id]))
+        self.assertEqual({change.action for change in changes}, {'deleted'})
+
+
+class CalorieAdjustmentPropertyTests(SimpleTestCase):
+    """خصائص تعديل الكميات على مجموعات وجبات عشوائية (بذرة ثابتة)"""
+
+    CASES = 300
+
+    def random_meals(self, rng):
+        meals = []
+        for meal_index in range(rng.randint(1, 4)):
+            ingredients = []
+            for ingredient_index in range(rng.randint(1, 5)):
+                protein, carbs, fat = rng.uniform(0, 30), rng.uniform(0, 70), rng.uniform(0, 40)
+                ingredients.append({
+                    'food_id': meal_index * 10 + ingredient_index,
+                    'amount': round(rng.uniform(10, 300), 1),
+                    'calories_per_100g': round(protein * 4 + carbs * 4 + fat * 9 + rng.uniform(5, 20), 1),
+                    'protein_per_100g': round(protein, 1),
+                    'carbs_per_100g': round(carbs, 1),
+                    'fat_per_100g': round(fat, 1),
+                })
+            meals.append({'name': f'Meal {meal_index}', 'ingredients': ingredients})
+        return meals
+
+    def portions(self, meals):
+        return [_Portion(ingredient, ingredient['amount']) for meal in meals for ingredient in meal['ingredients']]
+
+    def calorie_range(self, meals):
+        """أقل وأعلى سعرات ممكنة ضمن حدود الأمان"""
+        portions = self.portions(meals)
+        return (sum(portion.per_gram * portion.low for portion in portions),
+                sum(portion.per_gram * portion.high for portion in portions))
+
+    def cases(self, seed):
+        rng = random.Random(seed)
+        for _ in range(self.CASES):
+            meals = self.random_meals(rng)
+            low, high = self.calorie_range(meals)
+            yield rng, meals, low, high
+
+    def test_target_reached_when_bounds_allow(self):
+        for rng, meals, low, high in self.cases(1):
+            target = round(rng.uniform(low + 2 * CALORIE_TOLERANCE, high - 2 * CALORIE_TOLERANCE))
+            result = adjust_selections(meals, target)
+            self.assertTrue(result.within_tolerance, (target, result))
+            self.assertLessEqual(abs(sum(meal['calories'] for meal in meals) - target), CALORIE_TOLERANCE)
+
+    def test_amounts_stay_within_bounds(self):
+        for rng, meals, low, high in self.cases(2):
+            # أهداف داخل المدى وخارجه (حتى تبلغ المكونات حدودها)
+            target = round(rng.uniform(low / 2, high * 2))
+            result = adjust_selections(meals, target)
+            for meal in meals:
+                for ingredient in meal['ingredients']:
+                    original = ingredient.get('original_amount', ingredient['amount'])
+                    lowest = max(1, original * 0.1)
+                    self.assertGreaterEqual(ingredient['amount'], round(lowest, 1) - 0.05)
+                    self.assertLessEqual(ingredient['amount'], round(max(lowest, original * 10), 1) + 0.05)
+            if target < low:
+                self.assertGreaterEqual(result.total_calories, low - CALORIE_TOLERANCE)
+            if target > high:
+                self.assertLessEqual(result.total_calories, high + CALORIE_TOLERANCE)
+
+    def test_deterministic(self):
+        for rng, meals, low, high in self.cases(3):
+            target = round(rng.uniform(low, high))
+            first, second = copy.deepcopy(meals), copy.deepcopy(meals)
+            self.assertEqual(adjust_selections(first, target), adjust_selections(second, target))
+            self.assertEqual(first, second)
+
+    def test_macro_split_preserved(self):
+        for rng, meals, low, high in self.cases(4):
+            before = [self.macro_split(meal) for meal in meals]
+            original = sum(
+                ingredient['calories_per_100g'] * ingredient['amount'] / 100
+                for meal in meals for ingredient in meal['ingredients']
+            )
+            # عامل لا تبلغ معه المكونات حدودها (الحد الأدنى 10% والأعلى 10 أضعاف)
+            result = adjust_selections(meals, round(original * rng.uniform(0.5, 2)))
+            self.assertTrue(result.adjusted)
+            for split, meal in zip(before, meals):
+                for key, share in self.macro_split(meal).items():
+                    self.assertAlmostEqual(share, split[key], delta=0.01)
+
+    def macro_split(self, meal):
+        grams = {
+            key: sum(ingredient[f'{key}_per_100g'] * ingredient['amount'] / 100 for ingredient in meal['ingredients'])
+            for key in MACRO_KEYS if key != 'calories'
+        }
+        total = sum(grams.values()) or 1
+        return {key: value / total for key, value in grams.items()}
+
+    def test_solve_factor(self):
+        for rng, meals, low, high in self.cases(5):
+            portions = self.portions(meals)
+            fixed = rng.uniform(0, 200)
+
+            def total(factor):
+                return fixed + sum(portion.scaled_calories(factor) for portion in portions)
+
+            top = max(portion.high / portion.amount for portion in portions)
+            target = rng.uniform(total(0), total(top))
+            factor = _solve_factor(portions, fixed, target)
+            self.assertEqual(factor, _solve_factor(portions, fixed, target))
+            self.assertAlmostEqual(total(factor), target, delta=1e-6)
+            # خارج المدى: الحد المناسب
+            self.assertEqual(_solve_factor(portions, fixed, total(top) + 1), top)
+            self.assertEqual(_solve_factor(portions, fixed, total(0) - 1), 0.0)
+
+
+def food_record(food_id, name, calories, protein, carbs, fat):
+    return FoodRecord(food_id, name, name, None, True, (calories, protein, carbs, fat, 0, 0, 0))
+
+
+class MealOptimizerTests(SimpleTestCase):
+    """الخطة الأسبوعية من المحسّن: الأهداف والحدود والمجموعات الفارغة"""
+
+    POOLS = {
+        'proteins': [food_record(1, 'chicken', 165, 31, 0, 3.6), food_record(2, 'fish', 120, 22, 0, 3),
+                     food_record(3, 'eggs', 155, 13, 1.1, 11)],
+        'grains': [food_record(4, 'rice', 130, 2.7, 28, 0.3), food_record(5, 'bread', 265, 9, 49, 3.2)],
+        'vegetables': [food_record(6, 'salad', 20, 1, 4, 0.2), food_record(7, 'broccoli', 34, 2.8, 7, 0.4)],
+        'fats': [food_record(8, 'olive oil', 884, 0, 0, 100), food_record(9, 'nuts', 600, 20, 20, 50)],
+        'fruits': [food_record(10, 'apple', 52, 0.3, 14, 0.2), food_record(11, 'banana', 89, 1.1, 23, 0.3)],
+    }
+    TARGETS = {'calories': 2000, 'protein': 125, 'carbs': 225, 'fat': 67}
+
+    def component_bounds(self, meal, ingredient):
+        component = next(c for c in MEAL_COMPONENTS[component_slot(meal.slot)] if c.role == ingredient.role)
+        return component.min_grams, component.max_grams
+
+    def test_feasible_targets(self):
+        plan = optimize_week_plan(self.POOLS, self.TARGETS)
+        self.assertTrue(plan.within_tolerance)
+        self.assertEqual(len(plan.meals), 7 * 5)
+        for day, totals in plan.daily_totals.items():
+            self.assertLessEqual(abs(totals['calories'] - self.TARGETS['calories']), CALORIE_TOLERANCE)
+            # المغذيات الكبرى هدف مرن (أقرب ما يمكن) والسعرات قيد
+            for key in ('protein', 'carbs', 'fat'):
+                self.assertAlmostEqual(totals[key], self.TARGETS[key], delta=self.TARGETS[key] * 0.15, msg=(day, key))
+        for meal in plan.meals:
+            for ingredient in meal.ingredients:
+                low, high = self.component_bounds(meal, ingredient)
+                self.assertTrue(low <= ingredient.amount <= high, (meal.slot, ingredient))
+
+    def test_unreachable_targets_are_clamped(self):
+        for calories, bound in ((10000, 1), (300, 0)):
+            plan = optimize_week_plan(self.POOLS, {'calories': calories})
+            self.assertFalse(plan.within_tolerance)
+            for meal in plan.meals:
+                for ingredient in meal.ingredients:
+                    self.assertEqual(ingredient.amount, self.component_bounds(meal, ingredient)[bound])
+
+    def test_empty_pool_roles_are_left_out(self):
+        pools = {role: foods for role, foods in self.POOLS.items() if role not in ('fats', 'fruits')}
+        plan = optimize_week_plan(pools, self.TARGETS)
+        self.assertEqual({meal.slot for meal in plan.meals}, {'breakfast', 'lunch', 'dinner'})
+        self.assertFalse([i for meal in plan.meals for i in meal.ingredients if i.role == 'fats'])
+        self.assertTrue(plan.within_tolerance)
+
+        plan = optimize_week_plan({}, self.TARGETS)
+        self.assertEqual(plan.meals, [])
+        self.assertEqual({totals['calories'] for totals in plan.daily_totals.values()}, {0})
+
+    def test_enumeration_fallback_matches_active_set(self):
+        rng = random.Random(5)
+        for _ in range(200):
+            size = rng.randint(1, 4)
+            rows = 4 + size
+            columns = [[rng.uniform(0, 400) for _ in range(rows)] for _ in range(size)]
+            weights = [rng.uniform(0.05, 100) for _ in range(rows)]
+            targets = [rng.uniform(0, 800) for _ in range(rows)]
+            calorie_column = [column[0] for column in columns]
+            lower = [rng.uniform(0.05, 0.5) for _ in range(size)]
+            upper = [low + rng.uniform(0.1, 3) for low in lower]
+            calorie_target = rng.uniform(0, 1500)
+            problem = (columns, weights, targets, calorie_column, calorie_target, lower, upper)
+
+            def objective(x):
+                return sum(
+                    weights[r] * (sum(columns[i][r] * x[i] for i in range(size)) - targets[r]) ** 2
+                    for r in range(rows)
+                )
+
+            active, active_met = solve_portions(*problem)
+            enumerated, enumerated_met = solve_portions(*problem, max_iterations=0)
+            self.assertEqual(active_met, enumerated_met)
+            for x in (active, enumerated):
+                self.assertTrue(all(low - 1e-9 <= v <= high + 1e-9 for v, low, high in zip(x, lower, upper)))
+            self.assertAlmostEqual(objective(active), objective(enumerated),
+                                   delta=max(objective(enumerated), 1) * 1e-6)
@@ -36,6 +36,8 @@ urlpatterns = [
     
     # Utilities
     path('nutrition-calculator/', views.nutrition_calculator, name='nutrition-calculator'),
+    path('nutrition-calculator/bulk/', views.bulk_nutrition_calculator, name='bulk-nutrition-calculator'),
+    path('food-catalogue/stats/', views.food_catalogue_stats_api, name='food-catalogue-stats'),
     path('meal-plans/<int:meal_plan_id>/generate-meals/', views.generate_meals_for_plan, name='generate-meals-for-plan'),
     path('meal-plans/<int:meal_plan_id>/save-selected-meals/', views.save_selected_meals, name='save-selected-meals'),
     path('meal-plans/check-updates/', views.check_meal_plan_updates, name='check-meal-plan-updates'),
@@ -0,0 +1,61 @@
+"""
+تجميع عمليات الكتابة لاتصال websocket واحد
+Per-connection write coalescer for the websocket consumers
+
+Read receipts and chat messages arrive one event at a time; writing each
+one from its socket handler costs a ``database_sync_to_async`` round trip
+(a thread-pool slot) and a query per event. ``WriteCoalescer`` buffers the
+items of one connection and hands them to an async flush callback in one
+batch, once ``delay`` seconds after the first buffered item or as soon as
+``max_size`` items are waiting. Batches are flushed one at a time, in
+arrival order, and whatever is still buffered is flushed on ``close()``.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, List, Optional
+
+from django.conf import settings
+
+
+DEFAULT_FLUSH_DELAY = 0.2
+DEFAULT_FLUSH_SIZE = 50
+
+
+class WriteCoalescer:
+    def __init__(self, flush: Callable[[List[Any]], Awaitable[None]],
+                 delay: Optional[float] = None, max_size: Optional[int] = None):
+        self._flush = flush
+        self.delay = getattr(settings, 'REALTIME_FLUSH_DELAY', DEFAULT_FLUSH_DELAY) if delay is None else delay
+        self.max_size = getattr(settings, 'REALTIME_FLUSH_SIZE', DEFAULT_FLUSH_SIZE) if max_size is None else max_size
+        self._items: List[Any] = []
+        self._timer: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    async def add(self, item: Any) -> None:
+        self._items.append(item)
+        if len(self._items) >= self.max_size:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.ensure_future(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.delay)
+        self._timer = None
+        await self.flush()
+
+    async def flush(self) -> None:
+        """كتابة العناصر المجمعة الآن"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        # دفعة واحدة في كل مرة حتى تبقى الرسائل بترتيب وصولها
+        async with self._lock:
+            items, self._items = self._items, []
+            if items:
+                await self._flush(items)
+
+    async def close(self) -> None:
+        await self.flush()
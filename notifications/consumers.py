@@ -2,15 +2,38 @@ import json
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth import get_user_model
+from django.utils import timezone
+from dr_mays_nutrition import instrumentation
+from .coalescer import WriteCoalescer
 from .models import Notification, ChatMessage
+from .realtime import chat_room_name, user_group
 
 User = get_user_model()
 
 
+def _ids(data, key):
+    """معرفات من الحدث: key مفرد أو قائمة keys"""
+    values = data.get(f'{key}s') or [data.get(key)]
+    if not isinstance(values, list):
+        return []
+    return [int(value) for value in values if str(value).isdigit()]
+
+
 class NotificationConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         self.user_id = self.scope['url_route']['kwargs']['user_id']
-        self.notification_group_name = f'notifications_{self.user_id}'
+        self.notification_group_name = user_group(self.user_id)
+
+        # المستخدم يستمع لإشعاراته فقط
+        user = self.scope.get('user')
+        if not user or not user.is_authenticated or str(user.id) != self.user_id:
+            self.notification_group_name = None
+            await self.close()
+            return
+
+        # علامات القراءة تكتب دفعة واحدة بدلاً من حفظ لكل إشعار
+        self.read_receipts = WriteCoalescer(self.flush_read_receipts)
+        self.connected = True
 
         # Join notification group
         await self.channel_layer.group_add(
@@ -21,6 +44,10 @@ class NotificationConsumer(AsyncWebsocketConsumer):
         await self.accept()
 
     async def disconnect(self, close_code):
+        if not self.notification_group_name:
+            return
+        self.connected = False
+        await self.read_receipts.close()
         # Leave notification group
         await self.channel_layer.group_discard(
             self.notification_group_name,
@@ -32,25 +59,48 @@ class NotificationConsumer(AsyncWebsocketConsumer):
         message_type = text_data_json.get('type')
 
         if message_type == 'mark_as_read':
-            notification_id = text_data_json.get('notification_id')
-            await self.mark_notification_as_read(notification_id)
+            for notification_id in _ids(text_data_json, 'notification_id'):
+                await self.read_receipts.add(notification_id)
+
+    async def flush_read_receipts(self, notification_ids):
+        try:
+            marked = await self.mark_notifications_as_read(notification_ids)
+        except Exception as e:
+            instrumentation.warning('notifications.read_receipts_failed', error=str(e), count=len(notification_ids))
+            marked = []
+        if not self.connected:
+            return
+
+        # تأكيد الاستلام: المعرفات المعلمة كمقروءة وما لم يمكن تعليمه
+        await self.send(text_data=json.dumps({
+            'type': 'read_receipt',
+            'notification_ids': marked,
+            'failed': sorted(set(notification_ids) - set(marked)),
+        }))
 
     async def notification_message(self, event):
         notification = event['notification']
-        
+
         # Send message to WebSocket
         await self.send(text_data=json.dumps({
             'type': 'notification',
             'notification': notification
         }))
 
+    async def meal_plan_change(self, event):
+        # سجل تغييرات خطط الوجبات (meal_plans.change_feed)
+        await self.send(text_data=json.dumps({
+            'type': 'meal_plan_change',
+            'change': event['change']
+        }))
+
     @database_sync_to_async
-    def mark_notification_as_read(self, notification_id):
-        try:
-            notification = Notification.objects.get(id=notification_id, recipient_id=self.user_id)
-            notification.mark_as_read()
-        except Notification.DoesNotExist:
-            pass
+    def mark_notifications_as_read(self, notification_ids):
+        owned = list(Notification.objects.filter(
+            recipient_id=self.user_id, id__in=set(notification_ids)
+        ).values_list('id', flat=True))
+        Notification.objects.filter(id__in=owned, is_read=False).update(is_read=True, read_at=timezone.now())
+        return sorted(owned)
 
 
 class ChatConsumer(AsyncWebsocketConsumer):
@@ -58,6 +108,20 @@ class ChatConsumer(AsyncWebsocketConsumer):
         self.room_name = self.scope['url_route']['kwargs']['room_name']
         self.room_group_name = f'chat_{self.room_name}'
 
+        # الغرفة "<id>_<id>" (chat_room_name) والمستخدم أحد طرفيها
+        self.user = self.scope.get('user')
+        self.recipient_id = self._other_member(self.room_name, self.user)
+        if self.recipient_id is None or not await self.recipient_exists():
+            self.room_group_name = None
+            await self.close()
+            return
+
+        # الرسائل وعلامات القراءة تجمع وتكتب دفعة واحدة (WriteCoalescer)
+        self.sender_name = self.user.get_full_name()
+        self.messages = WriteCoalescer(self.flush_messages)
+        self.read_receipts = WriteCoalescer(self.flush_read_receipts)
+        self.connected = True
+
         # Join room group
         await self.channel_layer.group_add(
             self.room_group_name,
@@ -66,7 +130,25 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
         await self.accept()
 
+    @staticmethod
+    def _other_member(room_name, user):
+        if not user or not user.is_authenticated:
+            return None
+        members = room_name.split('_')
+        if len(members) != 2 or not all(member.isdigit() for member in members):
+            return None
+        first, second = (int(member) for member in members)
+        if chat_room_name(first, second) != room_name or user.id not in (first, second):
+            return None
+        return second if user.id == first else first
+
     async def disconnect(self, close_code):
+        if not self.room_group_name:
+            return
+        # ما تبقى في المخزن يكتب ويوزع على الطرف الآخر قبل المغادرة
+        self.connected = False
+        await self.messages.close()
+        await self.read_receipts.close()
         # Leave room group
         await self.channel_layer.group_discard(
             self.room_group_name,
@@ -75,25 +157,78 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
     async def receive(self, text_data):
         text_data_json = json.loads(text_data)
-        message = text_data_json['message']
-        sender_id = text_data_json['sender_id']
-        recipient_id = text_data_json['recipient_id']
 
-        # Save message to database
-        chat_message = await self.save_message(sender_id, recipient_id, message)
+        if text_data_json.get('type') == 'mark_as_read':
+            for message_id in _ids(text_data_json, 'message_id'):
+                await self.read_receipts.add(message_id)
+            return
 
-        # Send message to room group
-        await self.channel_layer.group_send(
-            self.room_group_name,
+        message = text_data_json.get('message')
+        if not message:
+            return
+        # client_id يعيده التأكيد ليطابق العميل رسالته المؤقتة بالمحفوظة
+        await self.messages.add({'message': message, 'client_id': text_data_json.get('client_id')})
+
+    async def flush_messages(self, items):
+        try:
+            saved = await self.save_messages([item['message'] for item in items])
+        except Exception as e:
+            instrumentation.warning('chat.save_failed', error=str(e), count=len(items))
+            if self.connected:
+                await self.send(text_data=json.dumps({
+                    'type': 'chat_error',
+                    'client_ids': [item['client_id'] for item in items],
+                }))
+            return
+
+        messages = [
             {
-                'type': 'chat_message',
-                'message': message,
-                'sender_id': sender_id,
-                'sender_name': chat_message['sender_name'],
+                'message': item['message'],
+                'sender_id': self.user.id,
+                'sender_name': self.sender_name,
                 'timestamp': chat_message['timestamp'],
                 'message_id': chat_message['id'],
+                'client_id': item['client_id'],
+            }
+            for item, chat_message in zip(items, saved)
+        ]
+        # Send the batch to the room group in one event
+        await self.channel_layer.group_send(
+            self.room_group_name,
+            {
+                'type': 'chat_messages',
+                'messages': messages,
             }
         )
+        if self.connected:
+            await self.send(text_data=json.dumps({
+                'type': 'chat_ack',
+                'messages': [
+                    {key: message[key] for key in ('client_id', 'message_id', 'timestamp')}
+                    for message in messages
+                ],
+            }))
+
+    async def flush_read_receipts(self, message_ids):
+        try:
+            marked = await self.mark_messages_as_read(message_ids)
+        except Exception as e:
+            instrumentation.warning('chat.read_receipts_failed', error=str(e), count=len(message_ids))
+            return
+        if marked:
+            # يصل للطرفين: المرسل يرى أن رسائله قرئت والقارئ يتلقى التأكيد
+            await self.channel_layer.group_send(
+                self.room_group_name,
+                {
+                    'type': 'chat_read',
+                    'reader_id': self.user.id,
+                    'message_ids': marked,
+                }
+            )
+
+    async def chat_messages(self, event):
+        for message in event['messages']:
+            await self.chat_message(message)
 
     async def chat_message(self, event):
         message = event['message']
@@ -110,24 +245,38 @@ class ChatConsumer(AsyncWebsocketConsumer):
             'sender_name': sender_name,
             'timestamp': timestamp,
             'message_id': message_id,
+            'client_id': event.get('client_id'),
+        }))
+
+    async def chat_read(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'read_receipt',
+            'reader_id': event['reader_id'],
+            'message_ids': event['message_ids'],
         }))
 
     @database_sync_to_async
-    def save_message(self, sender_id, recipient_id, message):
-        try:
-            sender = User.objects.get(id=sender_id)
-            recipient = User.objects.get(id=recipient_id)
-            
-            chat_message = ChatMessage.objects.create(
-                sender=sender,
-                recipient=recipient,
-                message=message
-            )
-            
-            return {
+    def recipient_exists(self):
+        return User.objects.filter(id=self.recipient_id).exists()
+
+    @database_sync_to_async
+    def save_messages(self, messages):
+        chat_messages = ChatMessage.objects.bulk_create([
+            ChatMessage(sender_id=self.user.id, recipient_id=self.recipient_id, message=message)
+            for message in messages
+        ])
+        return [
+            {
                 'id': chat_message.id,
-                'sender_name': sender.get_full_name(),
                 'timestamp': chat_message.created_at.isoformat(),
             }
-        except User.DoesNotExist:
-            return None
+            for chat_message in chat_messages
+        ]
+
+    @database_sync_to_async
+    def mark_messages_as_read(self, message_ids):
+        owned = list(ChatMessage.objects.filter(
+            recipient_id=self.user.id, sender_id=self.recipient_id, id__in=set(message_ids)
+        ).values_list('id', flat=True))
+        ChatMessage.objects.filter(id__in=owned, is_read=False).update(is_read=True, read_at=timezone.now())
+        return sorted(owned)
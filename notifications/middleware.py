@@ -0,0 +1,65 @@
+"""
+مصادقة اتصالات websocket بتذكرة قصيرة الصلاحية
+Ticket authentication for websocket connections
+
+Browsers cannot set an ``Authorization`` header on a websocket, and a DRF
+token in the URL ends up in the access logs of nginx and the ASGI server,
+where it stays valid until the user logs out. The frontend therefore asks
+``websocket_ticket`` (an authenticated POST) for a ticket and connects with
+``?ticket=<ticket>``: the ticket is good for one connection and expires
+after ``WEBSOCKET_TICKET_TTL`` seconds, so a logged URL is useless.
+
+Tickets live in the Django cache; when the HTTP workers and the ASGI server
+are separate processes they need the shared cache (``CACHE_REDIS_URL``).
+Connections without a ticket keep the session user set by
+``AuthMiddlewareStack``.
+"""
+
+import secrets
+from urllib.parse import parse_qs
+
+from channels.auth import AuthMiddlewareStack
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+
+
+DEFAULT_TICKET_TTL = 30
+TICKET_KEY = 'ws-ticket:{}'
+
+
+def issue_ticket(user_id: int) -> str:
+    """تذكرة اتصال واحد للمستخدم"""
+    ticket = secrets.token_urlsafe(32)
+    cache.set(TICKET_KEY.format(ticket), user_id, getattr(settings, 'WEBSOCKET_TICKET_TTL', DEFAULT_TICKET_TTL))
+    return ticket
+
+
+def redeem_ticket(ticket: str):
+    """مستخدم التذكرة (أو AnonymousUser)؛ التذكرة لا تستعمل مرة ثانية"""
+    key = TICKET_KEY.format(ticket)
+    user_id = cache.get(key)
+    # من يحذف المفتاح أولاً يستعمل التذكرة: اتصالان متزامنان لا يمران معاً
+    if user_id is None or not cache.delete(key):
+        return AnonymousUser()
+    user = get_user_model().objects.filter(id=user_id, is_active=True).first()
+    return user or AnonymousUser()
+
+
+get_ticket_user = database_sync_to_async(redeem_ticket)
+
+
+class TicketAuthMiddleware(BaseMiddleware):
+    async def __call__(self, scope, receive, send):
+        query = parse_qs(scope.get('query_string', b'').decode())
+        if query.get('ticket'):
+            scope = dict(scope, user=await get_ticket_user(query['ticket'][0]))
+        return await super().__call__(scope, receive, send)
+
+
+def TicketAuthMiddlewareStack(inner):
+    """التذكرة أولاً ثم الجلسة"""
+    return AuthMiddlewareStack(TicketAuthMiddleware(inner))
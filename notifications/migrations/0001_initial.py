@@ -0,0 +1,160 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('bookings', '0002_alter_appointment_consultation_fee'),
+        ('meal_plans', '0010_mealplanchange'),
+        ('payments', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailTemplate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('subject', models.CharField(max_length=200)),
+                ('subject_ar', models.CharField(blank=True, max_length=200)),
+                ('html_content', models.TextField()),
+                ('html_content_ar', models.TextField(blank=True)),
+                ('text_content', models.TextField(blank=True)),
+                ('text_content_ar', models.TextField(blank=True)),
+                ('variables', models.JSONField(blank=True, help_text='Available template variables', null=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SMSTemplate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('content', models.TextField(max_length=160)),
+                ('content_ar', models.TextField(blank=True, max_length=160)),
+                ('variables', models.JSONField(blank=True, help_text='Available template variables', null=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ChatMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('message', models.TextField()),
+                ('attachment', models.FileField(blank=True, null=True, upload_to='chat_attachments/')),
+                ('is_read', models.BooleanField(default=False)),
+                ('read_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('appointment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='bookings.appointment')),
+                ('meal_plan', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='meal_plans.mealplan')),
+                ('recipient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='received_messages', to=settings.AUTH_USER_MODEL)),
+                ('sender', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sent_messages', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('notification_type', models.CharField(choices=[('appointment_confirmed', 'Appointment Confirmed'), ('appointment_reminder', 'Appointment Reminder'), ('appointment_cancelled', 'Appointment Cancelled'), ('meal_plan_ready', 'Meal Plan Ready'), ('payment_successful', 'Payment Successful'), ('payment_failed', 'Payment Failed'), ('refund_processed', 'Refund Processed'), ('coupon_expiring', 'Coupon Expiring'), ('subscription_expiring', 'Subscription Expiring'), ('new_message', 'New Message'), ('system_announcement', 'System Announcement')], max_length=30)),
+                ('title', models.CharField(max_length=200)),
+                ('title_ar', models.CharField(blank=True, max_length=200)),
+                ('message', models.TextField()),
+                ('message_ar', models.TextField(blank=True)),
+                ('is_read', models.BooleanField(default=False)),
+                ('is_sent_email', models.BooleanField(default=False)),
+                ('is_sent_sms', models.BooleanField(default=False)),
+                ('is_sent_push', models.BooleanField(default=False)),
+                ('data', models.JSONField(blank=True, help_text='Additional data for the notification', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('read_at', models.DateTimeField(blank=True, null=True)),
+                ('appointment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='bookings.appointment')),
+                ('invoice', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='payments.invoice')),
+                ('meal_plan', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='meal_plans.mealplan')),
+                ('payment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='payments.payment')),
+                ('recipient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='EmailLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('to_email', models.EmailField(max_length=254)),
+                ('subject', models.CharField(max_length=200)),
+                ('content', models.TextField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('sent', 'Sent'), ('failed', 'Failed'), ('bounced', 'Bounced'), ('delivered', 'Delivered'), ('opened', 'Opened'), ('clicked', 'Clicked')], default='pending', max_length=20)),
+                ('provider_message_id', models.CharField(blank=True, max_length=200)),
+                ('error_message', models.TextField(blank=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('delivered_at', models.DateTimeField(blank=True, null=True)),
+                ('opened_at', models.DateTimeField(blank=True, null=True)),
+                ('clicked_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('recipient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='email_logs', to=settings.AUTH_USER_MODEL)),
+                ('template', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='notifications.emailtemplate')),
+                ('notification', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='notifications.notification')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='NotificationPreference',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email_appointments', models.BooleanField(default=True)),
+                ('email_meal_plans', models.BooleanField(default=True)),
+                ('email_payments', models.BooleanField(default=True)),
+                ('email_marketing', models.BooleanField(default=False)),
+                ('email_system', models.BooleanField(default=True)),
+                ('sms_appointments', models.BooleanField(default=True)),
+                ('sms_meal_plans', models.BooleanField(default=False)),
+                ('sms_payments', models.BooleanField(default=True)),
+                ('sms_marketing', models.BooleanField(default=False)),
+                ('sms_system', models.BooleanField(default=False)),
+                ('push_appointments', models.BooleanField(default=True)),
+                ('push_meal_plans', models.BooleanField(default=True)),
+                ('push_payments', models.BooleanField(default=True)),
+                ('push_marketing', models.BooleanField(default=False)),
+                ('push_system', models.BooleanField(default=True)),
+                ('inapp_appointments', models.BooleanField(default=True)),
+                ('inapp_meal_plans', models.BooleanField(default=True)),
+                ('inapp_payments', models.BooleanField(default=True)),
+                ('inapp_marketing', models.BooleanField(default=True)),
+                ('inapp_system', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='notification_preferences', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SMSLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('to_phone', models.CharField(max_length=20)),
+                ('content', models.TextField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('sent', 'Sent'), ('failed', 'Failed'), ('delivered', 'Delivered')], default='pending', max_length=20)),
+                ('provider_message_id', models.CharField(blank=True, max_length=200)),
+                ('error_message', models.TextField(blank=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('delivered_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('notification', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='notifications.notification')),
+                ('recipient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sms_logs', to=settings.AUTH_USER_MODEL)),
+                ('template', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='notifications.smstemplate')),
+            ],
+        ),
+    ]
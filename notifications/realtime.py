@@ -0,0 +1,55 @@
+"""
+إرسال الأحداث الفورية إلى مجموعات websocket للمستخدمين
+Push events to the users' websocket groups
+
+Every user's sockets join ``notifications_<user_id>`` (``NotificationConsumer``).
+Code running in the HTTP workers sends through the channel layer configured
+in ``CHANNEL_LAYERS``: the in-memory layer only reaches sockets served by the
+same process, Redis reaches every worker.
+"""
+
+from functools import partial
+from typing import Dict, Iterable
+
+from asgiref.sync import async_to_sync
+from django.db import transaction
+
+from dr_mays_nutrition import instrumentation
+
+
+def user_group(user_id) -> str:
+    return f'notifications_{user_id}'
+
+
+def chat_room_name(user_id, other_user_id) -> str:
+    """اسم غرفة المحادثة بين مستخدمين (نفس الاسم من الطرفين)"""
+    first, second = sorted((int(user_id), int(other_user_id)))
+    return f'{first}_{second}'
+
+
+def channel_layer():
+    try:
+        from channels.layers import get_channel_layer
+    except ImportError:
+        return None
+    return get_channel_layer()
+
+
+def send_to_users(user_ids: Iterable[int], event: Dict) -> bool:
+    """إرسال حدث لمجموعات المستخدمين (False إذا لم تتوفر طبقة قنوات أو فشل الإرسال)"""
+    layer = channel_layer()
+    if layer is None:
+        return False
+    try:
+        for user_id in user_ids:
+            async_to_sync(layer.group_send)(user_group(user_id), event)
+    except Exception as e:
+        # البيانات محفوظة: العميل يلتقطها عند الفحص التالي
+        instrumentation.warning('realtime.push_failed', error=str(e), event=event.get('type'))
+        return False
+    return True
+
+
+def send_on_commit(user_ids: Iterable[int], event: Dict) -> None:
+    """إرسال الحدث بعد نجاح المعاملة الحالية"""
+    transaction.on_commit(partial(send_to_users, tuple(user_ids), event))
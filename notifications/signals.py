@@ -0,0 +1,24 @@
+"""
+إشارات الإشعارات الفورية
+Push new in-app notifications to the recipient's websocket group
+
+Sent once the transaction commits, so a rolled back notification never
+reaches the client.
+"""
+
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Notification
+from .realtime import send_on_commit
+from .serializers import NotificationSerializer
+
+
+@receiver(post_save, sender=Notification, dispatch_uid='push_new_notification')
+def push_new_notification(sender, instance, created, **kwargs):
+    if not created:
+        return
+    send_on_commit([instance.recipient_id], {
+        'type': 'notification_message',
+        'notification': NotificationSerializer(instance).data,
+    })
@@ -0,0 +1,322 @@
+"""
+اختبارات الإشعارات
+Notification tests
+"""
+
+import asyncio
+from contextlib import contextmanager
+from unittest import mock
+
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.db.models import QuerySet
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+
+from accounts.models import User
+
+from .coalescer import WriteCoalescer
+from .middleware import issue_ticket, redeem_ticket
+from .models import ChatMessage, Notification
+from .routing import websocket_urlpatterns
+
+
+class WebsocketTicketTests(TestCase):
+    """تذكرة websocket تستعمل مرة واحدة وتنتهي صلاحيتها"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='patient', password='x', role='patient')
+
+    def test_ticket_is_single_use(self):
+        ticket = issue_ticket(self.user.id)
+        self.assertEqual(redeem_ticket(ticket), self.user)
+        self.assertFalse(redeem_ticket(ticket).is_authenticated)
+
+    def test_unknown_and_expired_tickets(self):
+        self.assertFalse(redeem_ticket('unknown').is_authenticated)
+        with override_settings(WEBSOCKET_TICKET_TTL=0):
+            ticket = issue_ticket(self.user.id)
+        self.assertFalse(redeem_ticket(ticket).is_authenticated)
+
+    def test_inactive_user(self):
+        ticket = issue_ticket(self.user.id)
+        User.objects.filter(id=self.user.id).update(is_active=False)
+        self.assertFalse(redeem_ticket(ticket).is_authenticated)
+
+    def test_ticket_endpoint(self):
+        client = APIClient()
+        self.assertEqual(client.post('/api/notifications/ws-ticket/').status_code, 403)
+
+        client.force_authenticate(self.user)
+        response = client.post('/api/notifications/ws-ticket/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(redeem_ticket(response.data['ticket']), self.user)
+
+
+class RolePermissionTests(TestCase):
+    """صلاحيات القوالب والسجلات حسب الدور (200 للمسموح و403 لغيره)"""
+
+    ROLES = ('admin', 'doctor', 'patient', 'accountant')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = {
+            role: User.objects.create_user(username=role, password='x', role=role) for role in cls.ROLES
+        }
+
+    def client_for(self, role):
+        client = APIClient()
+        client.force_authenticate(self.users[role])
+        return client
+
+    def test_logs_for_admin_and_accountant(self):
+        for url in ('/api/notifications/email-logs/', '/api/notifications/sms-logs/'):
+            for role in self.ROLES:
+                with self.subTest(url=url, role=role):
+                    expected = 200 if role in ('admin', 'accountant') else 403
+                    self.assertEqual(self.client_for(role).get(url).status_code, expected)
+
+    def test_template_create_for_admin(self):
+        payloads = {
+            '/api/notifications/email-templates/': {'subject': 'Hi', 'html_content': '<p>Hi</p>'},
+            '/api/notifications/sms-templates/': {'content': 'Hi'},
+        }
+        for url, payload in payloads.items():
+            for role in self.ROLES:
+                with self.subTest(url=url, role=role):
+                    client = self.client_for(role)
+                    self.assertEqual(client.get(url).status_code, 200)
+                    response = client.post(url, {**payload, 'name': f'{role}-template'}, format='json')
+                    self.assertEqual(response.status_code, 201 if role == 'admin' else 403)
+
+
+@contextmanager
+def updates_of(model):
+    """QuerySet.update() calls on model made inside the block"""
+    calls = []
+    original = QuerySet.update
+
+    def update(queryset, **kwargs):
+        if queryset.model is model:
+            calls.append(kwargs)
+        return original(queryset, **kwargs)
+
+    with mock.patch.object(QuerySet, 'update', update):
+        yield calls
+
+
+class ChatConversationListTests(TestCase):
+    """قائمة المحادثات: الطرف الآخر وآخر رسالة وغير المقروء بعدد ثابت من الاستعلامات"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='doctor', password='x', role='doctor')
+
+    def add_partner(self, index, unread):
+        partner = User.objects.create(
+            username=f'patient{index}', role='patient', first_name='Patient', last_name=str(index)
+        )
+        ChatMessage.objects.create(sender=self.user, recipient=partner, message='hello')
+        for number in range(unread):
+            ChatMessage.objects.create(sender=partner, recipient=self.user, message=f'reply {number}')
+        ChatMessage.objects.create(sender=partner, recipient=self.user, message='read', is_read=True)
+        last = ChatMessage.objects.create(sender=self.user, recipient=partner, message=f'last to {index}')
+        return partner, last
+
+    def get(self, **params):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        return client.get('/api/notifications/chat/conversations/', params)
+
+    def test_partner_last_message_and_unread(self):
+        conversations = [self.add_partner(index, unread=index) for index in range(3)]
+        # رسالة بين مستخدمين آخرين لا تظهر
+        ChatMessage.objects.create(sender=conversations[0][0], recipient=conversations[1][0], message='other')
+
+        response = self.get()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data), {'next', 'previous', 'results'})
+        self.assertEqual(
+            [
+                (row['user_id'], row['user_name'], row['user_role'], row['last_message'], row['unread_count'])
+                for row in response.data['results']
+            ],
+            [
+                (partner.id, f'Patient {index}', 'patient', last.message, index)
+                for index, (partner, last) in reversed(list(enumerate(conversations)))
+            ]
+        )
+
+    def test_query_count_is_constant(self):
+        for index in range(3):
+            self.add_partner(index, unread=1)
+        with self.assertNumQueries(2):
+            self.assertEqual(len(self.get().data['results']), 3)
+
+        for index in range(3, 25):
+            self.add_partner(index, unread=1)
+        # تجميع واحد للمحادثات ثم in_bulk لآخر الرسائل، مهما زاد عدد المحادثات
+        with self.assertNumQueries(2):
+            response = self.get()
+        self.assertEqual(len(response.data['results']), 20)
+        self.assertIsNotNone(response.data['next'])
+
+    def test_next_page_continues_with_older_conversations(self):
+        partners = [self.add_partner(index, unread=0)[0] for index in range(5)]
+
+        first = self.get(page_size=3).data
+        client = APIClient()
+        client.force_authenticate(self.user)
+        second = client.get(first['next']).data
+
+        self.assertEqual(
+            [row['user_id'] for row in first['results'] + second['results']],
+            [partner.id for partner in reversed(partners)]
+        )
+        self.assertIsNone(second['next'])
+
+
+class WriteCoalescerTests(SimpleTestCase):
+    """المخزن يكتب العناصر دفعة واحدة بترتيب وصولها"""
+
+    def coalescer(self, **kwargs):
+        batches = []
+
+        async def flush(items):
+            batches.append(items)
+
+        return WriteCoalescer(flush, **kwargs), batches
+
+    async def test_items_flushed_in_one_batch_after_delay(self):
+        coalescer, batches = self.coalescer(delay=0.01, max_size=50)
+        for item in range(5):
+            await coalescer.add(item)
+        self.assertEqual(batches, [])
+
+        await asyncio.sleep(0.05)
+        self.assertEqual(batches, [[0, 1, 2, 3, 4]])
+        self.assertEqual(len(coalescer), 0)
+
+    async def test_full_buffer_flushes_immediately(self):
+        coalescer, batches = self.coalescer(delay=60, max_size=3)
+        for item in range(7):
+            await coalescer.add(item)
+
+        self.assertEqual(batches, [[0, 1, 2], [3, 4, 5]])
+        await coalescer.close()
+        self.assertEqual(batches, [[0, 1, 2], [3, 4, 5], [6]])
+
+    async def test_close_flushes_pending_items(self):
+        coalescer, batches = self.coalescer(delay=60, max_size=50)
+        await coalescer.add('a')
+        await coalescer.add('b')
+
+        await coalescer.close()
+        self.assertEqual(batches, [['a', 'b']])
+        await coalescer.close()
+        self.assertEqual(batches, [['a', 'b']])
+
+
+@override_settings(REALTIME_FLUSH_DELAY=60, REALTIME_FLUSH_SIZE=50)
+class ChatConsumerTests(TransactionTestCase):
+    """المحادثة عبر websocket: كتابة مجمعة وغرف بصيغة <الأصغر>_<الأكبر>"""
+
+    def setUp(self):
+        self.doctor = User.objects.create_user(username='doctor', password='x', role='doctor')
+        self.patient = User.objects.create_user(username='patient', password='x', role='patient')
+        self.room = f'{min(self.doctor.id, self.patient.id)}_{max(self.doctor.id, self.patient.id)}'
+
+    def communicator(self, path, user):
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), path)
+        communicator.scope['user'] = user
+        return communicator
+
+    async def connect(self, user, room=None):
+        communicator = self.communicator(f'/ws/chat/{room or self.room}/', user)
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def test_rejects_rooms_not_in_low_high_form(self):
+        low, high = sorted((self.doctor.id, self.patient.id))
+        stranger = await User.objects.acreate(username='stranger', role='patient')
+        for room in (f'{high}_{low}', f'{low}_{high}_{high}', f'{low}', 'lobby', f'{low}_{stranger.id + 1}'):
+            communicator = self.communicator(f'/ws/chat/{room}/', self.doctor)
+            connected, _ = await communicator.connect()
+            self.assertFalse(connected, room)
+        # غرفة صحيحة لا يكون المستخدم أحد طرفيها
+        communicator = self.communicator(f'/ws/chat/{self.room}/', stranger)
+        connected, _ = await communicator.connect()
+        self.assertFalse(connected)
+
+    async def test_messages_saved_with_one_bulk_create(self):
+        sender = await self.connect(self.doctor)
+        receiver = await self.connect(self.patient)
+
+        with mock.patch.object(ChatMessage.objects, 'bulk_create', wraps=ChatMessage.objects.bulk_create) as bulk_create:
+            for index in range(3):
+                await sender.send_json_to({'message': f'hello {index}', 'client_id': f'c{index}'})
+            await sender.disconnect()
+
+        self.assertEqual(bulk_create.call_count, 1)
+        delivered = [(await receiver.receive_json_from())['message'] for _ in range(3)]
+        self.assertEqual(delivered, ['hello 0', 'hello 1', 'hello 2'])
+        self.assertEqual(await ChatMessage.objects.filter(sender=self.doctor, recipient=self.patient).acount(), 3)
+        await receiver.disconnect()
+
+    async def test_read_receipts_become_one_update(self):
+        messages = [
+            await ChatMessage.objects.acreate(sender=self.doctor, recipient=self.patient, message=f'm{index}')
+            for index in range(3)
+        ]
+        reader = await self.connect(self.patient)
+
+        with updates_of(ChatMessage) as updates:
+            for message in messages:
+                await reader.send_json_to({'type': 'mark_as_read', 'message_id': message.id})
+            await reader.send_json_to({'type': 'mark_as_read', 'message_ids': [messages[0].id]})
+            await reader.disconnect()
+
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(await ChatMessage.objects.filter(is_read=True).acount(), 3)
+
+    async def test_pending_writes_flushed_on_disconnect(self):
+        sender = await self.connect(self.doctor)
+        await sender.send_json_to({'message': 'before close', 'client_id': 'c1'})
+        # التأخير 60 ثانية: لم يكتب شيء بعد
+        self.assertTrue(await sender.receive_nothing())
+        self.assertEqual(await ChatMessage.objects.acount(), 0)
+
+        await sender.disconnect()
+        self.assertEqual(await ChatMessage.objects.filter(message='before close').acount(), 1)
+
+
+@override_settings(REALTIME_FLUSH_DELAY=60, REALTIME_FLUSH_SIZE=50)
+class NotificationConsumerTests(TransactionTestCase):
+    """علامات قراءة الإشعارات تكتب بتحديث واحد"""
+
+    async def test_read_receipts_become_one_update(self):
+        user = await User.objects.acreate(username='patient', role='patient')
+        notifications = [
+            await Notification.objects.acreate(
+                recipient=user, notification_type='system_announcement', title=f'n{index}', message='body'
+            )
+            for index in range(3)
+        ]
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f'/ws/notifications/{user.id}/')
+        communicator.scope['user'] = user
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+
+        with updates_of(Notification) as updates:
+            await communicator.send_json_to({
+                'type': 'mark_as_read', 'notification_ids': [notification.id for notification in notifications]
+            })
+            await communicator.send_json_to({'type': 'mark_as_read', 'notification_id': notifications[0].id})
+            self.assertTrue(await communicator.receive_nothing())
+            await communicator.disconnect()
+
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(await Notification.objects.filter(is_read=True).acount(), 3)
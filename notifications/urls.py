@@ -7,6 +7,7 @@ urlpatterns = [
     path('<int:pk>/read/', views.mark_notification_as_read, name='mark-notification-read'),
     path('mark-all-read/', views.mark_all_notifications_as_read, name='mark-all-notifications-read'),
     path('unread-count/', views.unread_notifications_count, name='unread-notifications-count'),
+    path('ws-ticket/', views.websocket_ticket, name='websocket-ticket'),
     
     # Notification Preferences
     path('preferences/', views.NotificationPreferenceView.as_view(), name='notification-preferences'),
@@ -1,9 +1,13 @@
 from rest_framework import generics, permissions, status
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.pagination import CursorPagination
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q, Count, Max
+from django.db.models import Case, Count, F, Max, Q, When
 
+from accounts.permissions import IsAdmin, IsAdminOrAccountant
+
+from .middleware import issue_ticket
 from .models import (
     Notification, NotificationPreference, EmailTemplate, SMSTemplate,
     EmailLog, SMSLog, ChatMessage
@@ -51,6 +55,13 @@ def unread_notifications_count(request):
     return Response({'unread_count': count})
 
 
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def websocket_ticket(request):
+    # تذكرة اتصال websocket واحد بدلاً من رمز API في الرابط (middleware.py)
+    return Response({'ticket': issue_ticket(request.user.id)})
+
+
 class NotificationPreferenceView(generics.RetrieveUpdateAPIView):
     serializer_class = NotificationPreferenceSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -62,68 +73,59 @@ class NotificationPreferenceView(generics.RetrieveUpdateAPIView):
         return preferences
 
 
+class ChatConversationPagination(CursorPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = '-last_message_id'
+
+
 class ChatConversationListView(generics.ListAPIView):
+    """
+    محادثات المستخدم: الطرف الآخر وآخر رسالة وعدد غير المقروء
+
+    One aggregate query groups the user's messages by partner (last message
+    id and unread count), newest conversation first, with cursor pagination
+    on the last message id; a second query loads those last messages with
+    their sender and recipient.
+    """
     serializer_class = ChatConversationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ChatConversationPagination
     
     def get_queryset(self):
         user = self.request.user
         
-        # Get all users who have chatted with the current user
-        conversations = ChatMessage.objects.filter(
+        return ChatMessage.objects.filter(
             Q(sender=user) | Q(recipient=user)
-        ).values(
-            'sender', 'recipient'
-        ).distinct()
-        
-        conversation_users = set()
-        for conv in conversations:
-            if conv['sender'] != user.id:
-                conversation_users.add(conv['sender'])
-            if conv['recipient'] != user.id:
-                conversation_users.add(conv['recipient'])
+        ).annotate(
+            partner_id=Case(When(sender=user, then=F('recipient_id')), default=F('sender_id'))
+        ).values('partner_id').annotate(
+            last_message_id=Max('id'),
+            unread_count=Count('id', filter=Q(recipient=user, is_read=False)),
+        ).order_by('-last_message_id')
+    
+    def list(self, request, *args, **kwargs):
+        conversations = self.paginate_queryset(self.get_queryset())
+        last_messages = ChatMessage.objects.select_related('sender', 'recipient').in_bulk(
+            [conversation['last_message_id'] for conversation in conversations]
+        )
         
-        # Get conversation details
         conversation_data = []
-        for user_id in conversation_users:
-            try:
-                from accounts.models import User
-                other_user = User.objects.get(id=user_id)
-                
-                # Get last message
-                last_message = ChatMessage.objects.filter(
-                    Q(sender=user, recipient=other_user) |
-                    Q(sender=other_user, recipient=user)
-                ).order_by('-created_at').first()
-                
-                # Count unread messages
-                unread_count = ChatMessage.objects.filter(
-                    sender=other_user,
-                    recipient=user,
-                    is_read=False
-                ).count()
-                
-                conversation_data.append({
-                    'user_id': other_user.id,
-                    'user_name': other_user.get_full_name(),
-                    'user_role': other_user.role,
-                    'last_message': last_message.message if last_message else '',
-                    'last_message_time': last_message.created_at if last_message else None,
-                    'unread_count': unread_count
-                })
-            except User.DoesNotExist:
-                continue
-        
-        # Sort by last message time
-        from django.utils import timezone
-        conversation_data.sort(key=lambda x: x['last_message_time'] or timezone.now(), reverse=True)
+        for conversation in conversations:
+            last_message = last_messages[conversation['last_message_id']]
+            other_user = last_message.recipient if last_message.sender_id == request.user.id else last_message.sender
+            conversation_data.append({
+                'user_id': other_user.id,
+                'user_name': other_user.get_full_name(),
+                'user_role': other_user.role,
+                'last_message': last_message.message,
+                'last_message_time': last_message.created_at,
+                'unread_count': conversation['unread_count'],
+            })
         
-        return conversation_data
-    
-    def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        serializer = self.get_serializer(conversation_data, many=True)
+        return self.get_paginated_response(serializer.data)
 
 
 class ChatMessageListView(generics.ListAPIView):
@@ -161,9 +163,8 @@ def send_chat_message(request, user_id):
             meal_plan_id=request.data.get('meal_plan_id')
         )
         
-        # TODO: Add real-time notification via WebSocket when channels is properly configured
-        
-        # Create in-app notification for recipient
+        # Create in-app notification for recipient (pushed to the recipient's
+        # websocket by notifications.signals)
         Notification.objects.create(
             recipient=recipient,
             notification_type='new_message',
@@ -196,7 +197,7 @@ class EmailTemplateListView(generics.ListCreateAPIView):
     
     def get_permissions(self):
         if self.request.method == 'POST':
-            return [permissions.IsAuthenticated(), lambda: self.request.user.role == 'admin']
+            return [permissions.IsAuthenticated(), IsAdmin()]
         return [permissions.IsAuthenticated()]
 
 
@@ -207,29 +208,23 @@ class SMSTemplateListView(generics.ListCreateAPIView):
     
     def get_permissions(self):
         if self.request.method == 'POST':
-            return [permissions.IsAuthenticated(), lambda: self.request.user.role == 'admin']
+            return [permissions.IsAuthenticated(), IsAdmin()]
         return [permissions.IsAuthenticated()]
 
 
 class EmailLogListView(generics.ListAPIView):
     queryset = EmailLog.objects.all()
     serializer_class = EmailLogSerializer
-    permission_classes = [permissions.IsAuthenticated]
+    permission_classes = [permissions.IsAuthenticated, IsAdminOrAccountant]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['status', 'recipient']
     ordering = ['-created_at']
-    
-    def get_permissions(self):
-        return [permissions.IsAuthenticated(), lambda: self.request.user.role in ['admin', 'accountant']]
 
 
 class SMSLogListView(generics.ListAPIView):
     queryset = SMSLog.objects.all()
     serializer_class = SMSLogSerializer
-    permission_classes = [permissions.IsAuthenticated]
+    permission_classes = [permissions.IsAuthenticated, IsAdminOrAccountant]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['status', 'recipient']
     ordering = ['-created_at']
-    
-    def get_permissions(self):
-        return [permissions.IsAuthenticated(), lambda: self.request.user.role in ['admin', 'accountant']]
@@ -0,0 +1,51 @@
+"""
+اختبارات التقارير
+Report dashboard tests
+"""
+
+from datetime import date, time
+
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import PatientProfile, User
+from bookings.models import Appointment
+
+
+class DashboardPermissionTests(TestCase):
+    """لوحات المواعيد والمرضى: 200 للمدير والطبيب و403 لغيرهما"""
+
+    ROLES = ('admin', 'doctor', 'patient', 'accountant')
+    URLS = ('/api/reports/appointments-dashboard/', '/api/reports/patients-dashboard/')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = {
+            role: User.objects.create_user(username=role, password='x', role=role) for role in cls.ROLES
+        }
+        patient = cls.users['patient']
+        patient.date_of_birth = date(timezone.now().year - 35, 1, 1)
+        patient.save()
+        PatientProfile.objects.create(user=patient, gender='female', height=165, current_weight=70, goal='maintain_weight')
+        Appointment.objects.create(
+            patient=patient, doctor=cls.users['doctor'], scheduled_date=timezone.now().date(),
+            scheduled_time=time(10, 30),
+        )
+
+    def test_dashboards_by_role(self):
+        for url in self.URLS:
+            for role in self.ROLES:
+                with self.subTest(url=url, role=role):
+                    client = APIClient()
+                    client.force_authenticate(self.users[role])
+                    expected = 200 if role in ('admin', 'doctor') else 403
+                    self.assertEqual(client.get(url).status_code, expected)
+
+    def test_peak_hours_and_age_groups(self):
+        client = APIClient()
+        client.force_authenticate(self.users['admin'])
+        appointments = client.get(self.URLS[0]).data
+        self.assertEqual(appointments['peak_hours'], [{'hour': 10, 'count': 1}])
+        patients = client.get(self.URLS[1]).data
+        self.assertEqual(patients['age_groups'], [{'age_group': '31-45', 'count': 1}])
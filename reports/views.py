@@ -1,7 +1,8 @@
 from rest_framework import generics, permissions, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
-from django.db.models import Count, Sum, Avg, Q
+from django.db.models import Avg, Case, Count, Q, Sum, Value, When
+from django.db.models.functions import ExtractHour
 from django.utils import timezone
 from datetime import datetime, timedelta
 from decimal import Decimal
@@ -218,8 +219,8 @@ def appointments_dashboard(request):
         ).order_by('-total_appointments')[:10]
     
     # Peak hours analysis
-    peak_hours = appointments_qs.extra(
-        select={'hour': 'EXTRACT(hour FROM scheduled_time)'}
+    peak_hours = appointments_qs.annotate(
+        hour=ExtractHour('scheduled_time')
     ).values('hour').annotate(
         count=Count('id')
     ).order_by('-count')[:5]
@@ -237,6 +238,14 @@ def appointments_dashboard(request):
     })
 
 
+def _years_before(day, years):
+    """التاريخ قبل years سنة (29 فبراير يصبح 28 فبراير)"""
+    try:
+        return day.replace(year=day.year - years)
+    except ValueError:
+        return day.replace(year=day.year - years, day=28)
+
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def patients_dashboard(request):
@@ -261,22 +270,19 @@ def patients_dashboard(request):
         count=Count('id')
     ).order_by('gender')
     
-    # Age groups
-    from django.utils import timezone
-    current_year = timezone.now().year
-    
+    # Age groups (born after the day the patient turns the group's lower age)
+    today = timezone.now().date()
     age_groups = PatientProfile.objects.filter(
         user__in=patients_qs,
         user__date_of_birth__isnull=False
-    ).extra(
-        select={'age_group': 
-            "CASE "
-            "WHEN EXTRACT(year FROM age(date_of_birth)) < 18 THEN 'Under 18' "
-            "WHEN EXTRACT(year FROM age(date_of_birth)) BETWEEN 18 AND 30 THEN '18-30' "
-            "WHEN EXTRACT(year FROM age(date_of_birth)) BETWEEN 31 AND 45 THEN '31-45' "
-            "WHEN EXTRACT(year FROM age(date_of_birth)) BETWEEN 46 AND 60 THEN '46-60' "
-            "ELSE 'Over 60' END"
-        }
+    ).annotate(
+        age_group=Case(
+            When(user__date_of_birth__gt=_years_before(today, 18), then=Value('Under 18')),
+            When(user__date_of_birth__gt=_years_before(today, 31), then=Value('18-30')),
+            When(user__date_of_birth__gt=_years_before(today, 46), then=Value('31-45')),
+            When(user__date_of_birth__gt=_years_before(today, 61), then=Value('46-60')),
+            default=Value('Over 60'),
+        )
     ).values('age_group').annotate(
         count=Count('id')
     ).order_by('age_group')
@@ -5,6 +5,7 @@ import 'react-toastify/dist/ReactToastify.css'
 
 import { useAuth } from './hooks/useAuth'
 import { useLanguage } from './hooks/useLanguage'
+import { useRealtimeUpdates } from './hooks/useRealtimeUpdates'
 
 // Layout Components
 import Navbar from './components/layout/Navbar'
@@ -48,6 +49,9 @@ function App() {
   const { user, loading } = useAuth()
   const { language, direction } = useLanguage()
 
+  // Meal-plan changes and notifications pushed over the websocket
+  useRealtimeUpdates(user)
+
   // Update document attributes for RTL support
   React.useEffect(() => {
     document.documentElement.lang = language
@@ -31,7 +31,7 @@ const PatientMealSelections = ({ patientId }) => {
     }),
     { 
       enabled: !!patientId,
-      refetchInterval: 30000, // تحديث كل 30 ثانية
+      // يتحدث عند وصول تغيير عبر websocket (useRealtimeUpdates)
     }
   )
   
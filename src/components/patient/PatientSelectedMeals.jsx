@@ -57,7 +57,7 @@ const PatientSelectedMeals = () => {
     }),
     { 
       enabled: !!user?.id,
-      refetchInterval: 30000, // تحديث كل 30 ثانية
+      // يتحدث عند وصول تغيير عبر websocket (useRealtimeUpdates)
     }
   )
   
@@ -0,0 +1,36 @@
+import { useEffect } from 'react'
+import { useQueryClient } from 'react-query'
+import websocketService from '../services/websocketService'
+
+// Queries showing meal plans, their meals and the patient's selections:
+// refetched when the server reports a change instead of on a timer
+const MEAL_PLAN_QUERIES = [
+  'patient-meal-plans',
+  'patient-selected-meals',
+  'patient-meal-selections',
+  'doctor-meal-plans',
+  'meal-plan-meals',
+]
+
+export const useRealtimeUpdates = (user) => {
+  const queryClient = useQueryClient()
+
+  useEffect(() => {
+    const token = localStorage.getItem('token')
+    if (!user?.id || !token) {
+      websocketService.disconnect()
+      return undefined
+    }
+
+    const refreshMealPlans = () => {
+      MEAL_PLAN_QUERIES.forEach((key) => queryClient.invalidateQueries(key))
+    }
+
+    websocketService.addListener('meal_plan_updated', refreshMealPlans)
+    websocketService.connect(user.id, token)
+
+    return () => {
+      websocketService.removeListener('meal_plan_updated', refreshMealPlans)
+    }
+  }, [user?.id, queryClient])
+}
@@ -64,7 +64,6 @@ const PatientMealPlans = () => {
     }),
     { 
       enabled: !!user?.id,
-      refetchInterval: 10000,
       initialData: [],
       staleTime: 0,
       cacheTime: 0,
@@ -1,28 +1,87 @@
 // WebSocket service for real-time updates
+import api from './api'
+
+const CHANGE_FEED_URL = '/api/meals/meal-plans/check-updates/'
+const TICKET_URL = '/api/notifications/ws-ticket/'
+const POLLING_INTERVAL = 15000
+
+const socketUrl = (userId, ticket) => {
+  // Same host as the API, ws:// or wss:// to match http:// or https://
+  const base = new URL(api.defaults.baseURL || window.location.origin, window.location.origin)
+  base.protocol = base.protocol === 'https:' ? 'wss:' : 'ws:'
+  return `${base.origin}/ws/notifications/${userId}/?ticket=${encodeURIComponent(ticket)}`
+}
+
 class WebSocketService {
   constructor() {
     this.socket = null
     this.pollingInterval = null
+    this.version = null
+    this.userId = null
+    this.token = null
     this.reconnectAttempts = 0
     this.maxReconnectAttempts = 5
     this.reconnectInterval = 3000
+    this.reconnectTimer = null
     this.listeners = new Map()
   }
 
-  connect() {
-    try {
-      // For now, use polling only to avoid WebSocket errors
-      // WebSocket can be enabled when server supports it
-      console.log('🔄 Using polling mechanism for real-time updates')
-      this.startPolling()
+  connect(userId, token) {
+    if (!userId || !token) {
       return
-      
-      // WebSocket code is disabled for now to avoid connection errors
-      // It can be enabled when the server supports WebSocket connections
-      
+    }
+    if (this.socket && this.userId === userId && this.token === token) {
+      return
+    }
+    this.disconnect()
+    this.userId = userId
+    this.token = token
+    this.openSocket()
+  }
+
+  async openSocket() {
+    const userId = this.userId
+    try {
+      // Single-use ticket: the API token never goes into the socket URL
+      const { data } = await api.post(TICKET_URL)
+      if (this.userId !== userId || this.socket) {
+        return
+      }
+      const socket = new WebSocket(socketUrl(userId, data.ticket))
+      this.socket = socket
+
+      socket.onopen = () => {
+        this.reconnectAttempts = 0
+        this.stopPolling()
+        // Catch up on anything that changed while the socket was down
+        this.checkForChanges()
+      }
+
+      socket.onmessage = (event) => {
+        try {
+          this.handleMessage(JSON.parse(event.data))
+        } catch (error) {
+          console.error('Error handling WebSocket message:', error)
+        }
+      }
+
+      socket.onclose = () => {
+        if (this.socket !== socket) {
+          return
+        }
+        // Fall back to polling until the socket is back
+        this.socket = null
+        this.startPolling()
+        this.attemptReconnect()
+      }
     } catch (error) {
+      if (this.userId !== userId) {
+        return
+      }
       // Silently handle connection error and fallback to polling
+      this.socket = null
       this.startPolling()
+      this.attemptReconnect()
     }
   }
 
@@ -30,6 +89,12 @@ class WebSocketService {
     if (data.type === 'meal_plan_updated') {
       // Notify all listeners about meal plan updates
       this.notifyListeners('meal_plan_updated', data)
+    } else if (data.type === 'meal_plan_change') {
+      // Change feed event pushed by the server
+      this.version = Math.max(this.version || 0, data.change.version)
+      this.notifyListeners('meal_plan_updated', { type: 'meal_plan_change', changes: [data.change] })
+    } else if (data.type === 'notification') {
+      this.notifyListeners('notification', data.notification)
     }
   }
 
@@ -67,43 +132,75 @@ class WebSocketService {
   }
 
   attemptReconnect() {
-    if (this.reconnectAttempts < this.maxReconnectAttempts) {
+    if (this.reconnectAttempts < this.maxReconnectAttempts && !this.reconnectTimer) {
       this.reconnectAttempts++
-      
-      setTimeout(() => {
-        try {
-          this.connect()
-        } catch (error) {
-          this.startPolling()
+
+      this.reconnectTimer = setTimeout(() => {
+        this.reconnectTimer = null
+        if (this.userId && !this.socket) {
+          this.openSocket()
         }
-      }, this.reconnectInterval)
-    } else {
-      this.startPolling()
+      }, this.reconnectInterval * this.reconnectAttempts)
     }
+    // After the last attempt polling stays on
   }
 
   startPolling() {
     // Fallback polling mechanism
     if (this.pollingInterval) {
-      clearInterval(this.pollingInterval)
+      return
     }
-    
+
     console.log('Starting polling mechanism for real-time updates')
-    this.pollingInterval = setInterval(() => {
-      this.notifyListeners('meal_plan_updated', { type: 'polling_update' })
-    }, 5000) // Poll every 5 seconds
+    this.checkForChanges()
+    this.pollingInterval = setInterval(() => this.checkForChanges(), POLLING_INTERVAL)
+  }
+
+  stopPolling() {
+    if (this.pollingInterval) {
+      clearInterval(this.pollingInterval)
+      this.pollingInterval = null
+    }
+  }
+
+  async checkForChanges() {
+    // The change feed answers 304 while nothing changed, so listeners
+    // only refetch when a meal plan, meal, ingredient or selection did
+    try {
+      const response = await api.get(CHANGE_FEED_URL, {
+        params: this.version === null ? {} : { since: this.version },
+        validateStatus: (status) => status === 200 || status === 304,
+      })
+      if (response.status === 304) {
+        return
+      }
+      const { version, changes = [], truncated } = response.data
+      const firstCheck = this.version === null
+      this.version = version
+      if (!firstCheck) {
+        this.notifyListeners('meal_plan_updated', { type: 'meal_plan_change', changes, truncated })
+      }
+    } catch (error) {
+      console.error('Error checking meal plan changes:', error)
+    }
   }
 
   disconnect() {
     try {
+      if (this.reconnectTimer) {
+        clearTimeout(this.reconnectTimer)
+        this.reconnectTimer = null
+      }
       if (this.socket) {
-        this.socket.close()
+        const socket = this.socket
         this.socket = null
+        socket.close()
       }
-      if (this.pollingInterval) {
-        clearInterval(this.pollingInterval)
-        this.pollingInterval = null
-      }
+      this.stopPolling()
+      this.userId = null
+      this.token = null
+      this.version = null
+      this.reconnectAttempts = 0
     } catch (error) {
       console.error('Error during disconnect:', error)
     }